@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'lunchreports.instrumentation.ReportInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'django_project.urls'
@@ -77,10 +79,63 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get("SQLITE_PATH", BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# High-concurrency SQLite profile: set SQLITE_CONCURRENT=1 to run SQLite in
+# WAL mode with tuned pragmas, a busy timeout and BEGIN IMMEDIATE writes (see
+# lunchreports/sqlite_backend), and to have the report views read through a
+# separate read-only "reports" connection so order writers don't block them.
+if os.environ.get("SQLITE_CONCURRENT"):
+    SQLITE_PRAGMAS = {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -64000,  # KiB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "memory",
+    }
+    DATABASES = {
+        'default': {
+            'ENGINE': 'lunchreports.sqlite_backend',
+            'NAME': DATABASES['default']['NAME'],
+            'OPTIONS': {
+                'timeout': 20,
+                'pragmas': SQLITE_PRAGMAS,
+            },
+        },
+        'reports': {
+            'ENGINE': 'lunchreports.sqlite_backend',
+            'NAME': DATABASES['default']['NAME'],
+            'OPTIONS': {
+                'timeout': 20,
+                'pragmas': SQLITE_PRAGMAS,
+                'read_only': True,
+            },
+            'TEST': {
+                'MIRROR': 'default',
+            },
+        },
+    }
+
+# PostgreSQL profile: set POSTGRES_DB (and POSTGRES_USER, POSTGRES_PASSWORD,
+# POSTGRES_HOST, POSTGRES_PORT as needed) to use PostgreSQL instead of SQLite.
+# Connections are kept open for POSTGRES_CONN_MAX_AGE seconds and checked
+# before reuse. Requires psycopg: pip install "psycopg[binary]".
+if os.environ.get("POSTGRES_DB"):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ["POSTGRES_DB"],
+            'USER': os.environ.get("POSTGRES_USER", ""),
+            'PASSWORD': os.environ.get("POSTGRES_PASSWORD", ""),
+            'HOST': os.environ.get("POSTGRES_HOST", ""),
+            'PORT': os.environ.get("POSTGRES_PORT", ""),
+            'CONN_MAX_AGE': int(os.environ.get("POSTGRES_CONN_MAX_AGE", 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -127,3 +182,101 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Service date (YYYY-MM-DD) migration 0008 gives the orders stored before
+# schools and service days; their creation time wasn't recorded. Only needed
+# to migrate a database that has orders.
+LUNCHREPORTS_BACKFILL_SERVICE_DATE = os.environ.get("LUNCHREPORTS_BACKFILL_SERVICE_DATE")
+
+# Cache of rendered report PDFs, see lunchreports/pdf_cache.py.
+# BACKEND is "memory" (per process), "filesystem" (shared through LOCATION)
+# or None to always re-render. The filesystem cache is shared by the web
+# workers and warm_reports; LOCATION defaults to a directory in the system
+# temporary directory, or is set with LUNCHREPORTS_PDF_CACHE_DIR.
+LUNCHREPORTS_PDF_CACHE = {
+    "BACKEND": "filesystem",
+    "MAX_BYTES": 64 * 1024 * 1024,
+}
+if os.environ.get("LUNCHREPORTS_PDF_CACHE_DIR"):
+    LUNCHREPORTS_PDF_CACHE["LOCATION"] = os.environ["LUNCHREPORTS_PDF_CACHE_DIR"]
+
+# Background rendering of report PDFs, see lunchreports/jobs.py. Reports are
+# queued instead of rendered in the request with ?async=1, or always when
+# ASYNC_BY_DEFAULT is set. Finished PDFs are kept in DIRECTORY for TTL seconds.
+# Jobs pending for RENDER_TIMEOUT seconds, or whose worker process exited,
+# fail and are queued again by the next identical request.
+LUNCHREPORTS_RENDER_JOBS = {
+    "ASYNC_BY_DEFAULT": False,
+    "WORKERS": 2,
+    "TTL": 60 * 60,
+    "RENDER_TIMEOUT": 10 * 60,
+}
+
+# How report PDFs are produced, see lunchreports/generate_report.py. BACKEND
+# is "xhtml2pdf" (the report templates' HTML and CSS) or "reportlab" (the same
+# tables laid out directly, much faster on large reports). In "parallel" MODE
+# the by-item report renders each lunch item's section in a pool of WORKERS
+# processes (default: one per CPU) and merges the parts.
+LUNCHREPORTS_PDF_RENDERING = {
+    "BACKEND": "xhtml2pdf",
+    "MODE": "single",
+    "WORKERS": None,
+}
+
+# Point-in-time report snapshots, see lunchreports/snapshots.py. Snapshots
+# older than MAX_AGE seconds, and all but the newest MAX_COUNT of each report,
+# are pruned whenever a snapshot is taken.
+LUNCHREPORTS_SNAPSHOTS = {
+    "MAX_AGE": 7 * 24 * 60 * 60,
+    "MAX_COUNT": 100,
+}
+
+# Log of order quantity changes behind delta reports (?since=), see
+# lunchreports/order_changes.py. Rows older than MAX_AGE seconds are pruned
+# by the snapshot_reports command; delta reports can't reach further back.
+LUNCHREPORTS_ORDER_CHANGES = {
+    "MAX_AGE": 30 * 24 * 60 * 60,
+}
+
+# Archiving of old service days, see lunchreports/archive.py. The
+# archive_orders command keeps the orders of the last KEEP_DAYS days and folds
+# older days into per-customer totals in the archive table.
+LUNCHREPORTS_ORDER_ARCHIVE = {
+    "KEEP_DAYS": 90,
+}
+
+# In-memory index of lunch items, teachers and students, see
+# lunchreports/name_index.py. Edits in this process drop it at once; TTL
+# bounds, in seconds, how long edits made by other processes take to show up.
+# WARM_ON_FIRST_REQUEST loads it on the first request a process serves.
+LUNCHREPORTS_NAME_INDEX = {
+    "TTL": 300,
+    "WARM_ON_FIRST_REQUEST": True,
+}
+
+# Pre-rendering of the standard reports at the order cutoff, see
+# lunchreports/warmup.py. The warm_reports command (from cron at CUTOFF, or
+# with --wait) renders them into the PDF cache, and refuses to unless it is
+# "filesystem", shared with the web workers; report_warmup/ serves its progress.
+LUNCHREPORTS_REPORT_WARMUP = {
+    "CUTOFF": "10:00",
+    "SCHOOLS": None,
+}
+
+
+# Report requests are timed by lunchreports.instrumentation and logged as one
+# JSON line each on this logger; percentiles are served at report_stats/.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "lunchreports.instrumentation": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
@@ -1,11 +1,48 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import LunchItemOrder, LunchItem, Teacher, Student
+from .models import LunchItemOrder, LunchItem, School, Teacher, Student
+from .paginators import EstimatedCountPaginator
+
+# Changelists of the tables that grow to millions of rows: related objects
+# are joined rather than loaded per row, the paginator estimates instead of
+# counting every row (and the unfiltered total isn't counted at all), and
+# list filters are on indexed columns.
+class LargeTableAdmin(admin.ModelAdmin):
+  paginator = EstimatedCountPaginator
+  show_full_result_count = False
+
+class TeacherAdmin(LargeTableAdmin):
+  list_display = ("name", "school")
+  list_select_related = ("school",)
+  list_filter = ("school",)
+  search_fields = ("name",)
+
+class StudentAdmin(LargeTableAdmin):
+  list_display = ("name", "teacher", "school")
+  list_filter = ("school",)
+  search_fields = ("name",)
+  autocomplete_fields = ("teacher",)
+
+  def get_queryset(self, request):
+    # Rather than list_select_related, which only the changelist applies:
+    # Student.__str__ shows the teacher in autocomplete results too.
+    return super().get_queryset(request).select_related("teacher", "school")
+
+class LunchItemOrderAdmin(LargeTableAdmin):
+  list_display = ("id", "service_date", "school", "lunch_item", "customer", "quantity")
+  # LunchItemOrder.__str__, shown by the action checkbox, names the
+  # student's teacher.
+  list_select_related = ("school", "lunch_item", "student__teacher", "teacher")
+  list_filter = ("school", "service_date", "lunch_item")
+  autocomplete_fields = ("student", "teacher")
+
+  @admin.display(description="customer")
+  def customer(self, order):
+    return order.student.name if order.student_id is not None else order.teacher.name
 
-class LunchItemOrderAdmin(admin.ModelAdmin):
-  list_filter = ("lunch_item",)
 admin.site.register(LunchItemOrder, LunchItemOrderAdmin)
+admin.site.register(School)
 admin.site.register(LunchItem)
-admin.site.register(Teacher)
-admin.site.register(Student)
\ No newline at end of file
+admin.site.register(Teacher, TeacherAdmin)
+admin.site.register(Student, StudentAdmin)
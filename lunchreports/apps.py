@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class LunchreportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lunchreports'
+
+    def ready(self):
+        from . import instrumentation, signals  # noqa: F401
+        from .name_index import connect_warm_name_index
+        connect_warm_name_index()
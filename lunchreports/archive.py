@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .data_version import bump_data_version
+from .models import (
+    LunchItemOrder,
+    LunchItemOrderArchive,
+    LunchItemOrderChange,
+    LunchItemOrderRollup,
+)
+from .rollup import ROLLUP_KEY_FIELDS, order_rollup_key
+
+# Default configuration, overridable with the LUNCHREPORTS_ORDER_ARCHIVE
+# setting:
+#   KEEP_DAYS: service days, up to and including today, whose orders are kept
+#       by archive_orders; older days are archived.
+DEFAULT_ORDER_ARCHIVE = {
+    "KEEP_DAYS": 90,
+}
+
+
+def get_order_archive_config():
+    return {**DEFAULT_ORDER_ARCHIVE, **getattr(settings, "LUNCHREPORTS_ORDER_ARCHIVE", {})}
+
+
+def default_archive_cutoff():
+    """
+    :return: The first service day kept by archive_orders by default.
+    """
+    return timezone.localdate() - timedelta(days=get_order_archive_config()["KEEP_DAYS"] - 1)
+
+
+def archivable_partitions(before):
+    """
+    :param before: date; days before it are archivable.
+    :return: List of (school_id, service_date) with orders, oldest first.
+    """
+    return list(LunchItemOrder.objects.filter(service_date__lt=before)
+                .values_list("school_id", "service_date").distinct()
+                .order_by("service_date", "school_id"))
+
+
+def archive_partition(school_id, service_date, batch_size=1000):
+    """
+    Move one school's orders of one day into the archive: their totals per
+    lunch item and customer are added to the day's archive rows, then the
+    orders, their rollup rows and their order change log rows are deleted.
+
+    :param school_id: Id of the school.
+    :param service_date: The service date.
+    :param batch_size: Number of archive rows inserted per query.
+    :return: Number of orders archived.
+    """
+    lookup = {"school_id": school_id, "service_date": service_date}
+    orders = LunchItemOrder.objects.filter(**lookup)
+    with transaction.atomic():
+        totals = {}
+        for row in (orders.values(*ROLLUP_KEY_FIELDS)
+                    .annotate(total_quantity=Sum("quantity"), total_orders=Count("id"))
+                    .order_by()):
+            totals[order_rollup_key(row)] = [row["total_quantity"], row["total_orders"]]
+        # Orders entered for a day after it was archived are added to it.
+        archived = LunchItemOrderArchive.objects.filter(**lookup)
+        for row in archived.values(*ROLLUP_KEY_FIELDS, "quantity", "order_count"):
+            total = totals.setdefault(order_rollup_key(row), [0, 0])
+            total[0] += row["quantity"]
+            total[1] += row["order_count"]
+        archived.delete()
+        LunchItemOrderArchive.objects.bulk_create(
+            (LunchItemOrderArchive(quantity=quantity, order_count=order_count,
+                                   **dict(zip(ROLLUP_KEY_FIELDS, key, strict=True)))
+             for key, (quantity, order_count) in totals.items()),
+            batch_size=batch_size)
+        # Deleted with SQL rather than QuerySet.delete(), which would load
+        # every order and send its delete signals: they update the rollup
+        # and log a change per order, rows this deletes in bulk below. Nothing
+        # references orders, so there is nothing to cascade.
+        connection = connections[orders.db]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(LunchItemOrder._meta.db_table)} "
+                "WHERE school_id = %s AND service_date = %s",
+                [school_id, connection.ops.adapt_datefield_value(service_date)])
+            archived_orders = cursor.rowcount
+        LunchItemOrderRollup.objects.filter(**lookup).delete()
+        LunchItemOrderChange.objects.filter(**lookup).delete()
+    return archived_orders
+
+
+def archive_orders(before=None, batch_size=1000):
+    """
+    Archive every school's orders of the service days before a date, one
+    school and day per transaction, and bump the report data version.
+
+    :param before: date; defaults to default_archive_cutoff().
+    :param batch_size: Number of archive rows inserted per query.
+    :return: Dictionary with the number of days (per school) and orders
+             archived.
+    """
+    before = before or default_archive_cutoff()
+    result = {"days": 0, "orders": 0}
+    for school_id, service_date in archivable_partitions(before):
+        result["orders"] += archive_partition(school_id, service_date, batch_size=batch_size)
+        result["days"] += 1
+    if result["days"]:
+        bump_data_version()
+    return result
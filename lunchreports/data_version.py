@@ -0,0 +1,36 @@
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+
+from .models import ReportDataVersion
+
+DATA_VERSION_PK = 1
+
+
+def get_data_version(using=DEFAULT_DB_ALIAS):
+    """
+    Return the current report data version.
+
+    :param using: Database alias to read it from.
+    :return: Integer that increases whenever report inputs change.
+    """
+    return (
+        ReportDataVersion.objects
+        .using(using)
+        .filter(pk=DATA_VERSION_PK)
+        .values_list('version', flat=True)
+        .first()
+    ) or 0
+
+
+def bump_data_version():
+    """
+    Increment the report data version, invalidating every cached report.
+    """
+    rows = ReportDataVersion.objects.filter(pk=DATA_VERSION_PK)
+    if rows.update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ReportDataVersion.objects.create(pk=DATA_VERSION_PK, version=1)
+    except IntegrityError:
+        rows.update(version=F('version') + 1)
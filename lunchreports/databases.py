@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Database alias the report views read from when it is configured, e.g. by
+# the SQLITE_CONCURRENT profile in settings.py.
+REPORTS_DB_ALIAS = "reports"
+
+
+def get_report_db_alias():
+    """
+    :return: REPORTS_DB_ALIAS if configured, otherwise the default alias.
+    """
+    return REPORTS_DB_ALIAS if REPORTS_DB_ALIAS in settings.DATABASES else DEFAULT_DB_ALIAS
@@ -0,0 +1,77 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+# Columns of exported report rows, in order.
+EXPORT_COLUMNS = ("lunch_item", "teacher", "customer", "quantity")
+
+# Supported export formats: content type and file extension.
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "json": ("application/json", "json"),
+}
+
+# Number of rows fetched from the database at a time.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _export_records(rows):
+    for row in rows:
+        yield dict(zip(EXPORT_COLUMNS, row, strict=True))
+
+
+def _csv_lines(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for record in records:
+        yield writer.writerow(record.values())
+
+
+def _jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record) + "\n"
+
+
+def _json_lines(records):
+    yield "["
+    separator = "\n"
+    for record in records:
+        yield separator + json.dumps(record)
+        separator = ",\n"
+    yield "\n]\n"
+
+
+_EXPORT_WRITERS = {
+    "csv": _csv_lines,
+    "jsonl": _jsonl_lines,
+    "json": _json_lines,
+}
+
+
+def export_response(rows, *, export_format, report_title):
+    """
+    Stream report rows as CSV, JSON lines or a JSON array.
+
+    Rows are consumed while the response is sent; with rows pulled from the
+    database in chunks of EXPORT_CHUNK_SIZE, memory use and time to first
+    byte don't depend on the size of the export.
+
+    :param rows: Iterable of tuples of the EXPORT_COLUMNS.
+    :param export_format: One of EXPORT_FORMATS.
+    :param report_title: Used for the attachment file name.
+    :return: StreamingHttpResponse.
+    """
+    content_type, extension = EXPORT_FORMATS[export_format]
+    lines = _EXPORT_WRITERS[export_format](_export_records(rows))
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{report_title}.{extension}"'
+    return response
@@ -1,68 +1,349 @@
-from xhtml2pdf import pisa
 from django.template.loader import render_to_string
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import asynccontextmanager
+from io import BytesIO
+from . import render_worker, table_pdf
+from .pdf_concat import PdfConcatenator, concatenate_pdfs
+from .instrumentation import record_stage
+import asyncio
+import functools
+import gc
+import multiprocessing
 import os
+import threading
+import time
 import logging  #noqa
 
 
 # Generic pdf response populator. Takes a report title, a report template,
 # and a dictionary of kwargs to pass to the template.
 def populate_pdf_response(*, report_title, report_template, **kwargs):
-  response = HttpResponse(content_type="application/pdf")
+  return pdf_response(
+      render_pdf(report_title=report_title,
+                 report_template=report_template,
+                 **kwargs),
+      report_title=report_title,
+  )
+
+
+# Wraps already rendered PDF bytes in a download response. An optional etag
+# lets clients revalidate with If-None-Match instead of downloading again.
+def pdf_response(pdf, *, report_title, etag=None):
+  response = HttpResponse(pdf, content_type="application/pdf")
   response[
       "Content-Disposition"] = f'attachment; filename="{report_title}.pdf"'
-  template_path = os.path.join(settings.BASE_DIR, report_template)
+  if etag is not None:
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+  return response
+
+
+# Wraps a file holding a rendered PDF in a download response that streams it
+# in blocks. The file is closed when the response is.
+def pdf_file_response(pdf_file, *, report_title, etag=None):
+  response = FileResponse(pdf_file,
+                          as_attachment=True,
+                          filename=f"{report_title}.pdf",
+                          content_type="application/pdf")
+  if etag is not None:
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+  return response
+
+
+# Renders a report template to PDF bytes.
+def render_pdf(*, report_title, report_template, **kwargs):
+  return html_to_pdf(
+      render_html(report_title=report_title,
+                  report_template=report_template,
+                  **kwargs))
+
+
+# Renders each HTML section to its own PDF in the section process pool and
+# concatenates them in order. Every section starts on a new page.
+def render_pdf_sections(html_sections):
+  if len(html_sections) == 1:
+    return html_to_pdf(html_sections[0])
+  start = time.perf_counter()
+  parts = list(_get_section_executor().map(render_worker.html_to_pdf, html_sections))
+  pdf = merge_pdfs(parts)
+  record_stage("pdf", time.perf_counter() - start, len(pdf))
+  return pdf
+
+
+# Converts HTML chunks to PDF one at a time and writes the concatenated
+# document to the binary file dest. html_chunks may be a generator, so only
+# one chunk's HTML and xhtml2pdf layout are held in memory at once.
+def render_pdf_chunks(html_chunks, dest):
+  write_pdf_chunks((html_to_pdf(html) for html in html_chunks), dest)
+
+
+# Writes PDF documents, given as bytes, concatenated to the binary file dest.
+# pdf_chunks may be a generator rendering one chunk at a time: each chunk's
+# pages are written to dest before the next one is rendered.
+def write_pdf_chunks(pdf_chunks, dest):
+  concatenator = PdfConcatenator(dest)
+  for pdf in pdf_chunks:
+    concatenator.append(pdf)
+    _collect_chunk_garbage()
+  concatenator.close()
+
+
+# The PDF backends leave each rendered document in reference cycles
+# (document, canvas, frames and flowables) that only the cyclic garbage
+# collector frees, and it runs by allocation counts rather than size. Collect
+# after every chunk, or the garbage of earlier chunks adds up until it runs.
+def _collect_chunk_garbage():
+  gc.collect()
+
+
+# Concatenates PDF documents, given as bytes, into one.
+def merge_pdfs(parts):
+  merged = BytesIO()
+  concatenate_pdfs(parts, merged)
+  return merged.getvalue()
+
+
+# Settings for how report PDFs are produced, overridable with the
+# LUNCHREPORTS_PDF_RENDERING setting:
+#   MODE: "single" renders the whole document with one pisa.CreatePDF call;
+#       "parallel" renders reports that are made of independent per-item
+#       sections in a process pool and merges the parts; "chunked" renders
+#       the report one chunk (run of lunch items or of teachers) at a time into
+#       a temporary file that is streamed to the client, bounding memory
+#       use whatever the number of pages.
+#   CHUNK_ROWS: approximate table rows per chunk in "chunked" mode.
+#   WORKERS: size of the render process pool (defaults to the CPU count),
+#       used for parallel sections and by the async report views.
+#   MAX_RENDERS: reports the async views render at once (defaults to the
+#       pool size). Further requests wait for a free slot in a queue of
+#       MAX_QUEUED (defaults to eight times MAX_RENDERS) for QUEUE_TIMEOUT
+#       seconds at most; past either, they get a 503 with RETRY_AFTER seconds.
+#   BACKEND: one of PDF_BACKENDS.
+DEFAULT_PDF_RENDERING = {
+    "BACKEND": "xhtml2pdf",
+    "MODE": "single",
+    "CHUNK_ROWS": 500,
+    "WORKERS": None,
+    "MAX_RENDERS": None,
+    "MAX_QUEUED": None,
+    "QUEUE_TIMEOUT": 30,
+    "RETRY_AFTER": 5,
+}
+
+
+def get_pdf_rendering_config():
+  return {
+      **DEFAULT_PDF_RENDERING,
+      **getattr(settings, "LUNCHREPORTS_PDF_RENDERING", {}),
+  }
+
+
+# What turns a report into PDF:
+#   "xhtml2pdf" renders the report template and converts its HTML and CSS,
+#       for full fidelity to the templates;
+#   "reportlab" lays the report's tables out straight from its template
+#       context with ReportLab platypus (see table_pdf.py), skipping HTML and
+#       CSS parsing. Much faster on large reports; renders in the calling
+#       process, so MODE "parallel" renders as "single".
+PDF_BACKENDS = ("xhtml2pdf", "reportlab")
+
+
+def get_pdf_backend():
+  backend = get_pdf_rendering_config()["BACKEND"]
+  if backend not in PDF_BACKENDS:
+    raise ImproperlyConfigured(
+        f"Unknown LUNCHREPORTS_PDF_RENDERING BACKEND {backend!r}; use one of {PDF_BACKENDS}.")
+  return backend
+
+
+_section_executor = None
+_section_executor_lock = threading.Lock()
+
+
+def _get_section_executor():
+  global _section_executor
+  if _section_executor is None:
+    with _section_executor_lock:
+      if _section_executor is None:
+        _section_executor = ProcessPoolExecutor(
+            max_workers=get_pdf_rendering_config()["WORKERS"],
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+  return _section_executor
+
+
+@receiver(setting_changed)
+def _reset_section_executor(setting, **kwargs):
+  global _section_executor
+  if setting == "LUNCHREPORTS_PDF_RENDERING" and _section_executor is not None:
+    _section_executor.shutdown(wait=False)
+    _section_executor = None
+
+
+# Raised by render_slot() when MAX_QUEUED requests already wait for a slot,
+# or no slot frees up within QUEUE_TIMEOUT seconds.
+class RenderPoolBusy(Exception):
+  pass
+
+
+# Render slots of the async views of this process. Requests waiting for one
+# queue as (event loop, future) pairs, since views may run on more than one
+# loop; a freed slot is handed straight to the first of them.
+_renders_in_flight = 0
+_render_waiters = deque()
+_render_slots_lock = threading.Lock()
+
+
+def _max_renders():
+  config = get_pdf_rendering_config()
+  if config["MAX_RENDERS"] is not None:
+    return config["MAX_RENDERS"]
+  return config["WORKERS"] or os.cpu_count() or 1
+
+
+def _max_queued():
+  config = get_pdf_rendering_config()
+  if config["MAX_QUEUED"] is not None:
+    return config["MAX_QUEUED"]
+  return 8 * _max_renders()
+
+
+def _wake(future):
+  if not future.done():
+    future.set_result(None)
+
+
+def _release_render_slot():
+  global _renders_in_flight
+  with _render_slots_lock:
+    while _render_waiters:
+      loop, future = _render_waiters.popleft()
+      try:
+        loop.call_soon_threadsafe(_wake, future)
+        return
+      except RuntimeError:
+        # The waiter's event loop is closed; hand the slot to the next one.
+        pass
+    _renders_in_flight -= 1
+
+
+async def _acquire_render_slot():
+  global _renders_in_flight
+  with _render_slots_lock:
+    if _renders_in_flight < _max_renders():
+      _renders_in_flight += 1
+      return
+    if len(_render_waiters) >= _max_queued():
+      raise RenderPoolBusy()
+    loop = asyncio.get_running_loop()
+    waiter = (loop, loop.create_future())
+    _render_waiters.append(waiter)
+  try:
+    await asyncio.wait_for(waiter[1], get_pdf_rendering_config()["QUEUE_TIMEOUT"])
+  except BaseException as e:
+    # Timed out, or the request was cancelled. A slot handed over meanwhile
+    # is no longer queued: used when timing out, passed on when cancelled.
+    with _render_slots_lock:
+      handed_over = waiter not in _render_waiters
+      if not handed_over:
+        _render_waiters.remove(waiter)
+    if not isinstance(e, TimeoutError):
+      if handed_over:
+        _release_render_slot()
+      raise
+    if not handed_over:
+      raise RenderPoolBusy() from e
+
+
+# Claims one of the MAX_RENDERS render slots for the duration of the block,
+# waiting in a queue of up to MAX_QUEUED requests for QUEUE_TIMEOUT seconds
+# at most, then raising RenderPoolBusy.
+@asynccontextmanager
+async def render_slot():
+  await _acquire_render_slot()
+  try:
+    yield
+  finally:
+    _release_render_slot()
+
+
+# Converts an HTML document to PDF bytes in the render process pool, without
+# blocking the event loop.
+async def html_to_pdf_async(html):
+  start = time.perf_counter()
+  pdf = await asyncio.get_running_loop().run_in_executor(
+      _get_section_executor(), render_worker.html_to_pdf, html)
+  record_stage("pdf", time.perf_counter() - start, len(pdf))
+  return pdf
+
+
+# Async counterpart of render_pdf_chunks; html_chunks is an async iterator.
+async def render_pdf_chunks_async(html_chunks, dest):
+  concatenator = PdfConcatenator(dest)
+  async for html in html_chunks:
+    concatenator.append(await html_to_pdf_async(html))
+    _collect_chunk_garbage()
+  concatenator.close()
+
+
+# Async counterpart of render_pdf_sections.
+async def render_pdf_sections_async(html_sections):
+  if len(html_sections) == 1:
+    return await html_to_pdf_async(html_sections[0])
+  start = time.perf_counter()
+  loop = asyncio.get_running_loop()
+  parts = await asyncio.gather(*(
+      loop.run_in_executor(_get_section_executor(), render_worker.html_to_pdf, html)
+      for html in html_sections))
+  pdf = merge_pdfs(parts)
+  record_stage("pdf", time.perf_counter() - start, len(pdf))
+  return pdf
+
+
+# Reads the stylesheet of the PDF reports once per process. base.html inlines
+# it in place of the web stylesheet link, which xhtml2pdf can't fetch.
+@functools.cache
+def report_css():
+  with open(os.path.join(settings.BASE_DIR, "lunchreports", "static", "report.css")) as f:
+    return f.read()
+
+
+# Renders a report template to the HTML document handed to xhtml2pdf. Report
+# templates are looked up by name, so after the first render they come from
+# the cached template loader already compiled.
+def render_html(*, report_title, report_template, **kwargs):
+  start = time.perf_counter()
   html = render_to_string(
-      template_path,
+      report_template,
       {
           "title": report_title,
-          "BASE_DIR": settings.BASE_DIR,
+          "report_css": report_css(),
           **kwargs,
       },
   )
-  html = f"""
-<style>
-    body {{
-        margin: auto;
-        width: 90%;
-    }}
-
-    table {{
-        width: 100%;
-        border-collapse: collapse;
-        margin-bottom: 1rem;
-    }}
-
-    h1 {{
-        text-align: center;
-        margin-bottom: 1rem;
-    }}
-
-    tr, td {{
-        border: 1px solid #000;
-        padding: 2px;
-        text-align: center;
-    }}
-
-    th {{
-        font-weight: bold;
-        background-color: #f0f0f0;
-    }}
-
-    .total-quantity-row {{
-        font-weight: bold;
-        background-color: #d3d3d3;
-    }}
-
-    .total-row {{
-        font-weight: bold;
-        background-color: #f0f0f0;
-    }}
-</style>
-{html}
-"""
-  pisa.CreatePDF(html, dest=response)
-  return response
+  record_stage("template", time.perf_counter() - start, len(html))
+  return html
+
+
+# Lays a report out with the "reportlab" backend. flowables is the report's
+# layout function from table_pdf.py, context its template context.
+def render_tables(*, report_title, flowables, context):
+  start = time.perf_counter()
+  pdf = table_pdf.render_tables_pdf(flowables, context, title=report_title)
+  record_stage("pdf", time.perf_counter() - start, len(pdf))
+  return pdf
 
 
+# Converts an HTML document to PDF bytes.
+def html_to_pdf(html):
+  start = time.perf_counter()
+  pdf = render_worker.html_to_pdf(html)
+  record_stage("pdf", time.perf_counter() - start, len(pdf))
+  return pdf
@@ -0,0 +1,281 @@
+import csv
+import io
+import json
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.utils.dateparse import parse_date
+
+from .data_version import bump_data_version
+from .models import LunchItem, LunchItemOrder, Student, Teacher
+from .rollup import apply_order_deltas, order_rollup_key
+
+# Supported input formats. Each record references its lunch item, student and
+# teacher either by name ("lunch_item", "student", "teacher") or by primary
+# key ("lunch_item_id", "student_id", "teacher_id"), plus an optional
+# "quantity" (default 1) and "service_date" (YYYY-MM-DD, default today). Each
+# order goes to its customer's school.
+INGEST_FORMATS = ("csv", "jsonl", "json")
+
+INGEST_CHUNK_SIZE = 1000
+
+_REFERENCES = (
+    ("lunch_item", LunchItem),
+    ("student", Student),
+    ("teacher", Teacher),
+)
+
+
+class IngestFormatError(ValueError):
+    """The input could not be parsed as a batch of order records."""
+
+
+def parse_order_records(data, input_format):
+    """
+    Parse a CSV, JSON lines or JSON array document into order records.
+
+    :param data: Document as str.
+    :param input_format: One of INGEST_FORMATS.
+    :return: List of dicts, one per order.
+    """
+    try:
+        if input_format == "csv":
+            return list(csv.DictReader(io.StringIO(data)))
+        if input_format == "jsonl":
+            records = [json.loads(line) for line in data.splitlines() if line.strip()]
+        else:
+            records = json.loads(data)
+            if isinstance(records, dict):
+                records = records.get("orders")
+    except (csv.Error, ValueError) as e:
+        raise IngestFormatError(f"Invalid {input_format} input: {e}") from e
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise IngestFormatError("Expected a list of order objects.")
+    return records
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class _ReferenceCache:
+    """
+    Name and id lookups of one model, fetched with one query per chunk for
+    the values not seen yet and kept for the rest of the batch.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = set()
+        self.pks_by_name = {}
+        # School id per loaded pk, for models that belong to a school.
+        self.school_ids = {}
+        self.has_school = any(field.name == "school" for field in model._meta.fields)
+
+    def _fetch(self, rows, *fields):
+        if self.has_school:
+            rows = rows.values_list("pk", *fields, "school_id")
+            for row in rows:
+                self.school_ids[row[0]] = row[-1]
+                yield row[:-1]
+        else:
+            yield from rows.values_list("pk", *fields)
+
+    def load(self, ids, names):
+        missing_ids = set(ids) - self.ids
+        if missing_ids:
+            self.ids.update(pk for pk, in self._fetch(self.model.objects.filter(pk__in=missing_ids)))
+        missing_names = set(names) - self.pks_by_name.keys()
+        if missing_names:
+            for name in missing_names:
+                self.pks_by_name[name] = []
+            for pk, name in self._fetch(self.model.objects.filter(name__in=missing_names), "name"):
+                self.pks_by_name[name].append(pk)
+
+    def resolve(self, label, pk, name):
+        """
+        :return: Tuple of (primary key or None, error message or None).
+        """
+        if pk is not None:
+            if pk not in self.ids:
+                return None, f"Unknown {label} id {pk}."
+            return pk, None
+        pks = self.pks_by_name.get(name, [])
+        if not pks:
+            return None, f"Unknown {label} {name!r}."
+        if len(pks) > 1:
+            return None, f"{label.capitalize()} name {name!r} is ambiguous; reference it by id."
+        return pks[0], None
+
+
+def _integer_value(value):
+    """
+    :return: value as an int, or None unless it is an integer or a string of
+             digits. Floats, booleans and strings such as "2.5" aren't
+             coerced, so that they are reported rather than truncated.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and re.fullmatch(r"[+-]?[0-9]+", value.strip()):
+        return int(value)
+    return None
+
+
+def _reference_value(record, label):
+    """
+    :return: Tuple of (id, name, error) for one reference of a record.
+    """
+    pk = record.get(f"{label}_id")
+    name = record.get(label)
+    if not _blank(pk):
+        value = _integer_value(pk)
+        if value is None:
+            return None, None, f"Invalid {label}_id {pk!r}; expected an integer."
+        return value, None, None
+    if not _blank(name):
+        return None, str(name).strip(), None
+    return None, None, None
+
+
+def _quantity_value(record):
+    quantity = record.get("quantity")
+    if _blank(quantity):
+        return 1, None
+    value = _integer_value(quantity)
+    if value is None:
+        return None, f"Invalid quantity {quantity!r}; expected an integer."
+    if value < 1:
+        return None, "Quantity must be at least 1."
+    return value, None
+
+
+def _service_date_value(record):
+    service_date = record.get("service_date")
+    if _blank(service_date):
+        return None, None
+    try:
+        parsed = parse_date(str(service_date).strip())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        return None, f"Invalid service_date {service_date!r}; use YYYY-MM-DD."
+    return parsed, None
+
+
+def _build_orders(records, first_row, caches):
+    """
+    Validate a chunk of records and build unsaved LunchItemOrder objects.
+
+    :return: Tuple of (list of (row number, LunchItemOrder), list of errors).
+    """
+    parsed = []
+    for record in records:
+        values = {label: _reference_value(record, label) for label, _ in _REFERENCES}
+        parsed.append((values, _quantity_value(record), _service_date_value(record)))
+    for label, _ in _REFERENCES:
+        caches[label].load(
+            [values[label][0] for values, *_ in parsed if values[label][0] is not None],
+            [values[label][1] for values, *_ in parsed if values[label][1] is not None])
+
+    orders = []
+    errors = []
+    for row, (values, (quantity, quantity_error), (service_date, service_date_error)) in enumerate(
+            parsed, start=first_row):
+        row_errors = [error for _, _, error in values.values() if error]
+        if quantity_error:
+            row_errors.append(quantity_error)
+        if service_date_error:
+            row_errors.append(service_date_error)
+        resolved = {}
+        for label, _ in _REFERENCES:
+            pk, name, error = values[label]
+            if error or (pk is None and name is None):
+                continue
+            resolved[label], error = caches[label].resolve(label.replace("_", " "), pk, name)
+            if error:
+                row_errors.append(error)
+        if values["lunch_item"][:2] == (None, None):
+            row_errors.append("A lunch item is required.")
+        has_student = values["student"][:2] != (None, None)
+        has_teacher = values["teacher"][:2] != (None, None)
+        if has_student == has_teacher:
+            row_errors.append("An order needs either a student or a teacher, but not both.")
+        if row_errors:
+            errors.append({"row": row, "errors": row_errors})
+            continue
+        customer = "student" if has_student else "teacher"
+        order = LunchItemOrder(lunch_item_id=resolved["lunch_item"],
+                               student_id=resolved.get("student"),
+                               teacher_id=resolved.get("teacher"),
+                               school_id=caches[customer].school_ids[resolved[customer]],
+                               quantity=quantity)
+        if service_date is not None:
+            order.service_date = service_date
+        orders.append((row, order))
+    return orders, errors
+
+
+def _insert_orders(orders):
+    """
+    Insert a chunk of validated orders in one transaction, applying their
+    quantities to the order rollup (bulk_create bypasses the model signals).
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for order in orders:
+        delta = deltas[order_rollup_key(order)]
+        delta[0] += order.quantity
+        delta[1] += 1
+    with transaction.atomic():
+        LunchItemOrder.objects.bulk_create(orders)
+        apply_order_deltas(deltas)
+        bump_data_version()
+
+
+def ingest_orders(records, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Validate and insert a batch of order records.
+
+    References are resolved with one lookup query per model and chunk. Rows
+    that fail validation are reported and skipped; the others are inserted
+    with bulk_create, one transaction per chunk, so an error in one chunk
+    doesn't roll back the chunks before it. A chunk the database rejects is
+    retried one row at a time, reporting the rows that fail.
+
+    :param records: Iterable of dicts as returned by parse_order_records.
+    :param chunk_size: Number of records validated and inserted at a time.
+    :return: Dictionary with the number of rows read and orders created, and
+             a list of {"row": 1-based record number, "errors": [...]}.
+    """
+    caches = {label: _ReferenceCache(model) for label, model in _REFERENCES}
+    records = iter(records)
+    result = {"rows": 0, "created": 0, "errors": []}
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        orders, errors = _build_orders(chunk, result["rows"] + 1, caches)
+        result["rows"] += len(chunk)
+        result["errors"] += errors
+        if not orders:
+            continue
+        try:
+            _insert_orders([order for _, order in orders])
+        except DatabaseError:
+            # Insert the chunk's orders one at a time, to find and report the
+            # rows the database rejects and save the others.
+            for row, order in orders:
+                order.pk = None
+                try:
+                    _insert_orders([order])
+                except DatabaseError as e:
+                    result["errors"].append({"row": row, "errors": [f"Not saved: {e}"]})
+                else:
+                    result["created"] += 1
+        else:
+            result["created"] += len(orders)
+    result["errors"].sort(key=lambda error: error["row"])
+    return result
@@ -0,0 +1,222 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# Number of recent samples each rolling histogram keeps.
+HISTOGRAM_SIZE = 1000
+
+_current_metrics = ContextVar("lunchreports_report_metrics", default=None)
+
+
+class ReportMetrics:
+    """Measurements collected while serving one report request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.stage_seconds = {}
+        self.sizes = {}
+        self.total_seconds = 0.0
+
+    def server_timing(self):
+        entries = [f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f"{name};dur={seconds * 1000:.1f}"
+                    for name, seconds in self.stage_seconds.items()]
+        entries.append(f"total;dur={self.total_seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+    def as_dict(self):
+        return {
+            "duration_ms": round(self.total_seconds * 1000, 1),
+            "db_queries": self.queries,
+            "db_ms": round(self.query_seconds * 1000, 1),
+            **{f"{name}_ms": round(seconds * 1000, 1)
+               for name, seconds in self.stage_seconds.items()},
+            **{f"{name}_bytes": size for name, size in self.sizes.items()},
+        }
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_seconds += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def _install_query_recorder(connection, **kwargs):
+    # Installed on every connection rather than around the request, so that
+    # queries run by async views in the sync_to_async thread are counted too;
+    # the current request's metrics follow the context into that thread.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def record_stage(name, seconds, size=None):
+    """
+    Add the duration (and output size) of a report stage, such as "template"
+    or "pdf", to the current report request. Does nothing outside one.
+
+    :param name: Stage name, used in Server-Timing and the stats endpoint.
+    :param seconds: Time spent in the stage.
+    :param size: Size of what the stage produced, e.g. HTML or PDF length.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+    metrics.stage_seconds[name] = metrics.stage_seconds.get(name, 0.0) + seconds
+    if size is not None:
+        metrics.sizes[name] = metrics.sizes.get(name, 0) + size
+
+
+class RollingHistogram:
+    """Keeps the most recent samples of a metric and reports percentiles."""
+
+    def __init__(self, size=HISTOGRAM_SIZE):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        with self._lock:
+            self._samples.append(value)
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p):
+            # Nearest-rank percentile.
+            return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+        return {
+            "count": len(samples),
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+            "max": samples[-1],
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def _record_histograms(view_name, values):
+    with _histograms_lock:
+        for metric, value in values.items():
+            key = (view_name, metric)
+            if key not in _histograms:
+                _histograms[key] = RollingHistogram()
+            _histograms[key].add(value)
+
+
+def get_report_stats():
+    """
+    :return: {view name: {metric: {count, p50, p95, p99, max}}} over the
+             recent report requests served by this process.
+    """
+    with _histograms_lock:
+        histograms = list(_histograms.items())
+    stats = {}
+    for (view_name, metric), histogram in sorted(histograms):
+        stats.setdefault(view_name, {})[metric] = histogram.summary()
+    return stats
+
+
+def reset_report_stats():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def _report_view_name(request):
+    from .views import REPORTS
+
+    try:
+        url_name = resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+    # Async variants of the report views are named "<report>_async".
+    if url_name in REPORTS or url_name.removesuffix("_async") in REPORTS:
+        return url_name
+    return None
+
+
+class ReportInstrumentationMiddleware:
+    """
+    Measures report requests: total duration, database queries and query
+    time, and the template/PDF stages reported through record_stage().
+
+    Results are sent back in a Server-Timing header, logged as one JSON line
+    on the "lunchreports.instrumentation" logger and added to the rolling
+    histograms served by the report_stats view. Queries run while a
+    streaming response is being consumed happen after the response leaves
+    the middleware and are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        view_name = _report_view_name(request)
+        if view_name is None:
+            return self.get_response(request)
+        metrics = ReportMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self._finish(request, response, view_name, metrics, start)
+
+    async def __acall__(self, request):
+        view_name = _report_view_name(request)
+        if view_name is None:
+            return await self.get_response(request)
+        metrics = ReportMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self._finish(request, response, view_name, metrics, start)
+
+    def _finish(self, request, response, view_name, metrics, start):
+        metrics.total_seconds = time.perf_counter() - start
+        values = metrics.as_dict()
+        response["Server-Timing"] = metrics.server_timing()
+        logger.info(json.dumps({
+            "event": "report_request",
+            "view": view_name,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            **values,
+        }))
+        _record_histograms(view_name, values)
+        return response
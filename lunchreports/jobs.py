@@ -0,0 +1,255 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import render_worker
+from .data_version import get_data_version
+from .databases import get_report_db_alias
+from .pdf_cache import get_pdf_cache, report_cache_key
+
+# Default configuration, overridable with the LUNCHREPORTS_RENDER_JOBS setting:
+#   ASYNC_BY_DEFAULT: render every report in the background, not only those
+#       requested with ?async=1.
+#   WORKERS: size of the render process pool.
+#   DIRECTORY: where job metadata and finished PDFs are stored. Shared by all
+#       worker processes of a deployment.
+#   TTL: seconds after which jobs and their PDFs are deleted.
+#   RENDER_TIMEOUT: seconds after which a job still pending is taken as lost,
+#       e.g. with the worker process that queued it, and fails, so that the
+#       next identical request queues it again.
+DEFAULT_RENDER_JOBS = {
+    "ASYNC_BY_DEFAULT": False,
+    "WORKERS": 2,
+    "DIRECTORY": os.path.join(tempfile.gettempdir(), "lunchreports-jobs"),
+    "TTL": 60 * 60,
+    "RENDER_TIMEOUT": 10 * 60,
+}
+
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def get_render_jobs_config():
+    return {**DEFAULT_RENDER_JOBS, **getattr(settings, "LUNCHREPORTS_RENDER_JOBS", {})}
+
+
+def _job_directory():
+    directory = get_render_jobs_config()["DIRECTORY"]
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _job_path(job_id, suffix):
+    if not _JOB_ID_RE.match(job_id):
+        raise ValueError(f"Invalid report job id: {job_id!r}")
+    return os.path.join(_job_directory(), f"{job_id}{suffix}")
+
+
+def write_job_file(job_id, suffix, data):
+    """
+    Atomically write one of a job's files (".pdf" or ".error").
+    """
+    _write_atomic(_job_path(job_id, suffix), data)
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove_job_files(job_id):
+    for suffix in (".json", ".pdf", ".error"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(_job_path(job_id, suffix))
+
+
+def prune_expired_jobs():
+    """
+    Delete jobs, and their PDFs, created longer than the configured TTL ago.
+    """
+    expires_before = time.time() - get_render_jobs_config()["TTL"]
+    with os.scandir(_job_directory()) as it:
+        for entry in it:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                expired = entry.stat().st_mtime < expires_before
+            except FileNotFoundError:
+                continue
+            if expired:
+                _remove_job_files(entry.name[:-len(".json")])
+
+
+def _owner_is_gone(job):
+    # Only known for jobs queued on this host; on others RENDER_TIMEOUT
+    # applies.
+    if job.get("owner_host") != socket.gethostname():
+        return False
+    try:
+        os.kill(job["owner_pid"], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _lost_job_error(job):
+    """
+    :return: Why a pending job will never finish, or None while it may.
+    """
+    if _owner_is_gone(job):
+        return f"The worker process {job['owner_pid']} that queued it exited."
+    if time.time() - job["created"] > get_render_jobs_config()["RENDER_TIMEOUT"]:
+        return "It didn't finish within RENDER_TIMEOUT."
+    return None
+
+
+def get_report_job(job_id):
+    """
+    Look up a report job.
+
+    A pending job whose worker process exited, or that is older than
+    RENDER_TIMEOUT, is reported as failed.
+
+    :param job_id: Id returned by enqueue_report_job.
+    :return: Dictionary with the job's status, report kind, lunch item ids,
+             school id, service date and error (if it failed), or None if the
+             job is unknown or expired.
+    """
+    try:
+        with open(_job_path(job_id, ".json")) as f:
+            job = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    job["job_id"] = job_id
+    job["status"] = JOB_PENDING
+    if os.path.exists(_job_path(job_id, ".pdf")):
+        job["status"] = JOB_DONE
+    elif os.path.exists(_job_path(job_id, ".error")):
+        job["status"] = JOB_FAILED
+        with open(_job_path(job_id, ".error")) as f:
+            job["error"] = f.read()
+    else:
+        error = _lost_job_error(job)
+        if error is not None:
+            job["status"] = JOB_FAILED
+            job["error"] = error
+    return job
+
+
+def get_report_job_pdf_path(job_id):
+    """
+    :param job_id: Id returned by enqueue_report_job.
+    :return: Path of the finished PDF, or None if it isn't available.
+    """
+    path = _job_path(job_id, ".pdf")
+    return path if os.path.exists(path) else None
+
+
+def enqueue_report_job(report_kind, lunch_items, partition):
+    """
+    Queue a report for rendering in the background process pool.
+
+    Jobs are content-addressed by report kind, partition, lunch item
+    selection and data version, so identical concurrent requests, from any
+    worker process, share a single render. Failed jobs, including lost ones
+    (see get_report_job), are retried by the next identical request.
+
+    :param report_kind: Key of views.REPORTS.
+    :param lunch_items: List of LunchItem objects to include.
+    :param partition: ReportPartition the report is of.
+    :return: The job id.
+    """
+    prune_expired_jobs()
+    # Versioned as the report views' cache keys, on the connection reports
+    # are read from, so a job and the report it renders share the key.
+    job_id = report_cache_key(report_kind, lunch_items,
+                              get_data_version(using=get_report_db_alias()), partition)
+    metadata = {
+        "report_kind": report_kind,
+        "lunch_item_ids": [item.pk for item in lunch_items],
+        "school_id": partition.school_id,
+        "service_date": partition.service_date.isoformat(),
+        "created": time.time(),
+        # The process whose pool renders it.
+        "owner_host": socket.gethostname(),
+        "owner_pid": os.getpid(),
+    }
+    existing = get_report_job(job_id)
+    if existing is not None and existing["status"] == JOB_FAILED:
+        _remove_job_files(job_id)
+    try:
+        # O_EXCL makes creating the metadata file the deduplication lock.
+        fd = os.open(_job_path(job_id, ".json"), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return job_id
+    with os.fdopen(fd, "w") as f:
+        json.dump(metadata, f)
+
+    pdf_cache = get_pdf_cache()
+    pdf = pdf_cache.get(job_id) if pdf_cache else None
+    if pdf is not None:
+        write_job_file(job_id, ".pdf", pdf)
+        return job_id
+
+    args = (render_worker.run_report_job, job_id, report_kind, metadata["lunch_item_ids"],
+            metadata["school_id"], metadata["service_date"])
+    try:
+        future = _get_executor().submit(*args)
+    except BrokenProcessPool:
+        _reset_executor("LUNCHREPORTS_RENDER_JOBS")
+        future = _get_executor().submit(*args)
+    future.add_done_callback(lambda f: _record_pool_failure(job_id, f))
+    return job_id
+
+
+def _record_pool_failure(job_id, future):
+    # run_report_job records its own errors; this catches a dead pool worker.
+    if future.exception() is not None and get_report_job_pdf_path(job_id) is None:
+        write_job_file(job_id, ".error", str(future.exception()).encode())
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawned workers start with fresh database connections
+                # instead of sharing the parent's forked ones.
+                _executor = ProcessPoolExecutor(
+                    max_workers=get_render_jobs_config()["WORKERS"],
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=render_worker.init_worker,
+                    initargs=(settings.SETTINGS_MODULE,),
+                )
+    return _executor
+
+
+@receiver(setting_changed)
+def _reset_executor(setting, **kwargs):
+    global _executor
+    if setting == "LUNCHREPORTS_RENDER_JOBS" and _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
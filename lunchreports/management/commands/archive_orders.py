@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from lunchreports.archive import (
+    archivable_partitions,
+    archive_orders,
+    default_archive_cutoff,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive the orders of old service days: keep only their totals per school, "
+        "day, lunch item and customer in the compact archive table, which reports "
+        "of those days read instead, and delete the orders, rollup rows and order "
+        "change log rows. Keeps LUNCHREPORTS_ORDER_ARCHIVE[\"KEEP_DAYS\"] days by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="Archive the service days before this date (YYYY-MM-DD).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only list the school days that would be archived.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = default_archive_cutoff()
+        if options["before"]:
+            before = parse_date(options["before"])
+            if before is None:
+                raise CommandError(f"Invalid date {options['before']!r}; use YYYY-MM-DD.")
+        if options["dry_run"]:
+            partitions = archivable_partitions(before)
+            for school_id, service_date in partitions:
+                self.stdout.write(f"School {school_id}, {service_date.isoformat()}")
+            self.stdout.write(f"{len(partitions)} school days before {before.isoformat()} to archive.")
+            return
+        result = archive_orders(before, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['orders']} orders of {result['days']} school days "
+            f"before {before.isoformat()}."))
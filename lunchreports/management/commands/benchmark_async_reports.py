@@ -0,0 +1,132 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from lunchreports.views import REPORTS
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the report views in process against the current database: "
+        "the sync views called from a pool of threads, as under a threaded WSGI "
+        "server, and the async views called concurrently on one event loop, as "
+        "under ASGI. The PDF cache is disabled so every request renders. Reports "
+        "requests/second, latency percentiles and response status counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--report", choices=sorted(REPORTS), default="order_report")
+        parser.add_argument("--lunch-items", default="",
+                            help="Comma-separated lunch item names (default: all).")
+        parser.add_argument("--requests", type=int, default=40)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--workers", type=int,
+                            help="Render process pool size (default: LUNCHREPORTS_PDF_RENDERING).")
+        parser.add_argument("--max-renders", type=int,
+                            help="Async render cap (default: LUNCHREPORTS_PDF_RENDERING).")
+        parser.add_argument("--max-queued", type=int,
+                            help="Async render queue length (default: LUNCHREPORTS_PDF_RENDERING).")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+
+    def _summary(self, latencies, statuses, elapsed):
+        latencies = sorted(latencies)
+        ok = statuses.get(200, 0)
+        return {
+            "requests": len(latencies),
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(ok / elapsed, 2) if elapsed else None,
+            "latency_p50_seconds": round(statistics.median(latencies), 4),
+            "latency_p95_seconds": round(latencies[int(0.95 * (len(latencies) - 1))], 4),
+            "latency_max_seconds": round(latencies[-1], 4),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        }
+
+    def _run_wsgi(self, path, total, concurrency):
+        remaining = iter(range(total))
+        lock = threading.Lock()
+        latencies = []
+        statuses = Counter()
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    start = time.perf_counter()
+                    response = client.get(path)
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        statuses[response.status_code] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self._summary(latencies, statuses, time.perf_counter() - start)
+
+    async def _run_asgi(self, path, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        statuses = Counter()
+
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(total)))
+        return self._summary(latencies, statuses, time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+        rendering = {key: options[option] for key, option in
+                     (("WORKERS", "workers"), ("MAX_RENDERS", "max_renders"),
+                      ("MAX_QUEUED", "max_queued"))
+                     if options[option] is not None}
+        query = f"?lunch_items={options['lunch_items']}" if options["lunch_items"] else ""
+        report = options["report"]
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                               LUNCHREPORTS_PDF_CACHE={"BACKEND": None},
+                               LUNCHREPORTS_PDF_RENDERING=rendering):
+            # Warm up template loading and the render process pool.
+            Client().get(f"/{report}/{query}")
+            asyncio.run(AsyncClient().get(f"/async/{report}/{query}"))
+
+            results = {
+                "report": report,
+                "concurrency": options["concurrency"],
+                "wsgi": self._run_wsgi(f"/{report}/{query}",
+                                       options["requests"], options["concurrency"]),
+                "asgi": asyncio.run(self._run_asgi(f"/async/{report}/{query}",
+                                                   options["requests"], options["concurrency"])),
+            }
+        for path in ("wsgi", "asgi"):
+            summary = results[path]
+            self.stdout.write(
+                f"{path}  {summary['requests_per_second']:8.2f} req/s  "
+                f"p50 {summary['latency_p50_seconds'] * 1000:8.1f} ms  "
+                f"p95 {summary['latency_p95_seconds'] * 1000:8.1f} ms  "
+                f"statuses {summary['statuses']}")
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,166 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import Context, Engine
+from django.template.loader import get_template
+
+from lunchreports.models import Student, Teacher
+from lunchreports.partitions import get_report_partition
+from lunchreports.synthetic import generate_synthetic_school
+from lunchreports.views import _get_combined_report_data, _get_lunch_report_data
+
+# The combined table as it was rendered before the pivot stage: one chain of
+# get_item lookups and an include per (customer, lunch item) cell.
+LEGACY_TEMPLATES = {
+    "includes/combined_table.html": """{% load custom_filters %}
+<tbody>
+  {% for teacher_name, student_data in teacher_student_mapping.items %}
+    {% if teacher_name != '-' %}
+      <tr>
+        <td rowspan="{{ student_data|length|add:1 }}">{{ teacher_name }}</td>
+        <td>{{ student_data.0 }}</td>
+        {% include "includes/student_order.html" with student_name=student_data.0 %}
+      </tr>
+      {% for student_name in student_data|slice:"1:" %}
+        <tr>
+          <td>{{ student_name }}</td>
+          {% include "includes/student_order.html" %}
+        </tr>
+      {% endfor %}
+    {% endif %}
+
+    {% if teacher_name == '-' %}
+      {% for student_name in student_data %}
+        <tr>
+          <td>{{ teacher_name }}</td>
+          <td>{{ student_name }}</td>
+          {% include "includes/student_order.html" %}
+        </tr>
+      {% endfor %}
+    {% endif %}
+    
+    {% if teacher_name != '-' %}
+      <tr>
+        <td class="total-row">Total</td>
+        {% for item in lunch_items %}
+          {% with total=orders_detail|get_item:item.name|get_item:teacher_name %}
+            <td class="total-row">{{ total.group_quantity|default:"-" }}</td>
+          {% endwith %}
+        {% endfor %}
+      </tr>
+    {% endif %}
+  {% endfor %}
+</tbody>""",
+    "includes/student_order.html": """{% load custom_filters %}
+
+{% for item in lunch_items %}
+    {% with total=orders_detail|get_item:item.name|get_item:teacher_name %}
+        {% if total %}
+            {% with quantity=total.customers|get_item:student_name %}
+                <td>{{ quantity|default:"-" }}</td>
+            {% endwith %}
+        {% else %}
+            <td>-</td>
+        {% endif %}
+    {% endwith %}
+{% endfor %}""",
+}
+
+
+def _legacy_teacher_student_mapping():
+    mapping = {teacher.name: [student.name for student in teacher.students.all()] + [teacher.name]
+               for teacher in Teacher.objects.prefetch_related('students')}
+    mapping['-'] = [student.name for student in Student.objects.filter(teacher__isnull=True)]
+    return mapping
+
+
+def _legacy_orders_detail(item_reports):
+    return {
+        item_report.name: {
+            group.name: {
+                "group_quantity": group.group_quantity,
+                "customers": {customer.name: customer.quantity for customer in group.customers},
+            }
+            for group in item_report.groups
+        }
+        for item_report in item_reports
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering the combined report table with the legacy per-cell template "
+        "lookups against the pivot stage plus the flat row template. Synthetic data "
+        "is created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teachers", type=int, default=80)
+        parser.add_argument("--students", type=int, default=2000)
+        parser.add_argument("--items", type=int, default=50)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="Runs per variant; the fastest is reported.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def _best(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    def handle(self, *args, **options):
+        legacy_engine = Engine(
+            loaders=[("django.template.loaders.locmem.Loader", LEGACY_TEMPLATES)],
+            libraries={"custom_filters": "lunchreports.templatetags.custom_filters"},
+        )
+        legacy_template = legacy_engine.get_template("includes/combined_table.html")
+        template = get_template("includes/combined_table.html")
+        repeat = options["repeat"]
+
+        with transaction.atomic():
+            school = generate_synthetic_school(
+                teachers=options["teachers"],
+                students=options["students"],
+                lunch_items=options["items"],
+                orders=options["orders"],
+                name_prefix="Benchmark",
+            )
+            lunch_items = school["lunch_items"]
+            partition = get_report_partition(school["school_id"])
+
+            orders_detail = _legacy_orders_detail(_get_lunch_report_data(lunch_items, partition))
+            legacy_context = Context({
+                "lunch_items": lunch_items,
+                "orders_detail": orders_detail,
+                "teacher_student_mapping": _legacy_teacher_student_mapping(),
+            })
+            legacy_seconds, _ = self._best(lambda: legacy_template.render(legacy_context), repeat)
+
+            pivot_seconds, (combined_rows, _) = self._best(
+                lambda: _get_combined_report_data(lunch_items, partition), repeat)
+            render_seconds, _ = self._best(
+                lambda: template.render({"combined_rows": combined_rows}), repeat)
+            transaction.set_rollback(True)
+
+        results = {
+            "teachers": options["teachers"],
+            "students": options["students"],
+            "items": options["items"],
+            "orders": options["orders"],
+            "legacy_template_seconds": round(legacy_seconds, 4),
+            "pivot_seconds": round(pivot_seconds, 4),
+            "template_seconds": round(render_seconds, 4),
+        }
+        self.stdout.write(
+            f"legacy template render: {legacy_seconds:8.3f}s\n"
+            f"pivot build (incl. SQL): {pivot_seconds:8.3f}s\n"
+            f"row template render:    {render_seconds:8.3f}s\n"
+            f"speedup: {legacy_seconds / (pivot_seconds + render_seconds):.1f}x")
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,131 @@
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+
+from lunchreports.databases import get_report_db_alias
+from lunchreports.models import LunchItem, LunchItemOrder, Student, Teacher
+from lunchreports.partitions import get_report_partition
+from lunchreports.synthetic import generate_synthetic_school
+from lunchreports.views import _get_combined_report_data, _get_lunch_report_data
+
+NAME_PREFIX = "Concurrency"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run report readers and order writers in parallel threads against the "
+        "configured database and report read latencies, write throughput and "
+        "errors (e.g. \"database is locked\") as JSON. Creates a synthetic "
+        "school for the run and deletes it afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds.")
+        parser.add_argument("--synthetic", nargs=4, type=int, default=(10, 200, 5, 2000),
+                            metavar=("TEACHERS", "STUDENTS", "ITEMS", "ORDERS"))
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+
+    def _reader(self, lunch_items, partition, deadline, latencies, errors):
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    _get_lunch_report_data(lunch_items, partition)
+                    _get_combined_report_data(lunch_items, partition)
+                except DatabaseError as e:
+                    errors[f"read: {e}"] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def _writer(self, school, seed, deadline, writes, errors):
+        rng = random.Random(seed)
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    # A burst: a few orders of one customer in one transaction.
+                    with transaction.atomic():
+                        student = rng.choice(school["students"])
+                        for _ in range(rng.randint(1, 5)):
+                            LunchItemOrder.objects.create(
+                                lunch_item=rng.choice(school["lunch_items"]),
+                                student=student,
+                                quantity=rng.randint(1, 3))
+                            writes.append(1)
+                except DatabaseError as e:
+                    errors[f"write: {e}"] += 1
+        finally:
+            connections.close_all()
+
+    def _delete_school(self):
+        LunchItemOrder.objects.filter(lunch_item__name__startswith=NAME_PREFIX).delete()
+        Student.objects.filter(name__startswith=NAME_PREFIX).delete()
+        Teacher.objects.filter(name__startswith=NAME_PREFIX).delete()
+        LunchItem.objects.filter(name__startswith=NAME_PREFIX).delete()
+
+    def handle(self, *args, **options):
+        teachers, students, items, orders = options["synthetic"]
+        if min(teachers, students, items) < 1:
+            raise CommandError("--synthetic needs at least one teacher, student and item.")
+        if LunchItem.objects.filter(name__startswith=NAME_PREFIX).exists():
+            raise CommandError(f"Lunch items named {NAME_PREFIX}... exist already; "
+                               "delete them or use another database.")
+        with transaction.atomic():
+            school = generate_synthetic_school(
+                teachers=teachers, students=students, lunch_items=items, orders=orders,
+                seed=options["seed"], name_prefix=NAME_PREFIX)
+        lunch_items = list(LunchItem.objects.using(get_report_db_alias())
+                           .filter(name__startswith=NAME_PREFIX))
+        partition = get_report_partition(school["school_id"])
+
+        latencies = []
+        writes = []
+        errors = Counter()
+        deadline = time.monotonic() + options["duration"]
+        threads = [threading.Thread(target=self._reader,
+                                    args=(lunch_items, partition, deadline, latencies, errors))
+                   for _ in range(options["readers"])]
+        threads += [threading.Thread(target=self._writer,
+                                     args=(school, options["seed"] + i, deadline, writes, errors))
+                    for i in range(options["writers"])]
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.perf_counter() - start
+            self._delete_school()
+
+        latencies.sort()
+        results = {
+            "database": {alias: connections[alias].settings_dict["ENGINE"]
+                         for alias in connections},
+            "report_alias": get_report_db_alias(),
+            "readers": options["readers"],
+            "writers": options["writers"],
+            "seconds": round(elapsed, 3),
+            "reads": len(latencies),
+            "read_p50_seconds": round(statistics.median(latencies), 6) if latencies else None,
+            "read_p95_seconds": (round(latencies[int(0.95 * (len(latencies) - 1))], 6)
+                                 if latencies else None),
+            "read_max_seconds": round(latencies[-1], 6) if latencies else None,
+            "writes": len(writes),
+            "writes_per_second": round(len(writes) / elapsed, 1) if elapsed else None,
+            "errors": dict(errors),
+        }
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
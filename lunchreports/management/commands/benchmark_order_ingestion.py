@@ -0,0 +1,92 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from lunchreports.ingest import INGEST_CHUNK_SIZE, ingest_orders
+from lunchreports.models import LunchItemOrder
+from lunchreports.synthetic import generate_synthetic_school
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure order ingestion throughput in orders/second: bulk ingestion of "
+        "name-referenced records against saving orders one at a time, on a "
+        "synthetic school created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--synthetic", nargs=3, type=int, default=(40, 1000, 20),
+                            metavar=("TEACHERS", "STUDENTS", "ITEMS"))
+        parser.add_argument("--orders", type=int, default=10000,
+                            help="Orders ingested in bulk.")
+        parser.add_argument("--per-row-orders", type=int, default=500,
+                            help="Orders saved one at a time for comparison (0 to skip).")
+        parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+
+    def _records(self, school, count, seed):
+        # Same mix as generate_synthetic_school: a tenth of orders by teachers.
+        rng = random.Random(seed)
+        for _ in range(count):
+            record = {"lunch_item": rng.choice(school["lunch_items"]).name,
+                      "quantity": rng.randint(1, 3)}
+            if rng.random() < 0.1:
+                record["teacher"] = rng.choice(school["teachers"]).name
+            else:
+                record["student"] = rng.choice(school["students"]).name
+            yield record
+
+    def handle(self, *args, **options):
+        teachers, students, items = options["synthetic"]
+        if min(teachers, students, items) < 1:
+            raise CommandError("--synthetic needs at least one teacher, student and item.")
+        results = {"database": connection.vendor, "chunk_size": options["chunk_size"]}
+        with transaction.atomic():
+            school = generate_synthetic_school(
+                teachers=teachers, students=students, lunch_items=items, orders=0,
+                seed=options["seed"], name_prefix="Benchmark")
+            records = list(self._records(school, options["orders"], options["seed"]))
+
+            start = time.perf_counter()
+            ingested = ingest_orders(records, chunk_size=options["chunk_size"])
+            elapsed = time.perf_counter() - start
+            results["bulk"] = {
+                "orders": ingested["created"],
+                "errors": len(ingested["errors"]),
+                "seconds": round(elapsed, 6),
+                "orders_per_second": round(ingested["created"] / elapsed, 1) if elapsed else None,
+            }
+
+            per_row = options["per_row_orders"]
+            if per_row:
+                by_name = {key: {obj.name: obj for obj in school[key]}
+                           for key in ("lunch_items", "students", "teachers")}
+                orders = [
+                    LunchItemOrder(lunch_item=by_name["lunch_items"][record["lunch_item"]],
+                                   student=by_name["students"].get(record.get("student")),
+                                   teacher=by_name["teachers"].get(record.get("teacher")),
+                                   quantity=record["quantity"])
+                    for record in self._records(school, per_row, options["seed"] + 1)
+                ]
+                start = time.perf_counter()
+                for order in orders:
+                    order.save()
+                elapsed = time.perf_counter() - start
+                results["per_row"] = {
+                    "orders": per_row,
+                    "seconds": round(elapsed, 6),
+                    "orders_per_second": round(per_row / elapsed, 1) if elapsed else None,
+                }
+            transaction.set_rollback(True)
+
+        for mode in ("bulk", "per_row"):
+            if mode in results:
+                self.stdout.write(f"{mode:<8} {results[mode]['orders']:8d} orders  "
+                                  f"{results[mode]['orders_per_second']:10.1f} orders/s")
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
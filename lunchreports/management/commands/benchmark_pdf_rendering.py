@@ -0,0 +1,71 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lunchreports.generate_report import get_pdf_rendering_config, render_pdf_sections
+from lunchreports.partitions import get_report_partition
+from lunchreports.synthetic import generate_synthetic_school
+from lunchreports.views import render_report_pdf
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare wall-clock time of rendering the Lunch Order Report by Item with a "
+        "single pisa.CreatePDF call against parallel per-item rendering. Synthetic "
+        "data is created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 500],
+                            help="Menu sizes to benchmark.")
+        parser.add_argument("--orders-per-item", type=int, default=20)
+        parser.add_argument("--teachers", type=int, default=15)
+        parser.add_argument("--students", type=int, default=300)
+        parser.add_argument("--repeat", type=int, default=1,
+                            help="Runs per mode; the fastest is reported.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def _time(self, mode, lunch_items, partition, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render_report_pdf("order_report", lunch_items, partition, mode=mode)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        workers = get_pdf_rendering_config()["WORKERS"]
+        # Start the section pool up front so its startup isn't billed to a run.
+        render_pdf_sections(["<p>warm up</p>", "<p>warm up</p>"])
+
+        results = []
+        for size in options["items"]:
+            with transaction.atomic():
+                school = generate_synthetic_school(
+                    teachers=options["teachers"],
+                    students=options["students"],
+                    lunch_items=size,
+                    orders=size * options["orders_per_item"],
+                    name_prefix="Benchmark",
+                )
+                lunch_items = school["lunch_items"]
+                partition = get_report_partition(school["school_id"])
+                single = self._time("single", lunch_items, partition, options["repeat"])
+                parallel = self._time("parallel", lunch_items, partition, options["repeat"])
+                transaction.set_rollback(True)
+
+            results.append({
+                "items": size,
+                "single_seconds": round(single, 4),
+                "parallel_seconds": round(parallel, 4),
+                "speedup": round(single / parallel, 2),
+            })
+            self.stdout.write(
+                f"{size:>5} items: single {single:8.2f}s  parallel {parallel:8.2f}s  "
+                f"speedup {single / parallel:5.2f}x")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"workers": workers, "results": results}, f, indent=2)
@@ -0,0 +1,83 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.autoreload import reset_loaders
+from django.test import RequestFactory
+
+from lunchreports.generate_report import html_to_pdf, render_html, report_css
+from lunchreports.views import (
+    REPORTS,
+    _get_lunch_items_from_request,
+    _get_report_partition_from_request,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the per-request render of each report (template render, and "
+        "optionally HTML to PDF) against the current database, with the "
+        "compiled templates and report stylesheet cached as in a running "
+        "server (warm), and with both reloaded on every request (cold)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lunch-items", default="",
+                            help="Comma-separated lunch item names to report on (default: all).")
+        parser.add_argument("--school", default="", help="School id or name (default: the default school).")
+        parser.add_argument("--date", default="", help="Service date, YYYY-MM-DD (default: today).")
+        parser.add_argument("--reports", nargs="+", choices=sorted(REPORTS), default=sorted(REPORTS))
+        parser.add_argument("--repeat", type=int, default=50, help="Renders per report and mode.")
+        parser.add_argument("--pdf", action="store_true",
+                            help="Include the xhtml2pdf stage in each render.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+
+    def _time_renders(self, render, repeat, cold):
+        timings = []
+        for _ in range(repeat):
+            if cold:
+                reset_loaders()
+                report_css.cache_clear()
+            start = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - start)
+        return {
+            "min_seconds": round(min(timings), 6),
+            "median_seconds": round(statistics.median(timings), 6),
+        }
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        request = RequestFactory().get("/", {"lunch_items": options["lunch_items"],
+                                             "school": options["school"], "date": options["date"]})
+        lunch_items = _get_lunch_items_from_request(request)
+        try:
+            partition = _get_report_partition_from_request(request)
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        results = {}
+        for report_kind in options["reports"]:
+            report = REPORTS[report_kind]
+            context = report["context"](lunch_items, partition)
+
+            def render(report=report, context=context):
+                html = render_html(report_title=report["title"],
+                                   report_template=report["template"],
+                                   **context)
+                if options["pdf"]:
+                    html_to_pdf(html)
+
+            render()
+            results[report_kind] = {
+                mode: self._time_renders(render, options["repeat"], cold=mode == "cold")
+                for mode in ("cold", "warm")
+            }
+            cold, warm = results[report_kind]["cold"], results[report_kind]["warm"]
+            self.stdout.write(
+                f"{report_kind:<24} cold {cold['median_seconds'] * 1000:8.2f} ms  "
+                f"warm {warm['median_seconds'] * 1000:8.2f} ms  (median per request)")
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,215 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import nullcontext
+from io import BytesIO
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from pypdf import PdfReader
+
+from lunchreports.databases import get_report_db_alias
+from lunchreports.generate_report import (
+    PDF_BACKENDS,
+    html_to_pdf,
+    render_html,
+    render_tables,
+)
+from lunchreports.models import LunchItem, LunchItemOrder, Student, Teacher
+from lunchreports.name_index import get_name_index, invalidate_name_index
+from lunchreports.synthetic import generate_synthetic_school
+from lunchreports.views import (
+    REPORTS,
+    _get_lunch_items_from_request,
+    _get_report_partition_from_request,
+)
+
+# The main data query of each report, whose plan --explain records.
+EXPLAINED_QUERIES = {report_kind: report["cells"] for report_kind, report in REPORTS.items()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time each stage of report generation (name index load, lunch item lookup, report data, "
+        "template render, PDF render per backend) and record query counts and peak memory. "
+        "Runs against the current database, or against a synthetic school created "
+        "in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--synthetic", nargs=4, type=int,
+                            metavar=("TEACHERS", "STUDENTS", "ITEMS", "ORDERS"),
+                            help="Benchmark a synthetic school of this size.")
+        parser.add_argument("--synthetic-days", type=int, default=1,
+                            help="Service days, ending today, the synthetic orders are spread over. "
+                                 "Reports are of today, so this measures the cost of stored history.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--lunch-items", default="",
+                            help="Comma-separated lunch item names to report on (default: all).")
+        parser.add_argument("--school", default="", help="School id or name (default: the default school).")
+        parser.add_argument("--date", default="", help="Service date, YYYY-MM-DD (default: today).")
+        parser.add_argument("--reports", nargs="+", choices=sorted(REPORTS), default=sorted(REPORTS))
+        parser.add_argument("--skip-pdf", action="store_true",
+                            help="Don't time the PDF stages.")
+        parser.add_argument("--pdf-backends", nargs="+", choices=PDF_BACKENDS, default=list(PDF_BACKENDS),
+                            help="PDF backends to time, each as its own stage (default: all).")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="Timed runs per stage; min and median are reported.")
+        parser.add_argument("--explain", action="store_true",
+                            help="Record the query plan of each report's data query.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Print changes against a previous results file.")
+
+    def _measure(self, name, fn, repeat):
+        """
+        Run fn() once capturing its queries on the reports database (also a
+        warm-up), then time it repeat times, then run it once more under
+        tracemalloc.
+
+        A stage that raises is recorded with its error and returns None.
+        """
+        try:
+            with CaptureQueriesContext(connections[get_report_db_alias()]) as queries:
+                result = fn()
+        except Exception as e:
+            self.stage_results[name] = {"error": f"{type(e).__name__}: {e}"}
+            self.stderr.write(f"{name:<36} failed: {type(e).__name__}: {e}")
+            return None
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        query_time = sum(float(query["time"]) for query in queries.captured_queries)
+        self.stage_results[name] = {
+            "min_seconds": round(min(timings), 6),
+            "median_seconds": round(statistics.median(timings), 6),
+            "queries": len(queries),
+            "query_seconds": round(query_time, 6),
+            "peak_memory_bytes": peak,
+        }
+        self.stdout.write(
+            f"{name:<36} {min(timings) * 1000:10.1f} ms  {len(queries):4d} queries  "
+            f"{peak / 1024:10.0f} KiB peak")
+        return result
+
+    def _run(self, options):
+        request = RequestFactory().get("/", {"lunch_items": options["lunch_items"],
+                                             "school": options["school"], "date": options["date"]})
+        # Loaded by the first request and after edits; the stages below use it warm.
+        self._measure("name_index_load", lambda: get_name_index(refresh=True), options["repeat"])
+        lunch_items = self._measure(
+            "lunch_item_lookup", lambda: _get_lunch_items_from_request(request), options["repeat"])
+        partition = self._measure(
+            "partition_lookup", lambda: _get_report_partition_from_request(request), options["repeat"])
+        if partition is None:
+            raise CommandError(self.stage_results["partition_lookup"]["error"])
+        for report_kind in options["reports"]:
+            report = REPORTS[report_kind]
+            context = self._measure(
+                f"{report_kind}.data", lambda report=report: report["context"](lunch_items, partition),
+                options["repeat"])
+            if options["explain"]:
+                self.plans[report_kind] = EXPLAINED_QUERIES[report_kind](lunch_items, partition).explain()
+                self.stdout.write(f"{report_kind} plan:\n{self.plans[report_kind]}")
+            if context is None:
+                continue
+            html = self._measure(
+                f"{report_kind}.template",
+                lambda report=report, context=context: render_html(
+                    report_title=report["title"], report_template=report["template"], **context),
+                options["repeat"])
+            if html is None:
+                continue
+            self.stage_results[f"{report_kind}.template"]["html_bytes"] = len(html.encode())
+            if options["skip_pdf"]:
+                continue
+            renders = {
+                "xhtml2pdf": lambda html=html: html_to_pdf(html),
+                "reportlab": lambda report=report, context=context: render_tables(
+                    report_title=report["title"], flowables=report["flowables"], context=context),
+            }
+            for backend in options["pdf_backends"]:
+                stage = f"{report_kind}.pdf.{backend}"
+                pdf = self._measure(stage, renders[backend], options["repeat"])
+                if pdf is not None:
+                    self.stage_results[stage]["pdf_bytes"] = len(pdf)
+                    self.stage_results[stage]["pages"] = len(PdfReader(BytesIO(pdf)).pages)
+        using = get_report_db_alias()
+        return {
+            "teachers": Teacher.objects.using(using).count(),
+            "students": Student.objects.using(using).count(),
+            "lunch_items": LunchItem.objects.using(using).count(),
+            "orders": LunchItemOrder.objects.using(using).count(),
+            "partition_orders": LunchItemOrder.objects.using(using).filter(**partition.lookup()).count(),
+            "selected_lunch_items": len(lunch_items),
+        }
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        self.stage_results = {}
+        self.plans = {}
+        synthetic = options["synthetic"]
+        if synthetic and get_report_db_alias() != DEFAULT_DB_ALIAS:
+            # Reports read through their own connection, which can't see the
+            # uncommitted synthetic school.
+            raise CommandError(
+                f"--synthetic can't be used with a separate {get_report_db_alias()!r} database; "
+                "benchmark a database made with generate_synthetic_data instead.")
+        with transaction.atomic() if synthetic else nullcontext():
+            if synthetic:
+                teachers, students, items, orders = synthetic
+                generate_synthetic_school(teachers=teachers, students=students,
+                                          lunch_items=items, orders=orders,
+                                          days=options["synthetic_days"],
+                                          seed=options["seed"], name_prefix="Benchmark")
+            dataset = self._run(options)
+            if synthetic:
+                transaction.set_rollback(True)
+        if synthetic:
+            # The name index holds the rolled back synthetic school.
+            invalidate_name_index()
+
+        results = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connections[get_report_db_alias()].vendor,
+            "repeat": options["repeat"],
+            "dataset": dataset,
+            "stages": self.stage_results,
+        }
+        if options["explain"]:
+            results["plans"] = self.plans
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+        if options["compare"]:
+            self._compare(options["compare"], results)
+
+    def _compare(self, path, results):
+        with open(path) as f:
+            previous = json.load(f)
+        self.stdout.write(f"\nChange against {path} (min time, queries, peak memory):")
+        for name, stage in results["stages"].items():
+            before = previous.get("stages", {}).get(name)
+            if before is None or "error" in before or "error" in stage:
+                continue
+            change = (stage["min_seconds"] / before["min_seconds"] - 1) * 100 if before["min_seconds"] else 0
+            self.stdout.write(
+                f"{name:<36} {change:+8.1f}%  {stage['queries'] - before['queries']:+5d} queries  "
+                f"{(stage['peak_memory_bytes'] - before['peak_memory_bytes']) / 1024:+10.0f} KiB")
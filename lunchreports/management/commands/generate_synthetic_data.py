@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lunchreports.synthetic import generate_synthetic_school
+
+
+class Command(BaseCommand):
+    help = (
+        "Add a reproducible synthetic school (teachers, students, lunch items and "
+        "orders) to the database using bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teachers", type=int, default=40)
+        parser.add_argument("--students", type=int, default=1000)
+        parser.add_argument("--items", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Same seed and counts always produce the same data.")
+        parser.add_argument("--prefix", default="Synthetic",
+                            help="Prefix of generated names; lunch item names must be unique.")
+        parser.add_argument("--unassigned-ratio", type=float, default=0.05,
+                            help="Share of students without a teacher.")
+        parser.add_argument("--teacher-order-ratio", type=float, default=0.1,
+                            help="Share of orders placed by teachers.")
+        parser.add_argument("--days", type=int, default=1,
+                            help="Number of service days, ending today, the orders are spread over.")
+        parser.add_argument("--school", default=None,
+                            help="School name, created if missing (default: the default school).")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            school = generate_synthetic_school(
+                teachers=options["teachers"],
+                students=options["students"],
+                lunch_items=options["items"],
+                orders=options["orders"],
+                seed=options["seed"],
+                name_prefix=options["prefix"],
+                unassigned_ratio=options["unassigned_ratio"],
+                teacher_order_ratio=options["teacher_order_ratio"],
+                days=options["days"],
+                school=options["school"],
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(school['teachers'])} teachers, {len(school['students'])} students, "
+            f"{len(school['lunch_items'])} lunch items and {options['orders']} orders "
+            f"over {options['days']} days."))
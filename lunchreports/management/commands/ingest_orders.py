@@ -0,0 +1,52 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lunchreports.ingest import (
+    INGEST_CHUNK_SIZE,
+    INGEST_FORMATS,
+    IngestFormatError,
+    ingest_orders,
+    parse_order_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create orders in bulk from a CSV, JSON lines or JSON file. Orders reference "
+        "their lunch item, student or teacher by name (lunch_item, student, teacher) "
+        "or id (lunch_item_id, student_id, teacher_id). Invalid rows are reported "
+        "and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for standard input.")
+        parser.add_argument("--format", choices=INGEST_FORMATS,
+                            help="Input format (default: from the file extension).")
+        parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE,
+                            help="Orders validated and inserted per transaction.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if input_format not in INGEST_FORMATS:
+            raise CommandError(f"Can't tell the input format of {path}; pass --format.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        if path == "-":
+            data = sys.stdin.read()
+        else:
+            with open(path, encoding="utf-8", newline="") as f:
+                data = f.read()
+        try:
+            records = parse_order_records(data, input_format)
+        except IngestFormatError as e:
+            raise CommandError(str(e)) from e
+
+        result = ingest_orders(records, chunk_size=options["chunk_size"])
+        for error in result["errors"]:
+            self.stderr.write(f"Row {error['row']}: {' '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} of {result['rows']} orders "
+            f"({len(result['errors'])} rows rejected)."))
@@ -0,0 +1,384 @@
+import importlib.util
+import json
+import os
+import platform
+import random
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from lunchreports.generate_report import PDF_BACKENDS
+from lunchreports.views import REPORTS
+
+NAME_PREFIX = "LoadTest"
+
+# How each server is started; {host}, {port} and {workers} are filled in.
+# "wsgi" runs gunicorn with {workers} processes, as deployed. The ASGI server
+# serves the async report views (async/<report>/) from one uvicorn process,
+# which renders in the render process pool. "runserver" is Django's
+# single-process development server: only a stand-in where gunicorn isn't
+# installed, whose numbers don't reflect any deployment.
+SERVER_COMMANDS = {
+    "wsgi": [sys.executable, "-m", "gunicorn", "django_project.wsgi:application",
+             "--bind", "{host}:{port}", "--workers", "{workers}"],
+    "asgi": [sys.executable, "-m", "uvicorn", "django_project.asgi:application",
+             "--host", "{host}", "--port", "{port}"],
+    "runserver": [sys.executable, "manage.py", "runserver", "{host}:{port}", "--noreload"],
+}
+
+# Module each server needs, from requirements.txt.
+SERVER_MODULES = {
+    "wsgi": "gunicorn",
+    "asgi": "uvicorn",
+}
+
+# Settings of the server under test: the project's, with DEBUG off as when
+# deployed, on the synthetic database.
+SETTINGS_MODULE = """from {base} import *  # noqa: F401,F403
+
+for _database in DATABASES.values():
+    _database["NAME"] = {database!r}
+DEBUG = False
+"""
+
+SELECTIONS = ("all", "one", "some")
+
+
+def _percentile(latencies, q):
+    # latencies sorted; nearest rank, as the other benchmarks.
+    return latencies[int(q * (len(latencies) - 1))]
+
+
+def _process_usage(pid):
+    """
+    CPU time and resident memory of a process and its descendants (e.g. a
+    render pool), read from /proc.
+
+    :return: Tuple of (cpu_seconds, rss_bytes), or None without /proc.
+    """
+    children = defaultdict(list)
+    stats = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesized command name, from state on.
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{entry}/statm") as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[int(fields[1])].append(int(entry))
+        stats[int(entry)] = (int(fields[11]) + int(fields[12]), resident_pages)
+    if pid not in stats:
+        return None
+    ticks = pages = 0
+    pending = [pid]
+    while pending:
+        process = pending.pop()
+        process_ticks, process_pages = stats.get(process, (0, 0))
+        ticks += process_ticks
+        pages += process_pages
+        pending.extend(children.get(process, ()))
+    return ticks / os.sysconf("SC_CLK_TCK"), pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the report endpoints: create a synthetic SQLite database, start the "
+        "project under a WSGI (gunicorn) or ASGI (uvicorn) server in a subprocess, "
+        "and drive concurrent clients requesting a mix of reports and lunch item "
+        "selections for a fixed duration. Reports throughput, latency percentiles, error "
+        "rates and the server's CPU time and RSS as JSON, and compares against an "
+        "earlier results file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="wsgi",
+                            help="\"runserver\" is the development server, only a stand-in "
+                                 "for a real WSGI server (default: wsgi).")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="gunicorn worker processes (default: one per CPU).")
+        parser.add_argument("--server-command",
+                            help="Start the server with this command instead, e.g. "
+                                 "\"gunicorn -w 4 -b {host}:{port} django_project.wsgi\".")
+        parser.add_argument("--synthetic", nargs=4, type=int, default=(20, 500, 10, 5000),
+                            metavar=("TEACHERS", "STUDENTS", "ITEMS", "ORDERS"))
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Seeds the synthetic data and the clients' request mix.")
+        parser.add_argument("--reports", nargs="+", choices=sorted(REPORTS), default=sorted(REPORTS))
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds.")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout, seconds.")
+        parser.add_argument("--pdf-backend", choices=PDF_BACKENDS,
+                            help="LUNCHREPORTS_PDF_RENDERING BACKEND of the server (default: as configured).")
+        parser.add_argument("--pdf-cache", action="store_true",
+                            help="Keep the server's PDF cache; by default every request renders.")
+        parser.add_argument("--startup-timeout", type=float, default=60.0,
+                            help="Seconds to wait for the server to answer.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Print changes against a previous results file.")
+
+    def _manage(self, env, *args):
+        try:
+            subprocess.run([sys.executable, "manage.py", *args], cwd=settings.BASE_DIR, env=env,
+                           check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f"manage.py {args[0]} failed:\n{e.stdout}{e.stderr}") from e
+
+    def _start_server(self, options, env, log):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        if options["server_command"]:
+            command = shlex.split(options["server_command"].format(host="127.0.0.1", port=port))
+        else:
+            command = [part.format(host="127.0.0.1", port=port, workers=options["workers"])
+                       for part in SERVER_COMMANDS[options["server"]]]
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + options["startup_timeout"]
+        while True:
+            try:
+                urlopen(f"{base_url}/", timeout=1).close()
+                return server, base_url
+            except HTTPError:
+                return server, base_url
+            except OSError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                self._stop_server(server)
+                log.seek(0)
+                raise CommandError(f"The server didn't start:\n{log.read().decode(errors='replace')[-4000:]}")
+            time.sleep(0.2)
+
+    def _stop_server(self, server):
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    def _path(self, options, report_kind):
+        return f"/async/{report_kind}/" if options["server"] == "asgi" else f"/{report_kind}/"
+
+    def _request(self, url, timeout):
+        """
+        :return: Tuple of (seconds, error or None). A response that isn't a
+                 PDF, such as the report views' error page, is an error.
+        """
+        start = time.perf_counter()
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                response.read()
+                content_type = response.headers.get("Content-Type", "")
+            error = None if content_type == "application/pdf" else f"not a PDF: {content_type}"
+        except HTTPError as e:
+            error = f"HTTP {e.code}"
+        except OSError as e:
+            error = type(e).__name__
+        return time.perf_counter() - start, error
+
+    def _client(self, options, base_url, lunch_items, seed, deadline, records, lock):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            report_kind = rng.choice(options["reports"])
+            selection = rng.choice(SELECTIONS)
+            query = {}
+            if selection == "one":
+                query["lunch_items"] = rng.choice(lunch_items)
+            elif selection == "some":
+                query["lunch_items"] = ",".join(rng.sample(lunch_items, min(3, len(lunch_items))))
+            url = f"{base_url}{self._path(options, report_kind)}"
+            if query:
+                url += f"?{urlencode(query)}"
+            seconds, error = self._request(url, options["timeout"])
+            with lock:
+                records.append((report_kind, selection, seconds, error))
+
+    def _sample_usage(self, pid, stop, samples):
+        while True:
+            usage = _process_usage(pid)
+            if usage is not None:
+                samples.append(usage)
+            if stop.wait(0.25):
+                return
+
+    def _summary(self, records, elapsed):
+        latencies = sorted(seconds for _, _, seconds, error in records if error is None)
+        errors = Counter(error for _, _, _, error in records if error is not None)
+        summary = {
+            "requests": len(records),
+            "errors": sum(errors.values()),
+            "error_rate": round(sum(errors.values()) / len(records), 4) if records else None,
+            "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "latency_seconds": {
+                name: round(_percentile(latencies, q), 4)
+                for name, q in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1))
+            } if latencies else None,
+        }
+        if errors:
+            summary["error_counts"] = dict(errors.most_common())
+        return summary
+
+    def _run(self, options, base_url, server, lunch_items):
+        # Warm up: templates, the name index and any render pool.
+        for report_kind in options["reports"]:
+            self._request(f"{base_url}{self._path(options, report_kind)}", options["timeout"])
+
+        records = []
+        lock = threading.Lock()
+        samples = []
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample_usage, args=(server.pid, stop, samples))
+        sampler.start()
+        deadline = time.monotonic() + options["duration"]
+        clients = [threading.Thread(target=self._client,
+                                    args=(options, base_url, lunch_items, options["seed"] + i,
+                                          deadline, records, lock))
+                   for i in range(options["concurrency"])]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        sampler.join()
+
+        results = {**self._summary(records, elapsed), "seconds": round(elapsed, 3)}
+        results["reports"] = {
+            report_kind: self._summary([r for r in records if r[0] == report_kind], elapsed)
+            for report_kind in options["reports"]
+        }
+        results["selections"] = {
+            selection: self._summary([r for r in records if r[1] == selection], elapsed)
+            for selection in SELECTIONS
+        }
+        if len(samples) > 1:
+            cpu_seconds = samples[-1][0] - samples[0][0]
+            results["server_process"] = {
+                "cpu_seconds": round(cpu_seconds, 3),
+                "cpu_percent": round(cpu_seconds / elapsed * 100, 1),
+                "rss_bytes_max": max(rss for _, rss in samples),
+                "rss_bytes_end": samples[-1][1],
+            }
+        else:
+            # No /proc: CPU and memory aren't measured.
+            results["server_process"] = None
+        return results
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["duration"] <= 0:
+            raise CommandError("--concurrency must be at least 1 and --duration positive.")
+        teachers, students, items, orders = options["synthetic"]
+        if min(teachers, students, items) < 1:
+            raise CommandError("--synthetic needs at least one teacher, student and item.")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+        module = SERVER_MODULES.get(options["server"])
+        if (module and not options["server_command"]
+                and importlib.util.find_spec(module) is None):
+            raise CommandError(f"--server {options['server']} needs {module}: "
+                               "pip install -r requirements.txt")
+        if connection.vendor != "sqlite":
+            raise CommandError("The load test creates a synthetic SQLite database; "
+                               "run it with the SQLite settings.")
+
+        directory = tempfile.mkdtemp(prefix="lunchreports-loadtest-")
+        try:
+            with open(os.path.join(directory, "loadtest_settings.py"), "w") as f:
+                f.write(SETTINGS_MODULE.format(base=settings.SETTINGS_MODULE,
+                                               database=os.path.join(directory, "loadtest.sqlite3")))
+                if not options["pdf_cache"]:
+                    # Every request renders.
+                    f.write('LUNCHREPORTS_PDF_CACHE = {"BACKEND": None}\n')
+                else:
+                    # A filesystem cache apart from the project's, whose PDFs are of other data.
+                    f.write("LUNCHREPORTS_PDF_CACHE = {**globals().get(\"LUNCHREPORTS_PDF_CACHE\", {}), "
+                            f"\"LOCATION\": {os.path.join(directory, 'pdf_cache')!r}}}\n")
+                if options["pdf_backend"]:
+                    f.write("LUNCHREPORTS_PDF_RENDERING = {**globals().get(\"LUNCHREPORTS_PDF_RENDERING\", {}), "
+                            f"\"BACKEND\": {options['pdf_backend']!r}}}\n")
+            env = {
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": "loadtest_settings",
+                "PYTHONPATH": os.pathsep.join(filter(None, [directory, str(settings.BASE_DIR),
+                                                            os.environ.get("PYTHONPATH")])),
+            }
+            self.stdout.write(f"Creating a synthetic school of {teachers} teachers, {students} "
+                              f"students, {items} lunch items and {orders} orders...")
+            self._manage(env, "migrate", "--noinput")
+            self._manage(env, "generate_synthetic_data", "--teachers", str(teachers),
+                         "--students", str(students), "--items", str(items), "--orders", str(orders),
+                         "--seed", str(options["seed"]), "--prefix", NAME_PREFIX)
+            lunch_items = [f"{NAME_PREFIX} Item {i:04d}" for i in range(items)]
+
+            with open(os.path.join(directory, "server.log"), "w+b") as log:
+                server, base_url = self._start_server(options, env, log)
+                try:
+                    self.stdout.write(f"Running {options['concurrency']} clients for "
+                                      f"{options['duration']:g}s against {base_url}...")
+                    run = self._run(options, base_url, server, lunch_items)
+                finally:
+                    self._stop_server(server)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        results = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "server": options["server_command"] or options["server"],
+            "workers": (options["workers"]
+                        if options["server"] == "wsgi" and not options["server_command"] else None),
+            "pdf_backend": options["pdf_backend"],
+            "pdf_cache": options["pdf_cache"],
+            "concurrency": options["concurrency"],
+            "dataset": {"teachers": teachers, "students": students, "lunch_items": items,
+                        "orders": orders, "seed": options["seed"]},
+            **run,
+        }
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+        if options["compare"]:
+            self._compare(options["compare"], results)
+
+    def _compare(self, path, results):
+        with open(path) as f:
+            previous = json.load(f)
+        self.stdout.write(f"\nChange against {path} (throughput, p95 latency, error rate):")
+        for name, summary, before in [("all", results, previous),
+                                      *((name, summary, previous.get("reports", {}).get(name))
+                                        for name, summary in results["reports"].items())]:
+            if not before or not before.get("latency_seconds") or not summary["latency_seconds"]:
+                continue
+            throughput = ((summary["requests_per_second"] / before["requests_per_second"] - 1) * 100
+                          if before["requests_per_second"] else 0)
+            p95 = (summary["latency_seconds"]["p95"] / before["latency_seconds"]["p95"] - 1) * 100
+            self.stdout.write(
+                f"{name:<24} {throughput:+8.1f}% req/s  {p95:+8.1f}% p95  "
+                f"{(summary['error_rate'] - before['error_rate']) * 100:+6.2f} pts errors")
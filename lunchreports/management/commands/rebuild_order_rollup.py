@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lunchreports.rollup import find_order_rollup_mismatches, rebuild_order_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-customer order rollup table and verify it against LunchItemOrder."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the rollup table against the raw orders; don't rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            written = rebuild_order_rollup()
+            self.stdout.write(f"Rebuilt order rollup with {written} rows.")
+
+        mismatches = find_order_rollup_mismatches()
+        for key, expected, actual in mismatches:
+            self.stderr.write(
+                f"Mismatch for (school, service_date, lunch_item, student, teacher)={key}: "
+                f"expected (quantity, orders)={expected}, found {actual}")
+        if mismatches:
+            raise CommandError(f"Order rollup has {len(mismatches)} mismatched rows.")
+        self.stdout.write(self.style.SUCCESS("Order rollup matches LunchItemOrder."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lunchreports.name_index import select_lunch_items
+from lunchreports.order_changes import prune_order_changes
+from lunchreports.partitions import get_report_partition
+from lunchreports.snapshots import create_report_snapshot, prune_report_snapshots
+from lunchreports.views import REPORTS
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot reports: store their current data and PDF so they can be "
+        "downloaded again from report_snapshots/<id>/download/ without being "
+        "re-queried or re-rendered. Prunes snapshots past LUNCHREPORTS_SNAPSHOTS "
+        "retention, and order change log rows past LUNCHREPORTS_ORDER_CHANGES "
+        "retention. Meant to be run on a schedule, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", nargs="+", choices=sorted(REPORTS), default=sorted(REPORTS))
+        parser.add_argument("--lunch-items", default="",
+                            help="Comma-separated lunch item names to report on (default: all).")
+        parser.add_argument("--school", default="", help="School id or name (default: the default school).")
+        parser.add_argument("--date", default="", help="Service date, YYYY-MM-DD (default: today).")
+        parser.add_argument("--prune-only", action="store_true",
+                            help="Only prune old snapshots and order changes; don't take new snapshots.")
+
+    def handle(self, *args, **options):
+        if not options["prune_only"]:
+            lunch_items = select_lunch_items(options["lunch_items"].split(","))
+            try:
+                partition = get_report_partition(options["school"] or None, options["date"] or None)
+            except ValueError as e:
+                raise CommandError(str(e)) from e
+            for report_kind in options["reports"]:
+                snapshot = create_report_snapshot(report_kind, lunch_items, partition)
+                self.stdout.write(
+                    f"Snapshot {snapshot.pk} of {report_kind}: "
+                    f"{len(snapshot.data) / 1024:.1f} KiB data, {len(snapshot.pdf) / 1024:.1f} KiB PDF.")
+        pruned = prune_report_snapshots()
+        self.stdout.write(f"Pruned {pruned} snapshots.")
+        pruned = prune_order_changes()
+        self.stdout.write(f"Pruned {pruned} order change log rows.")
@@ -0,0 +1,62 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from lunchreports.warmup import get_warmup_cache, next_cutoff, warmup_reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the standard reports (order report and combined report of all lunch "
+        "items, and the order report of each item) into the PDF cache, so the first "
+        "requests after the order cutoff are served from it. Runs once, e.g. from cron at "
+        "LUNCHREPORTS_REPORT_WARMUP CUTOFF, or with --wait as a worker that warms them at "
+        "every cutoff. Progress is served by the report_warmup/ endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--school", action="append", default=[],
+                            help="School id or name; repeatable (default: the SCHOOLS setting, "
+                                 "or every school).")
+        parser.add_argument("--date", default="", help="Service date, YYYY-MM-DD (default: today).")
+        parser.add_argument("--wait", action="store_true",
+                            help="Keep running, warming the reports of the day at every cutoff "
+                                 "(--date is ignored).")
+
+    def _warm(self, schools, service_date):
+        start = time.perf_counter()
+        try:
+            status = warmup_reports(schools, service_date)
+        except (ImproperlyConfigured, ValueError) as e:
+            raise CommandError(str(e)) from e
+        cached = sum(1 for entry in status["reports"] if entry.get("cached"))
+        self.stdout.write(
+            f"Warmed {status['done']} of {status['total']} reports for {status['service_date']} "
+            f"({cached} already cached, {status['failed']} failed) "
+            f"in {time.perf_counter() - start:.1f}s.")
+
+    def handle(self, *args, **options):
+        service_date = None
+        if options["date"]:
+            service_date = parse_date(options["date"])
+            if service_date is None:
+                raise CommandError(f"Invalid date {options['date']!r}; use YYYY-MM-DD.")
+        try:
+            # Checked up front, rather than at the first cutoff with --wait.
+            get_warmup_cache()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e)) from e
+        if not options["wait"]:
+            self._warm(options["school"], service_date)
+            return
+        while True:
+            cutoff = next_cutoff()
+            self.stdout.write(f"Waiting for the cutoff at {cutoff:%Y-%m-%d %H:%M %Z}.")
+            time.sleep(max(0, (cutoff - timezone.now()).total_seconds()))
+            # Connections left idle since the last cutoff may have been closed.
+            close_old_connections()
+            self._warm(options["school"], None)
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.14 on 2026-10-18 00:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollup(apps, _schema_editor):
+    LunchItemOrder = apps.get_model('lunchreports', 'LunchItemOrder')
+    LunchItemOrderRollup = apps.get_model('lunchreports', 'LunchItemOrderRollup')
+    rows = (
+        LunchItemOrder.objects
+        .values('lunch_item_id', 'student_id', 'teacher_id')
+        .annotate(total_quantity=Sum('quantity'), total_orders=Count('id'))
+        .order_by()
+    )
+    LunchItemOrderRollup.objects.bulk_create(
+        (LunchItemOrderRollup(lunch_item_id=row['lunch_item_id'],
+                              student_id=row['student_id'],
+                              teacher_id=row['teacher_id'],
+                              quantity=row['total_quantity'],
+                              order_count=row['total_orders'])
+         for row in rows),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='teacher',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='students', to='lunchreports.teacher'),
+        ),
+        migrations.CreateModel(
+            name='LunchItemOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('order_count', models.IntegerField(default=0)),
+                ('lunch_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_rollups', to='lunchreports.lunchitem')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='lunchreports.student')),
+                ('teacher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='lunchreports.teacher')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='lunchitemorderrollup',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('student__isnull', False), ('teacher__isnull', True)), models.Q(('student__isnull', True), ('teacher__isnull', False)), _connector='OR'), name='rollup_either_student_or_teacher'),
+        ),
+        migrations.AddConstraint(
+            model_name='lunchitemorderrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('student__isnull', False)), fields=('lunch_item', 'student'), name='unique_rollup_per_student'),
+        ),
+        migrations.AddConstraint(
+            model_name='lunchitemorderrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('teacher__isnull', False)), fields=('lunch_item', 'teacher'), name='unique_rollup_per_teacher'),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
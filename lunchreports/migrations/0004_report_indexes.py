@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-18 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0003_reportdataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lunchitemorder',
+            index=models.Index(fields=['lunch_item', 'student', 'teacher', 'quantity'], name='order_item_customer_qty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lunchitemorderrollup',
+            index=models.Index(fields=['lunch_item', 'student', 'teacher', 'quantity'], name='rollup_item_customer_qty_idx'),
+        ),
+    ]
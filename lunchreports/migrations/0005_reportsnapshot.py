@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0004_report_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_kind', models.CharField(max_length=64)),
+                ('lunch_item_ids', models.JSONField(default=list)),
+                ('data_version', models.BigIntegerField()),
+                ('data', models.BinaryField()),
+                ('pdf', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['report_kind', '-created_at'], name='snapshot_kind_created_idx')],
+            },
+        ),
+    ]
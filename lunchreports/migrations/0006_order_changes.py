@@ -0,0 +1,42 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0005_reportsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lunchitemorder',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorder',
+            name='updated_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='reportsnapshot',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='LunchItemOrderChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lunch_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_changes', to='lunchreports.lunchitem')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='lunchreports.student')),
+                ('teacher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='lunchreports.teacher')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lunch_item', 'changed_at', 'student', 'teacher', 'quantity'], name='order_change_item_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0006_order_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='School',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        # Nullable until 0008 has assigned the existing rows to a partition.
+        migrations.AddField(
+            model_name='teacher',
+            name='school',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='teachers', to='lunchreports.school'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='school',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='students', to='lunchreports.school'),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorder',
+            name='school',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='lunch_item_orders', to='lunchreports.school'),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorder',
+            name='service_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorderrollup',
+            name='school',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_rollups', to='lunchreports.school'),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorderrollup',
+            name='service_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorderchange',
+            name='school',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_changes', to='lunchreports.school'),
+        ),
+        migrations.AddField(
+            model_name='lunchitemorderchange',
+            name='service_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='reportsnapshot',
+            name='school',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_snapshots', to='lunchreports.school'),
+        ),
+        migrations.AddField(
+            model_name='reportsnapshot',
+            name='service_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RemoveConstraint(
+            model_name='lunchitemorderrollup',
+            name='unique_rollup_per_student',
+        ),
+        migrations.RemoveConstraint(
+            model_name='lunchitemorderrollup',
+            name='unique_rollup_per_teacher',
+        ),
+        migrations.RemoveIndex(
+            model_name='lunchitemorder',
+            name='order_item_customer_qty_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='lunchitemorderrollup',
+            name='rollup_item_customer_qty_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='lunchitemorderchange',
+            name='order_change_item_time_idx',
+        ),
+        migrations.CreateModel(
+            name='LunchItemOrderArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_date', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('order_count', models.IntegerField()),
+                ('lunch_item', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='order_archives', to='lunchreports.lunchitem')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='order_archives', to='lunchreports.school')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='lunchreports.student')),
+                ('teacher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='lunchreports.teacher')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'service_date', 'lunch_item', 'student', 'teacher', 'quantity'], name='archive_partition_qty_idx')],
+                'constraints': [models.CheckConstraint(check=models.Q(models.Q(('student__isnull', False), ('teacher__isnull', True)), models.Q(('student__isnull', True), ('teacher__isnull', False)), _connector='OR'), name='archive_either_student_or_teacher')],
+            },
+        ),
+    ]
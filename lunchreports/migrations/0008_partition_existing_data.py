@@ -0,0 +1,72 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+DEFAULT_SCHOOL_NAME = "Default school"
+
+
+def backfill_service_date():
+    """
+    :return: date of the LUNCHREPORTS_BACKFILL_SERVICE_DATE setting.
+    :raise ImproperlyConfigured: If it is unset or not a YYYY-MM-DD date.
+    """
+    value = getattr(settings, 'LUNCHREPORTS_BACKFILL_SERVICE_DATE', None)
+    if not value:
+        raise ImproperlyConfigured(
+            "Existing orders need a service date: set LUNCHREPORTS_BACKFILL_SERVICE_DATE "
+            "(YYYY-MM-DD) to the day they are for, then migrate again.")
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError as e:
+        raise ImproperlyConfigured(
+            f"Invalid LUNCHREPORTS_BACKFILL_SERVICE_DATE {value!r}; use YYYY-MM-DD.") from e
+
+
+def assign_partitions(apps, _schema_editor):
+    """
+    Put all existing data in one default school, and existing orders on the
+    service date of the LUNCHREPORTS_BACKFILL_SERVICE_DATE setting. Their
+    created_at was filled in with the time 0006 ran, so it doesn't tell the
+    day they are for. The order change log goes by the day of each change,
+    which for orders edited on a later day is the best that can be recovered,
+    and snapshots by the day they were taken. The rollup is rebuilt per
+    partition.
+    """
+    School = apps.get_model('lunchreports', 'School')
+    school, _ = School.objects.get_or_create(name=DEFAULT_SCHOOL_NAME)
+    for model_name in ('Teacher', 'Student'):
+        apps.get_model('lunchreports', model_name).objects.update(school=school)
+    LunchItemOrder = apps.get_model('lunchreports', 'LunchItemOrder')
+    if LunchItemOrder.objects.exists():
+        LunchItemOrder.objects.update(school=school, service_date=backfill_service_date())
+    apps.get_model('lunchreports', 'LunchItemOrderChange').objects.update(
+        school=school, service_date=TruncDate('changed_at'))
+    apps.get_model('lunchreports', 'ReportSnapshot').objects.update(
+        school=school, service_date=TruncDate('created_at'))
+
+    LunchItemOrderRollup = apps.get_model('lunchreports', 'LunchItemOrderRollup')
+    fields = ('school_id', 'service_date', 'lunch_item_id', 'student_id', 'teacher_id')
+    LunchItemOrderRollup.objects.all().delete()
+    LunchItemOrderRollup.objects.bulk_create(
+        (LunchItemOrderRollup(quantity=row['total_quantity'],
+                              order_count=row['total_orders'],
+                              **{field: row[field] for field in fields})
+         for row in (LunchItemOrder.objects.values(*fields)
+                     .annotate(total_quantity=Sum('quantity'), total_orders=Count('id'))
+                     .order_by())),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0007_school_partitions'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_partitions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import lunchreports.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0008_partition_existing_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='teacher',
+            name='school',
+            field=models.ForeignKey(default=lunchreports.models.default_school_id, on_delete=django.db.models.deletion.PROTECT, related_name='teachers', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='school',
+            field=models.ForeignKey(default=lunchreports.models.default_school_id, on_delete=django.db.models.deletion.PROTECT, related_name='students', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='lunchitemorder',
+            name='school',
+            field=models.ForeignKey(default=lunchreports.models.default_school_id, on_delete=django.db.models.deletion.PROTECT, related_name='lunch_item_orders', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='lunchitemorder',
+            name='service_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='lunchitemorderrollup',
+            name='school',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_rollups', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='lunchitemorderrollup',
+            name='service_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='lunchitemorderchange',
+            name='school',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_changes', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='lunchitemorderchange',
+            name='service_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='reportsnapshot',
+            name='school',
+            field=models.ForeignKey(default=lunchreports.models.default_school_id, on_delete=django.db.models.deletion.CASCADE, related_name='report_snapshots', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='reportsnapshot',
+            name='service_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddConstraint(
+            model_name='lunchitemorderrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('student__isnull', False)), fields=('school', 'service_date', 'lunch_item', 'student'), name='unique_rollup_per_student'),
+        ),
+        migrations.AddConstraint(
+            model_name='lunchitemorderrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('teacher__isnull', False)), fields=('school', 'service_date', 'lunch_item', 'teacher'), name='unique_rollup_per_teacher'),
+        ),
+        migrations.AddIndex(
+            model_name='lunchitemorder',
+            index=models.Index(fields=['school', 'service_date', 'lunch_item', 'student', 'teacher', 'quantity'], name='order_partition_qty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lunchitemorderrollup',
+            index=models.Index(fields=['school', 'service_date', 'lunch_item', 'student', 'teacher', 'quantity'], name='rollup_partition_qty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lunchitemorderchange',
+            index=models.Index(fields=['school', 'service_date', 'lunch_item', 'changed_at', 'student', 'teacher', 'quantity'], name='order_change_partition_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0009_partition_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lunchitemorder',
+            index=models.Index(fields=['service_date', 'school'], name='order_service_date_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchreports', '0010_order_service_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lunchitemorder',
+            name='school',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.PROTECT, related_name='lunch_item_orders', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='reportsnapshot',
+            name='school',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_snapshots', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='school',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.PROTECT, related_name='students', to='lunchreports.school'),
+        ),
+        migrations.AlterField(
+            model_name='teacher',
+            name='school',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.PROTECT, related_name='teachers', to='lunchreports.school'),
+        ),
+    ]
@@ -1,9 +1,37 @@
 from django.db import models
-from django.db.models import CheckConstraint, Q
+from django.db.models import CheckConstraint, Index, Q, UniqueConstraint
+from django.utils import timezone
+
+
+# A school. Teachers, students and orders belong to one, and every report is
+# of one school's orders of one service day (see partitions.py).
+class School(models.Model):
+  name = models.CharField(max_length=255, unique=True)
+
+  def __str__(self):
+    return self.name
+
+
+DEFAULT_SCHOOL_NAME = "Default school"
+
+
+# School of teachers, students, orders and snapshots saved without one: the
+# first school, created on first use, so that single-school setups (and
+# fixtures) never have to name it. Assigned when they are saved, by
+# signals.assign_default_school; bulk writers set the school themselves.
+def default_school_id():
+  school_id = School.objects.order_by('pk').values_list('pk', flat=True).first()
+  if school_id is None:
+    school_id = School.objects.get_or_create(name=DEFAULT_SCHOOL_NAME)[0].pk
+  return school_id
 
 
 class Teacher(models.Model):
   name = models.CharField(max_length=255)
+  school = models.ForeignKey(School,
+                             on_delete=models.PROTECT,
+                             blank=True,
+                             related_name="teachers")
 
   def __str__(self):
     return self.name
@@ -16,6 +44,11 @@ class Student(models.Model):
                               null=True,
                               blank=True,
                               related_name="students")
+  school = models.ForeignKey(School,
+                             on_delete=models.PROTECT,
+                             blank=True,
+                             related_name="students")
+
   def __str__(self):
     return f"{self.name} - {self.teacher}"
 
@@ -32,7 +65,15 @@ class LunchItem(models.Model):
 # Note that a student/teacher can make multiple orders of the same item.
 # For example, teacher1 orders 2 quantity of water, and then 1 quantity water later.
 # These will be separate LunchItemOrder objects.
+# Orders are partitioned by school and service date: the school is the
+# customer's (set by save(), and by bulk writers themselves), the service date
+# the day the lunch is served.
 class LunchItemOrder(models.Model):
+  school = models.ForeignKey(School,
+                             on_delete=models.PROTECT,
+                             blank=True,
+                             related_name="lunch_item_orders")
+  service_date = models.DateField(default=timezone.localdate)
   student = models.ForeignKey(Student,
                               on_delete=models.PROTECT,
                               null=True,
@@ -45,6 +86,10 @@ class LunchItemOrder(models.Model):
                                  on_delete=models.PROTECT,
                                  related_name="lunch_item_orders")
   quantity = models.IntegerField(default=1)
+  # Defaults rather than auto_now(_add), so that fixtures without
+  # timestamps still load; save() keeps updated_at current.
+  created_at = models.DateTimeField(default=timezone.now, editable=False)
+  updated_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
 
   class Meta:
     constraints = [
@@ -53,8 +98,194 @@ class LunchItemOrder(models.Model):
                    (Q(student__isnull=True) & Q(teacher__isnull=False))),
             name='either_student_or_teacher_is_null_but_not_both'),
     ]
+    # Covers the per-partition, per-item, per-customer aggregation over raw
+    # orders (rollup rebuilds and checks, archiving), so it is answered from
+    # the index alone.
+    indexes = [
+        Index(fields=['school', 'service_date', 'lunch_item', 'student', 'teacher', 'quantity'],
+              name='order_partition_qty_idx'),
+        # Service date filters across schools: the admin's date filter and
+        # the days archive_orders finds to archive.
+        Index(fields=['service_date', 'school'], name='order_service_date_idx'),
+    ]
+
+  def save(self, *args, **kwargs):
+    self.updated_at = timezone.now()
+    customer = self.student if self.student_id is not None else self.teacher
+    if customer is not None:
+      self.school_id = customer.school_id
+    super().save(*args, **kwargs)
+
+  def __str__(self):
+    return f"{self.lunch_item} ({self.quantity}) - {self.student or self.teacher}"
+
+
+# Running totals of LunchItemOrder quantities per partition (school and
+# service date), lunch item and customer. Kept up to date incrementally by the
+# signal handlers in signals.py so that reports read one row per customer
+# instead of re-aggregating every order. Bulk writers that bypass signals must
+# call rollup.rebuild_order_rollup().
+class LunchItemOrderRollup(models.Model):
+  school = models.ForeignKey(School,
+                             on_delete=models.CASCADE,
+                             related_name="order_rollups")
+  service_date = models.DateField()
+  student = models.ForeignKey(Student,
+                              on_delete=models.CASCADE,
+                              null=True,
+                              blank=True)
+  teacher = models.ForeignKey(Teacher,
+                              on_delete=models.CASCADE,
+                              null=True,
+                              blank=True)
+  lunch_item = models.ForeignKey(LunchItem,
+                                 on_delete=models.CASCADE,
+                                 related_name="order_rollups")
+  quantity = models.IntegerField(default=0)
+  order_count = models.IntegerField(default=0)
+
+  class Meta:
+    constraints = [
+        CheckConstraint(
+            check=((Q(student__isnull=False) & Q(teacher__isnull=True)) |
+                   (Q(student__isnull=True) & Q(teacher__isnull=False))),
+            name='rollup_either_student_or_teacher'),
+        UniqueConstraint(fields=['school', 'service_date', 'lunch_item', 'student'],
+                         condition=Q(student__isnull=False),
+                         name='unique_rollup_per_student'),
+        UniqueConstraint(fields=['school', 'service_date', 'lunch_item', 'teacher'],
+                         condition=Q(teacher__isnull=False),
+                         name='unique_rollup_per_teacher'),
+    ]
+    # Report queries select lunch_item, student, teacher and quantity of the
+    # selected lunch items in one partition; with the partition first and all
+    # four in one index they are answered by an index-only scan of that
+    # partition's range, however many other days are stored.
+    indexes = [
+        Index(fields=['school', 'service_date', 'lunch_item', 'student', 'teacher', 'quantity'],
+              name='rollup_partition_qty_idx'),
+    ]
 
   def __str__(self):
     return f"{self.lunch_item} ({self.quantity}) - {self.student or self.teacher}"
 
 
+# Log of changes to ordered quantities per lunch item and customer: one row
+# per created, edited or deleted order (with the quantity added or removed),
+# written together with the rollup by rollup.py. Delta reports sum the rows
+# changed since a point in time, so they read only the changes. Bulk loads
+# followed by rollup.rebuild_order_rollup() are not logged. Pruned by
+# order_changes.prune_order_changes().
+class LunchItemOrderChange(models.Model):
+  school = models.ForeignKey(School,
+                             on_delete=models.CASCADE,
+                             related_name="order_changes")
+  service_date = models.DateField()
+  student = models.ForeignKey(Student,
+                              on_delete=models.CASCADE,
+                              null=True,
+                              blank=True)
+  teacher = models.ForeignKey(Teacher,
+                              on_delete=models.CASCADE,
+                              null=True,
+                              blank=True)
+  lunch_item = models.ForeignKey(LunchItem,
+                                 on_delete=models.CASCADE,
+                                 related_name="order_changes")
+  quantity = models.IntegerField()
+  changed_at = models.DateTimeField(default=timezone.now)
+
+  class Meta:
+    # Delta queries select the changes of the selected lunch items in one
+    # partition after a timestamp: one range of this index per item. With the
+    # grouped and summed columns in the index they are answered by an
+    # index-only scan.
+    indexes = [
+        Index(fields=['school', 'service_date', 'lunch_item', 'changed_at',
+                      'student', 'teacher', 'quantity'],
+              name='order_change_partition_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.lunch_item} ({self.quantity:+d}) - {self.student or self.teacher}"
+
+
+# Compact totals of the orders of archived service days: one row per
+# partition, lunch item and customer, like the rollup, after the orders
+# themselves (and their rollup and change log rows) are deleted. Reports of an
+# archived day read these rows instead of the rollup. Written by archive.py.
+class LunchItemOrderArchive(models.Model):
+  school = models.ForeignKey(School,
+                             on_delete=models.PROTECT,
+                             related_name="order_archives")
+  service_date = models.DateField()
+  student = models.ForeignKey(Student,
+                              on_delete=models.PROTECT,
+                              null=True,
+                              blank=True)
+  teacher = models.ForeignKey(Teacher,
+                              on_delete=models.PROTECT,
+                              null=True,
+                              blank=True)
+  lunch_item = models.ForeignKey(LunchItem,
+                                 on_delete=models.PROTECT,
+                                 related_name="order_archives")
+  quantity = models.IntegerField()
+  order_count = models.IntegerField()
+
+  class Meta:
+    constraints = [
+        CheckConstraint(
+            check=((Q(student__isnull=False) & Q(teacher__isnull=True)) |
+                   (Q(student__isnull=True) & Q(teacher__isnull=False))),
+            name='archive_either_student_or_teacher'),
+    ]
+    # Same layout and index as the rollup, so the report queries read either.
+    indexes = [
+        Index(fields=['school', 'service_date', 'lunch_item', 'student', 'teacher', 'quantity'],
+              name='archive_partition_qty_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.lunch_item} ({self.quantity}) - {self.student or self.teacher}"
+
+
+# Single-row counter that is bumped on every write that can change a report
+# (orders, students, teachers and lunch items). Cached report PDFs are keyed
+# on it, so any such write invalidates them. See data_version.py.
+class ReportDataVersion(models.Model):
+  version = models.BigIntegerField(default=0)
+
+  def __str__(self):
+    return f"Report data version {self.version}"
+
+
+# A report frozen at one point in time: its data as compressed JSON and its
+# rendered PDF, so it can be downloaded again without querying or rendering
+# anything. Created and pruned by snapshots.py.
+class ReportSnapshot(models.Model):
+  report_kind = models.CharField(max_length=64)
+  # The partition the report was of, see partitions.py.
+  school = models.ForeignKey(School,
+                             on_delete=models.CASCADE,
+                             blank=True,
+                             related_name="report_snapshots")
+  service_date = models.DateField(default=timezone.localdate)
+  lunch_item_ids = models.JSONField(default=list)
+  # Report data version the snapshot was taken at, see data_version.py.
+  data_version = models.BigIntegerField()
+  # zlib-compressed JSON of the report data, see snapshots.py.
+  data = models.BinaryField()
+  pdf = models.BinaryField()
+  # When the snapshot's data was read; delta reports since a snapshot start
+  # from here.
+  created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+  class Meta:
+    indexes = [
+        Index(fields=['report_kind', '-created_at'],
+              name='snapshot_kind_created_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.report_kind} snapshot {self.pk} ({self.created_at:%Y-%m-%d %H:%M})"
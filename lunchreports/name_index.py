@@ -0,0 +1,255 @@
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+
+from .databases import get_report_db_alias
+from .models import LunchItem, Student, Teacher
+
+logger = logging.getLogger(__name__)
+
+# Default configuration, overridable with the LUNCHREPORTS_NAME_INDEX setting:
+#   TTL: seconds a loaded index is used before it is reloaded; edits made in
+#       this process invalidate it at once, this bounds how long edits made
+#       by other processes take to show up. None never reloads.
+#   WARM_ON_FIRST_REQUEST: whether the first request a process serves loads
+#       the index, whatever its view, so the first report doesn't pay for it.
+#       Not at startup, so migrate, check and shell don't query for it.
+DEFAULT_NAME_INDEX = {
+    "TTL": 300,
+    "WARM_ON_FIRST_REQUEST": True,
+}
+
+
+def get_name_index_config():
+    return {**DEFAULT_NAME_INDEX, **getattr(settings, "LUNCHREPORTS_NAME_INDEX", {})}
+
+
+class NameIndex:
+    """
+    Immutable in-memory copy of the lunch menu, teachers and students, which
+    change rarely but are read by every report.
+
+    Selecting lunch items and naming the customers of report rows is then
+    done without queries. A loaded index is never modified: edits replace it
+    with a new one (see get_name_index).
+    """
+
+    def __init__(self, lunch_items, teachers, students, database):
+        # Lunch items in primary key order, as the database returns them.
+        self.lunch_items = lunch_items
+        self.lunch_items_by_name = {item.name: item for item in lunch_items}
+        # pk -> (name, school_id)
+        self.teachers = teachers
+        # pk -> (name, teacher_id, school_id)
+        self.students = students
+        # settings NAME of the database it was loaded from.
+        self.database = database
+        self.loaded_at = time.monotonic()
+        self._rosters = {}
+
+    @classmethod
+    def load(cls, using):
+        """
+        Read the index with three queries.
+
+        :param using: Database alias to read from.
+        :return: NameIndex.
+        """
+        return cls(
+            list(LunchItem.objects.using(using).order_by("pk")),
+            {pk: (name, school_id) for pk, name, school_id in
+             Teacher.objects.using(using).values_list("pk", "name", "school_id").iterator()},
+            {pk: (name, teacher_id, school_id) for pk, name, teacher_id, school_id in
+             Student.objects.using(using).values_list("pk", "name", "teacher_id", "school_id").iterator()},
+            connections[using].settings_dict["NAME"])
+
+    def knows_lunch_items(self, names):
+        """
+        :param names: Iterable of lunch item names; empty ones are ignored.
+        :return: Whether every name is indexed.
+        """
+        return all(name in self.lunch_items_by_name for name in names if name)
+
+    def select_lunch_items(self, names):
+        """
+        :param names: Iterable of lunch item names; unknown ones are ignored.
+        :return: List of the named LunchItems in primary key order, or all of
+                 them when none of the names is known.
+        """
+        selected = {self.lunch_items_by_name[name].pk: self.lunch_items_by_name[name]
+                    for name in names if name in self.lunch_items_by_name}
+        if not selected:
+            return list(self.lunch_items)
+        return [selected[pk] for pk in sorted(selected)]
+
+    def teacher_name(self, teacher_id):
+        return self.teachers[teacher_id][0]
+
+    def student(self, student_id):
+        """
+        :return: Tuple of (name, teacher_id).
+        """
+        name, teacher_id, _ = self.students[student_id]
+        return name, teacher_id
+
+    def knows_customers(self, cells):
+        """
+        :param cells: Iterable of (lunch_item_id, student_id, teacher_id, ...)
+                      tuples.
+        :return: Whether every student and teacher referred to is indexed.
+        """
+        return all(student_id in self.students if student_id is not None
+                   else teacher_id in self.teachers
+                   for _, student_id, teacher_id, *_ in cells)
+
+    def roster(self, school_id):
+        """
+        Teachers and students of one school in primary key order, as
+        build_combined_pivot expects them. Built on first use per school.
+
+        :param school_id: Id of the school.
+        :return: Tuple of (list of (pk, name), list of (pk, name, teacher_id)).
+        """
+        roster = self._rosters.get(school_id)
+        if roster is None:
+            roster = self._rosters[school_id] = (
+                [(pk, name) for pk, (name, school) in sorted(self.teachers.items())
+                 if school == school_id],
+                [(pk, name, teacher_id)
+                 for pk, (name, teacher_id, school) in sorted(self.students.items())
+                 if school == school_id])
+        return roster
+
+    def roster_of_cells(self, school_id, cells):
+        """
+        The roster of a school (see roster), plus the customers of cells who
+        aren't on it, such as students who moved to another school since
+        they ordered. Those are listed after the school's own, by primary
+        key; students whose teacher isn't listed go to the '-' group.
+
+        :param school_id: Id of the school.
+        :param cells: List of (lunch_item_id, student_id, teacher_id, ...)
+                      tuples, whose customers are all indexed.
+        :return: As roster.
+        """
+        teachers, students = self.roster(school_id)
+        moved_teachers = sorted({teacher_id for _, student_id, teacher_id, *_ in cells
+                                 if student_id is None and self.teachers[teacher_id][1] != school_id})
+        moved_students = sorted({student_id for _, student_id, *_ in cells
+                                 if student_id is not None and self.students[student_id][2] != school_id})
+        if not moved_teachers and not moved_students:
+            return teachers, students
+        return (teachers + [(pk, self.teachers[pk][0]) for pk in moved_teachers],
+                students + [(pk, *self.students[pk][:2]) for pk in moved_students])
+
+    def is_current(self, ttl):
+        if connections[get_report_db_alias()].settings_dict["NAME"] != self.database:
+            return False
+        return ttl is None or time.monotonic() - self.loaded_at < ttl
+
+
+_index = None
+_lock = threading.Lock()
+# Incremented by invalidate_name_index(), so an index loaded while an edit
+# invalidated it is returned to its caller but not kept.
+_generation = 0
+
+
+def get_name_index(refresh=False):
+    """
+    Return the process-wide name index, loading it when there is none yet,
+    it has expired or the report database changed (as when tests switch to
+    their own database).
+
+    :param refresh: Reload it even if it is current, e.g. when it misses a
+                    row created by another process.
+    :return: NameIndex.
+    """
+    global _index
+    index = _index
+    if not refresh and index is not None and index.is_current(get_name_index_config()["TTL"]):
+        return index
+    with _lock:
+        # Another thread may have reloaded it while this one waited.
+        if _index is not index and _index is not None:
+            return _index
+        generation = _generation
+        loaded = NameIndex.load(get_report_db_alias())
+        if generation == _generation:
+            _index = loaded
+        return loaded
+
+
+async def aget_name_index(refresh=False):
+    """
+    Async version of get_name_index; loading runs in a worker thread.
+    """
+    index = _index
+    if not refresh and index is not None and index.is_current(get_name_index_config()["TTL"]):
+        return index
+    return await sync_to_async(get_name_index)(refresh)
+
+
+def invalidate_name_index():
+    """
+    Drop the loaded index, so the next report reloads it. Called by signals
+    on menu, teacher and student edits, and after bulk loads.
+    """
+    global _index, _generation
+    _generation += 1
+    _index = None
+
+
+def select_lunch_items(names):
+    """
+    Select lunch items by name from the name index, reloading it once when a
+    name is missing, e.g. an item just added by another process.
+
+    :param names: Iterable of lunch item names.
+    :return: As NameIndex.select_lunch_items.
+    """
+    names = list(names)
+    index = get_name_index()
+    if not index.knows_lunch_items(names):
+        index = get_name_index(refresh=True)
+    return index.select_lunch_items(names)
+
+
+async def aselect_lunch_items(names):
+    """
+    Async version of select_lunch_items.
+    """
+    names = list(names)
+    index = await aget_name_index()
+    if not index.knows_lunch_items(names):
+        index = await aget_name_index(refresh=True)
+    return index.select_lunch_items(names)
+
+
+def warm_name_index(**kwargs):
+    """
+    Load the index if WARM_ON_FIRST_REQUEST is set. Connected to
+    request_started by connect_warm_name_index(), and disconnected by its
+    first call. Failures, e.g. before the tables are migrated, are logged and
+    leave it to be loaded by the first report.
+    """
+    request_started.disconnect(dispatch_uid=__name__)
+    if not get_name_index_config()["WARM_ON_FIRST_REQUEST"]:
+        return
+    try:
+        get_name_index(refresh=True)
+    except DatabaseError:
+        logger.debug("Name index not warmed; the database isn't ready.", exc_info=True)
+
+
+def connect_warm_name_index():
+    """
+    Have the first request of the process warm the index. Called by
+    LunchreportsConfig.ready(), which mustn't query itself.
+    """
+    request_started.connect(warm_name_index, dispatch_uid=__name__)
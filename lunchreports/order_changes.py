@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import LunchItemOrderChange, ReportSnapshot
+
+# Default configuration, overridable with the LUNCHREPORTS_ORDER_CHANGES
+# setting:
+#   MAX_AGE: seconds the order change log is kept; delta reports can't go
+#       further back than this.
+DEFAULT_ORDER_CHANGES = {
+    "MAX_AGE": 30 * 24 * 60 * 60,
+}
+
+# Fields of a rollup key, as in rollup.ROLLUP_KEY_FIELDS (which imports this
+# module).
+_KEY_FIELDS = ('school_id', 'service_date', 'lunch_item_id', 'student_id', 'teacher_id')
+
+
+def get_order_changes_config():
+    return {**DEFAULT_ORDER_CHANGES, **getattr(settings, "LUNCHREPORTS_ORDER_CHANGES", {})}
+
+
+def record_order_changes(quantities, batch_size=1000):
+    """
+    Append quantity changes to the order change log.
+
+    :param quantities: Dictionary mapping rollup keys (school_id,
+                       service_date, lunch_item_id, student_id, teacher_id)
+                       to the quantity added, or removed if negative. Zero
+                       changes are skipped.
+    :param batch_size: Number of rows per insert query.
+    """
+    changed_at = timezone.now()
+    LunchItemOrderChange.objects.bulk_create(
+        (LunchItemOrderChange(quantity=quantity, changed_at=changed_at,
+                              **dict(zip(_KEY_FIELDS, key, strict=True)))
+         for key, quantity in quantities.items() if quantity),
+        batch_size=batch_size)
+
+
+def parse_since(value, report_kind, partition):
+    """
+    Resolve the `since` parameter of a delta report to a point in time.
+
+    :param value: An ISO 8601 timestamp (naive ones are in the current time
+                  zone), "snapshot:<id>" for the time a report snapshot's
+                  data was read, or "last_snapshot" for the newest snapshot
+                  of report_kind and partition.
+    :param report_kind: Key of views.REPORTS.
+    :param partition: ReportPartition of the delta report.
+    :return: Aware datetime.
+    :raises ValueError: If the value is invalid, names no snapshot, or lies
+                        before the start of the kept change log.
+    """
+    if value == "last_snapshot":
+        since = (ReportSnapshot.objects.filter(report_kind=report_kind, **partition.lookup())
+                 .order_by("-created_at").values_list("created_at", flat=True).first())
+        if since is None:
+            raise ValueError(f"There is no {report_kind} snapshot of this school and day yet.")
+    elif value.startswith("snapshot:"):
+        snapshot_id = value.removeprefix("snapshot:")
+        since = (ReportSnapshot.objects.filter(pk=snapshot_id).values_list("created_at", flat=True)
+                 .first() if snapshot_id.isdigit() else None)
+        if since is None:
+            raise ValueError(f"Unknown report snapshot {snapshot_id!r}.")
+    else:
+        since = parse_datetime(value)
+        if since is None:
+            raise ValueError(f"Invalid since value {value!r}; use an ISO 8601 timestamp, "
+                             "snapshot:<id> or last_snapshot.")
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    max_age = get_order_changes_config()["MAX_AGE"]
+    if max_age is not None and since < timezone.now() - timedelta(seconds=max_age):
+        raise ValueError(f"Order changes are only kept for {max_age // 3600} hours.")
+    return since
+
+
+def prune_order_changes():
+    """
+    Delete order change log rows older than MAX_AGE.
+
+    :return: Number of rows deleted.
+    """
+    max_age = get_order_changes_config()["MAX_AGE"]
+    if max_age is None:
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    return LunchItemOrderChange.objects.filter(changed_at__lt=cutoff).delete()[0]
@@ -0,0 +1,61 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+_INTEGER_PRIMARY_KEYS = ("AutoField", "BigAutoField", "SmallAutoField")
+
+
+def estimate_row_count(model, using):
+    """
+    Estimate the number of rows of a model's table without counting them.
+
+    PostgreSQL's planner statistics are used when the table has been
+    analyzed; otherwise the span between the lowest and highest integer
+    primary key, which overestimates by the number of deleted rows.
+
+    :param model: Model class.
+    :param using: Database alias.
+    :return: Estimated number of rows, or None if it can't be estimated.
+    """
+    connection = connections[using]
+    meta = model._meta
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                           [meta.db_table])
+            row = cursor.fetchone()
+            # -1 (or 0 before PostgreSQL 14) until the table is analyzed.
+            if row is not None and row[0] > 0:
+                return row[0]
+        if meta.pk.get_internal_type() not in _INTEGER_PRIMARY_KEYS:
+            return None
+        table = connection.ops.quote_name(meta.db_table)
+        column = connection.ops.quote_name(meta.pk.column)
+        # Separate subqueries, so that each is one primary key index lookup.
+        cursor.execute(f"SELECT (SELECT MIN({column}) FROM {table}), "
+                       f"(SELECT MAX({column}) FROM {table})")
+        low, high = cursor.fetchone()
+    return 0 if low is None else high - low + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of tables too large to count.
+
+    An unfiltered list takes its count from estimate_row_count(); a filtered
+    one counts at most COUNT_LIMIT rows. Either costs index lookups rather
+    than a scan of the table, so the count is approximate: the last page of
+    an unfiltered list may be short or empty, and a filtered list links no
+    further than COUNT_LIMIT rows.
+    """
+
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.COUNT_LIMIT:
+                return estimate
+        return queryset[:self.COUNT_LIMIT].count()
@@ -0,0 +1,98 @@
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .databases import get_report_db_alias
+from .models import LunchItemOrderArchive, School
+
+
+class ReportPartition:
+    """
+    One school's orders of one service day, the unit every report reads.
+
+    The rollup, order change log and archive are indexed by (school, service
+    date) first, so a report reads only its partition's range of rows, and its
+    cost doesn't grow with the number of stored days or schools.
+    """
+
+    __slots__ = ("school_id", "service_date", "archived")
+
+    def __init__(self, school_id, service_date, archived=False):
+        self.school_id = school_id
+        self.service_date = service_date
+        # Whether the day was archived (see archive.py), so its totals are
+        # read from the archive rather than the rollup.
+        self.archived = archived
+
+    def lookup(self):
+        """
+        :return: Filter keyword arguments selecting the partition's rows.
+        """
+        return {"school_id": self.school_id, "service_date": self.service_date}
+
+    @property
+    def key(self):
+        return f"{self.school_id}:{self.service_date.isoformat()}"
+
+    def __eq__(self, other):
+        return (isinstance(other, ReportPartition)
+                and (self.school_id, self.service_date) == (other.school_id, other.service_date))
+
+    def __hash__(self):
+        return hash((self.school_id, self.service_date))
+
+    def __repr__(self):
+        return f"ReportPartition({self.key}{', archived' if self.archived else ''})"
+
+
+def _schools_query(school, service_date):
+    schools = School.objects.using(get_report_db_alias()).order_by("pk")
+    if school is not None:
+        school = str(school).strip()
+        schools = schools.filter(pk=school) if school.isdigit() else schools.filter(name=school)
+    archived = LunchItemOrderArchive.objects.filter(school=OuterRef("pk"), service_date=service_date)
+    return schools.annotate(archived=Exists(archived)).values_list("pk", "archived")
+
+
+def _parse_service_date(service_date):
+    if service_date is None or service_date == "":
+        return timezone.localdate()
+    if isinstance(service_date, str):
+        try:
+            parsed = parse_date(service_date)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError(f"Invalid date {service_date!r}; use YYYY-MM-DD.")
+        return parsed
+    return service_date
+
+
+def _partition(row, school, service_date):
+    if row is None:
+        raise ValueError(f"Unknown school {school!r}." if school is not None
+                         else "There is no school yet.")
+    school_id, archived = row
+    return ReportPartition(school_id, service_date, archived)
+
+
+def get_report_partition(school=None, service_date=None):
+    """
+    Resolve a school and service date to a report partition, with one query.
+
+    :param school: School id or name; None for the default school (the first
+                   one, as for new teachers, students and orders).
+    :param service_date: date or YYYY-MM-DD string; None for today.
+    :return: ReportPartition.
+    :raises ValueError: If the date is invalid or the school unknown.
+    """
+    service_date = _parse_service_date(service_date)
+    return _partition(_schools_query(school, service_date).first(), school, service_date)
+
+
+async def aget_report_partition(school=None, service_date=None):
+    """
+    Async version of get_report_partition.
+    """
+    service_date = _parse_service_date(service_date)
+    return _partition(await _schools_query(school, service_date).afirst(), school, service_date)
@@ -0,0 +1,207 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .generate_report import get_pdf_backend
+
+# Default configuration, overridable with the LUNCHREPORTS_PDF_CACHE setting:
+#   BACKEND: "memory", "filesystem" or None to disable caching.
+#   MAX_BYTES: total size of cached PDFs before least recently used ones go.
+#   LOCATION: directory used by the filesystem backend.
+DEFAULT_PDF_CACHE = {
+    "BACKEND": "memory",
+    "MAX_BYTES": 64 * 1024 * 1024,
+    "LOCATION": os.path.join(tempfile.gettempdir(), "lunchreports-pdf-cache"),
+}
+
+
+def report_cache_key(report_kind, lunch_items, data_version, partition):
+    """
+    Build a content-addressed key for a rendered report.
+
+    :param report_kind: Name of the report (e.g. "order_report").
+    :param lunch_items: List of LunchItem objects included in the report.
+    :param data_version: Current report data version.
+    :param partition: ReportPartition the report is of.
+    :return: Hex digest identifying the report contents and the PDF backend
+             rendering it.
+    """
+    item_ids = ",".join(str(pk) for pk in sorted(item.pk for item in lunch_items))
+    source = f"{report_kind}|{partition.key}|{item_ids}|{data_version}|{get_pdf_backend()}"
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+class MemoryPdfCache:
+    """Process-local LRU cache of PDF bytes bounded by total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_file(self, key):
+        data = self.get(key)
+        return None if data is None else BytesIO(data)
+
+    def set_file(self, key, f):
+        if os.fstat(f.fileno()).st_size > self.max_bytes:
+            return
+        f.seek(0)
+        self.set(key, f.read())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class FileSystemPdfCache:
+    """
+    On-disk LRU cache of PDF bytes bounded by total size.
+
+    Shared by every worker process pointing at the same directory. Recency is
+    tracked through file modification times, which are refreshed on reads.
+    """
+
+    suffix = ".pdf"
+
+    def __init__(self, location, max_bytes):
+        self.location = location
+        self.max_bytes = max_bytes
+        os.makedirs(location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, f"{key}{self.suffix}")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def get_file(self, key):
+        path = self._path(key)
+        try:
+            # Returned open; the caller closes it.
+            f = open(path, "rb")  # noqa: SIM115
+        except FileNotFoundError:
+            return None
+        # Evicted after opening; the open file stays readable.
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+        return f
+
+    def set_file(self, key, f):
+        if os.fstat(f.fileno()).st_size > self.max_bytes:
+            return
+        f.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            shutil.copyfileobj(f, tmp)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.location) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+    def clear(self):
+        with os.scandir(self.location) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    os.remove(entry.path)
+
+
+_pdf_cache = None
+_pdf_cache_lock = threading.Lock()
+
+
+def _build_pdf_cache():
+    config = {**DEFAULT_PDF_CACHE, **getattr(settings, "LUNCHREPORTS_PDF_CACHE", {})}
+    backend = config["BACKEND"]
+    if backend is None:
+        return None
+    if backend == "memory":
+        return MemoryPdfCache(config["MAX_BYTES"])
+    if backend == "filesystem":
+        return FileSystemPdfCache(config["LOCATION"], config["MAX_BYTES"])
+    raise ImproperlyConfigured(f"Unknown LUNCHREPORTS_PDF_CACHE backend: {backend!r}")
+
+
+def get_pdf_cache():
+    """
+    Return the configured PDF cache, or None when caching is disabled.
+    """
+    global _pdf_cache
+    if _pdf_cache is None:
+        with _pdf_cache_lock:
+            if _pdf_cache is None:
+                _pdf_cache = _build_pdf_cache() or False
+    return _pdf_cache or None
+
+
+@receiver(setting_changed)
+def _reset_pdf_cache(setting, **kwargs):
+    global _pdf_cache
+    if setting == "LUNCHREPORTS_PDF_CACHE":
+        _pdf_cache = None
@@ -0,0 +1,156 @@
+from array import array
+from collections import deque
+from io import BytesIO
+
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+# Concatenation of PDF documents straight into a file. pypdf's PdfWriter
+# keeps every page it is given until write() is called, so a report rendered
+# chunk by chunk would still be held whole. PdfConcatenator instead renumbers
+# each document's objects and writes them out as soon as the document is
+# appended, keeping only the file offset of every object and the object
+# number of every page until the page tree and cross-reference table are
+# written at the end.
+
+# Page attributes that can be inherited from the page tree. The pages are
+# moved into a new tree, so inherited values are copied onto each page.
+_INHERITED_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# Object numbers of the page tree and catalog, written last.
+_PAGES = 1
+_CATALOG = 2
+
+
+class _CountingWriter:
+    """Writes to a binary file, counting the bytes written."""
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.position = 0
+
+    def write(self, data):
+        self.dest.write(data)
+        self.position += len(data)
+        return len(data)
+
+
+class PdfConcatenator:
+    """
+    Writes the pages of PDF documents, appended one at a time, as one PDF
+    document to a binary file.
+
+    Only the pages of the appended documents and the objects they use are
+    kept; their outlines, forms and metadata are dropped.
+    """
+
+    def __init__(self, dest):
+        self._out = _CountingWriter(dest)
+        # Offset of object number n at index n - 1.
+        self._offsets = array("q", [0] * _CATALOG)
+        self._kids = array("q")
+        self._header_written = False
+
+    def _write_header(self, version):
+        # The binary comment marks the file as binary to transfer tools.
+        self._out.write(version.encode("ascii") + b"\n%\xe2\xe3\xcf\xd3\n")
+        self._header_written = True
+
+    def _start_object(self, number):
+        self._offsets[number - 1] = self._out.position
+        self._out.write(b"%d 0 obj\n" % number)
+
+    def append(self, pdf):
+        """
+        Write the pages of a PDF document after those already written.
+
+        :param pdf: PDF document as bytes.
+        """
+        reader = PdfReader(BytesIO(pdf))
+        if not self._header_written:
+            self._write_header(reader.pdf_header)
+        numbers = {}
+        pending = deque()
+
+        def renumber(reference, obj=None):
+            key = (reference.idnum, reference.generation)
+            number = numbers.get(key)
+            if number is None:
+                self._offsets.append(0)
+                number = numbers[key] = len(self._offsets)
+                pending.append((number, reference.get_object() if obj is None else obj))
+            return IndirectObject(number, 0, None)
+
+        def relink(obj):
+            # Points the references of obj at the new object numbers.
+            if isinstance(obj, DictionaryObject):
+                for key, value in obj.items():
+                    if isinstance(value, IndirectObject):
+                        dict.__setitem__(obj, key, renumber(value))
+                    else:
+                        relink(value)
+            elif isinstance(obj, ArrayObject):
+                for position, value in enumerate(obj):
+                    if isinstance(value, IndirectObject):
+                        obj[position] = renumber(value)
+                    else:
+                        relink(value)
+
+        # Pages are numbered first, so references between them (links)
+        # resolve to the pages written below rather than to new copies.
+        # reader.pages holds copies of the page dictionaries; those are
+        # written, with the inherited attributes copied onto them.
+        pages = set()
+        for page in reader.pages:
+            for key in _INHERITED_PAGE_ATTRIBUTES:
+                value = page.get_inherited(key)
+                if value is not None:
+                    page[NameObject(key)] = value
+            dict.pop(page, "/Parent", None)
+            number = renumber(page.indirect_reference, page).idnum
+            pages.add(number)
+            self._kids.append(number)
+        while pending:
+            number, obj = pending.popleft()
+            relink(obj)
+            if number in pages:
+                obj[NameObject("/Parent")] = IndirectObject(_PAGES, 0, None)
+            self._start_object(number)
+            obj.write_to_stream(self._out)
+            self._out.write(b"\nendobj\n")
+
+    def close(self):
+        """
+        Write the page tree, catalog and cross-reference table, completing
+        the document. The destination file is left open.
+        """
+        if not self._header_written:
+            self._write_header("%PDF-1.4")
+        out = self._out
+        self._start_object(_PAGES)
+        out.write(b"<< /Type /Pages /Count %d /Kids [" % len(self._kids))
+        for number in self._kids:
+            out.write(b" %d 0 R" % number)
+        out.write(b" ] >>\nendobj\n")
+        self._start_object(_CATALOG)
+        out.write(b"<< /Type /Catalog /Pages %d 0 R >>\nendobj\n" % _PAGES)
+        xref = out.position
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1))
+        for offset in self._offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                  % (len(self._offsets) + 1, _CATALOG, xref))
+
+
+def concatenate_pdfs(pdfs, dest):
+    """
+    Write PDF documents, given as bytes, concatenated to a binary file.
+
+    :param pdfs: Iterable of PDF documents; may be a generator rendering one
+                 document at a time, as only one is held at once.
+    :param dest: Binary file the PDF document is written to.
+    """
+    concatenator = PdfConcatenator(dest)
+    for pdf in pdfs:
+        concatenator.append(pdf)
+    concatenator.close()
@@ -0,0 +1,148 @@
+from array import array
+
+UNASSIGNED_TEACHER = '-'
+
+
+class CombinedRow:
+    """
+    One <tr> of the combined report table.
+
+    teacher is set on rows that show a teacher cell; teacher_rowspan on the
+    first row of a teacher's block, whose teacher cell spans the block.
+    Total rows have is_total set and no customer.
+    """
+
+    __slots__ = ('teacher', 'teacher_rowspan', 'customer', 'is_total', 'cells')
+
+    def __init__(self, cells, *, customer=None, teacher=None, teacher_rowspan=None,
+                 is_total=False):
+        self.cells = cells
+        self.customer = customer
+        self.teacher = teacher
+        self.teacher_rowspan = teacher_rowspan
+        self.is_total = is_total
+
+
+def _display(quantity):
+    # Matches the report's `|default:"-"`: no order and zero both show '-'.
+    return quantity or '-'
+
+
+class CombinedPivot:
+    """
+    The combined teacher x customer x lunch item table.
+
+    Quantities are accumulated into one flat integer array indexed by
+    (customer row, lunch item column); teacher group totals into another
+    indexed by (teacher, column). Rows are ordered like the roster: each
+    teacher's students, then the teacher, then the teacher's total row, with
+    students without a teacher ('-') last. CombinedRow objects are only
+    built as rows() is iterated, so a chunked render holds one chunk's.
+    """
+
+    def __init__(self, lunch_items, cells, teachers, students):
+        """
+        :param lunch_items: List of LunchItem objects, in column order.
+        :param cells: Iterable of (lunch_item_id, student_id, teacher_id, quantity),
+                      at most one per lunch item and customer.
+        :param teachers: Iterable of (teacher_id, name) in display order, listing
+                         every teacher of the cells.
+        :param students: Iterable of (student_id, name, teacher_id) in display
+                         order, listing every student of the cells.
+        """
+        columns = {item.pk: column for column, item in enumerate(lunch_items)}
+        width = self.width = len(columns)
+
+        teacher_names = self.teacher_names = {}
+        students_by_teacher = self.students_by_teacher = {}
+        for teacher_id, name in teachers:
+            teacher_names[teacher_id] = name
+            students_by_teacher[teacher_id] = []
+        unassigned = self.unassigned = []
+        for student_id, name, teacher_id in students:
+            students_by_teacher.get(teacher_id, unassigned).append((student_id, name))
+
+        # Row layout: students grouped by teacher, each teacher after their
+        # students, unassigned students last.
+        student_rows = self.student_rows = {}
+        teacher_rows = self.teacher_rows = {}
+        teacher_groups = self.teacher_groups = {}
+        row_count = 0
+        for group, teacher_id in enumerate(teacher_names):
+            teacher_groups[teacher_id] = group
+            for student_id, _ in students_by_teacher[teacher_id]:
+                student_rows[student_id] = row_count
+                row_count += 1
+            teacher_rows[teacher_id] = row_count
+            row_count += 1
+        for student_id, _ in unassigned:
+            student_rows[student_id] = row_count
+            row_count += 1
+        student_groups = {
+            student_id: teacher_groups[teacher_id]
+            for teacher_id, group_students in students_by_teacher.items()
+            for student_id, _ in group_students
+        }
+
+        quantities = self.quantities = array('q', bytes(8 * row_count * width))
+        group_totals = self.group_totals = array('q', bytes(8 * len(teacher_groups) * width))
+        item_totals = array('q', bytes(8 * width))
+        for lunch_item_id, student_id, teacher_id, quantity in cells:
+            column = columns[lunch_item_id]
+            if student_id is not None:
+                row = student_rows[student_id]
+                group = student_groups.get(student_id)
+            else:
+                row = teacher_rows[teacher_id]
+                group = teacher_groups[teacher_id]
+            quantities[row * width + column] += quantity
+            if group is not None:
+                group_totals[group * width + column] += quantity
+            item_totals[column] += quantity
+        self.item_totals = list(item_totals)
+
+    def _row_cells(self, row):
+        width = self.width
+        return [_display(q) for q in self.quantities[row * width:(row + 1) * width]]
+
+    def rows(self):
+        """
+        :return: Generator of CombinedRow, in table order.
+        """
+        width = self.width
+        for teacher_id, teacher_name in self.teacher_names.items():
+            customers = [(self.student_rows[student_id], name)
+                         for student_id, name in self.students_by_teacher[teacher_id]]
+            customers.append((self.teacher_rows[teacher_id], teacher_name))
+            for position, (row, name) in enumerate(customers):
+                first = position == 0
+                yield CombinedRow(self._row_cells(row),
+                                  customer=name,
+                                  teacher=teacher_name if first else None,
+                                  teacher_rowspan=len(customers) + 1 if first else None)
+            group = self.teacher_groups[teacher_id]
+            yield CombinedRow(
+                [_display(q) for q in self.group_totals[group * width:(group + 1) * width]],
+                is_total=True)
+        for student_id, name in self.unassigned:
+            yield CombinedRow(self._row_cells(self.student_rows[student_id]),
+                              customer=name,
+                              teacher=UNASSIGNED_TEACHER)
+
+
+def build_combined_pivot(lunch_items, cells, teachers, students):
+    """
+    Build the combined teacher x customer x lunch item table (see
+    CombinedPivot).
+
+    :param lunch_items: List of LunchItem objects, in column order.
+    :param cells: Iterable of (lunch_item_id, student_id, teacher_id, quantity),
+                  at most one per lunch item and customer.
+    :param teachers: Iterable of (teacher_id, name) in display order, listing
+                     every teacher of the cells.
+    :param students: Iterable of (student_id, name, teacher_id) in display
+                     order, listing every student of the cells.
+    :return: Tuple of (list of CombinedRow, list of per-item total quantities).
+    """
+    pivot = CombinedPivot(lunch_items, cells, teachers, students)
+    return list(pivot.rows()), pivot.item_totals
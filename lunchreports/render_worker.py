@@ -0,0 +1,52 @@
+# Entry points run inside the background render process pool (see jobs.py)
+# and the PDF section pool (see generate_report.py). Workers are spawned, so
+# this module must be importable before Django is set up: anything touching
+# models is imported inside the functions.
+import logging  #noqa
+import os
+from io import BytesIO
+
+from xhtml2pdf import pisa
+
+
+def init_worker(settings_module):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+def run_report_job(job_id, report_kind, lunch_item_ids, school_id, service_date):
+    """
+    Render a queued report and store its PDF in the job directory.
+
+    :param job_id: Id of the job.
+    :param report_kind: Key of views.REPORTS.
+    :param lunch_item_ids: Ids of the selected lunch items, in report order.
+    :param school_id: Id of the report's school.
+    :param service_date: The report's service date, as YYYY-MM-DD.
+    """
+    from .jobs import write_job_file
+    from .models import LunchItem
+    from .partitions import get_report_partition
+    from .views import render_report_pdf
+
+    try:
+        items_by_id = LunchItem.objects.in_bulk(lunch_item_ids)
+        lunch_items = [items_by_id[pk] for pk in lunch_item_ids if pk in items_by_id]
+        partition = get_report_partition(school_id, service_date)
+        write_job_file(job_id, ".pdf", render_report_pdf(report_kind, lunch_items, partition))
+    except Exception as e:
+        logging.error(f"Error rendering report job {job_id}: {e}")
+        write_job_file(job_id, ".error", str(e).encode())
+
+
+def html_to_pdf(html):
+    """
+    Convert an HTML document to PDF bytes with xhtml2pdf.
+
+    :param html: HTML document, including its <style> block.
+    :return: PDF document as bytes.
+    """
+    pdf = BytesIO()
+    pisa.CreatePDF(html, dest=pdf)
+    return pdf.getvalue()
@@ -0,0 +1,97 @@
+from operator import attrgetter
+
+from .pivot import UNASSIGNED_TEACHER
+
+
+class CustomerQuantity:
+    """Quantity of one lunch item ordered by one student or teacher."""
+
+    __slots__ = ('student_id', 'teacher_id', 'name', 'quantity')
+
+    def __init__(self, student_id, teacher_id, name, quantity):
+        self.student_id = student_id
+        self.teacher_id = teacher_id
+        self.name = name
+        self.quantity = quantity
+
+
+class TeacherGroup:
+    """
+    Orders of one lunch item by a teacher and their students.
+
+    teacher_id is None for the group of students without a teacher ('-').
+    """
+
+    __slots__ = ('teacher_id', 'name', 'group_quantity', 'customers')
+
+    def __init__(self, teacher_id, name):
+        self.teacher_id = teacher_id
+        self.name = name
+        self.group_quantity = 0
+        self.customers = []
+
+    @property
+    def unassigned(self):
+        return self.teacher_id is None
+
+
+class ItemReport:
+    """All orders of one lunch item, grouped by teacher."""
+
+    __slots__ = ('lunch_item', 'total_quantity', 'groups')
+
+    def __init__(self, lunch_item, total_quantity, groups):
+        self.lunch_item = lunch_item
+        self.total_quantity = total_quantity
+        self.groups = groups
+
+    @property
+    def name(self):
+        return self.lunch_item.name
+
+
+def build_item_reports(lunch_items, rows):
+    """
+    Group per-customer order rows into one ItemReport per lunch item.
+
+    Groups and customers are addressed by id; each teacher and student name
+    is stored once and shared by every row that refers to it. Groups are
+    ordered by teacher name with the '-' group last, customers by name.
+
+    :param lunch_items: List of LunchItem objects, in report order.
+    :param rows: Iterable of (lunch_item_id, student_id, student_name,
+                 student_teacher_id, student_teacher_name, teacher_id,
+                 teacher_name, quantity) tuples, one per lunch item and customer.
+    :return: List of ItemReport.
+    """
+    student_names = {}
+    teacher_names = {}
+    groups_by_item = {item.pk: {} for item in lunch_items}
+    for (lunch_item_id, student_id, student_name, student_teacher_id,
+         student_teacher_name, teacher_id, teacher_name, quantity) in rows:
+        if student_id is not None:
+            name = student_names.setdefault(student_id, student_name)
+            group_id = student_teacher_id
+            group_name = (UNASSIGNED_TEACHER if group_id is None
+                          else teacher_names.setdefault(group_id, student_teacher_name))
+        else:
+            name = teacher_names.setdefault(teacher_id, teacher_name)
+            group_id = teacher_id
+            group_name = name
+
+        groups = groups_by_item[lunch_item_id]
+        group = groups.get(group_id)
+        if group is None:
+            group = groups[group_id] = TeacherGroup(group_id, group_name)
+        group.customers.append(CustomerQuantity(student_id, teacher_id, name, quantity))
+        group.group_quantity += quantity
+
+    item_reports = []
+    for item in lunch_items:
+        groups = sorted(groups_by_item[item.pk].values(),
+                        key=lambda group: (group.unassigned, group.name))
+        for group in groups:
+            group.customers.sort(key=attrgetter('name'))
+        item_reports.append(ItemReport(
+            item, sum(group.group_quantity for group in groups), groups))
+    return item_reports
@@ -0,0 +1,165 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .data_version import bump_data_version
+from .models import LunchItemOrder, LunchItemOrderRollup
+from .name_index import invalidate_name_index
+from .order_changes import record_order_changes
+
+ROLLUP_KEY_FIELDS = ('school_id', 'service_date', 'lunch_item_id', 'student_id', 'teacher_id')
+
+
+def order_rollup_key(order):
+    """
+    Return the rollup key of a LunchItemOrder (or a dict of its values).
+
+    :param order: A LunchItemOrder object or a dict with the key fields.
+    :return: Tuple of (school_id, service_date, lunch_item_id, student_id,
+             teacher_id).
+    """
+    if isinstance(order, dict):
+        return tuple(order[field] for field in ROLLUP_KEY_FIELDS)
+    return tuple(getattr(order, field) for field in ROLLUP_KEY_FIELDS)
+
+
+def apply_order_delta(key, quantity, order_count):
+    """
+    Add a quantity/order count delta to the rollup row for the given key,
+    and record the quantity change in the order change log.
+
+    Rows whose order count drops to zero are removed, so customers without
+    orders never show up in reports.
+
+    :param key: Rollup key, see order_rollup_key.
+    :param quantity: Quantity to add (negative to subtract).
+    :param order_count: Number of orders to add (negative to subtract).
+    """
+    with transaction.atomic():
+        _apply_rollup_delta(key, quantity, order_count)
+        record_order_changes({key: quantity})
+
+
+def _apply_rollup_delta(key, quantity, order_count):
+    lookup = dict(zip(ROLLUP_KEY_FIELDS, key, strict=True))
+    rows = LunchItemOrderRollup.objects.filter(**lookup)
+    with transaction.atomic():
+        updated = rows.update(quantity=F('quantity') + quantity,
+                              order_count=F('order_count') + order_count)
+        if not updated and order_count > 0:
+            try:
+                with transaction.atomic():
+                    LunchItemOrderRollup.objects.create(
+                        quantity=quantity, order_count=order_count, **lookup)
+            except IntegrityError:
+                # Another writer created the row first; add to theirs.
+                rows.update(quantity=F('quantity') + quantity,
+                            order_count=F('order_count') + order_count)
+        if order_count < 0:
+            rows.filter(order_count__lte=0).delete()
+
+
+def apply_order_deltas(deltas, batch_size=1000):
+    """
+    Add quantity/order count deltas for many rollup keys with a few bulk
+    queries: one lookup of the existing rows, a bulk_update that adds to them
+    and a bulk_create of the missing ones, plus a bulk_create of the order
+    change log rows. For newly inserted orders, whose deltas are all positive.
+
+    :param deltas: Dictionary mapping rollup keys to (quantity, order_count).
+    :param batch_size: Number of rows per bulk query.
+    """
+    if not deltas:
+        return
+    school_ids, service_dates, lunch_item_ids, student_ids, teacher_ids = (
+        {value for value in values if value is not None} for values in zip(*deltas, strict=True))
+    existing = LunchItemOrderRollup.objects.filter(
+        school_id__in=school_ids, service_date__in=service_dates,
+        lunch_item_id__in=lunch_item_ids,
+    ).filter(Q(student_id__in=student_ids) | Q(teacher_id__in=teacher_ids))
+    rows = [row for row in existing.only(*ROLLUP_KEY_FIELDS) if order_rollup_key(row) in deltas]
+    for row in rows:
+        quantity, order_count = deltas[order_rollup_key(row)]
+        row.quantity = F('quantity') + quantity
+        row.order_count = F('order_count') + order_count
+    with transaction.atomic():
+        LunchItemOrderRollup.objects.bulk_update(
+            rows, ['quantity', 'order_count'], batch_size=batch_size)
+        found = {order_rollup_key(row) for row in rows}
+        missing = {key: delta for key, delta in deltas.items() if key not in found}
+        try:
+            with transaction.atomic():
+                LunchItemOrderRollup.objects.bulk_create(
+                    (LunchItemOrderRollup(quantity=quantity,
+                                          order_count=order_count,
+                                          **dict(zip(ROLLUP_KEY_FIELDS, key, strict=True)))
+                     for key, (quantity, order_count) in missing.items()),
+                    batch_size=batch_size)
+        except IntegrityError:
+            # Another writer created some of the rows first; add to theirs.
+            for key, (quantity, order_count) in missing.items():
+                _apply_rollup_delta(key, quantity, order_count)
+        record_order_changes({key: quantity for key, (quantity, _) in deltas.items()},
+                             batch_size=batch_size)
+
+
+def _aggregate_orders():
+    """
+    Aggregate the raw LunchItemOrder table into rollup values.
+
+    :return: Dictionary mapping rollup keys to (quantity, order_count).
+    """
+    rows = (
+        LunchItemOrder.objects
+        .values(*ROLLUP_KEY_FIELDS)
+        .annotate(total_quantity=Sum('quantity'), total_orders=Count('id'))
+        .order_by()
+    )
+    return {order_rollup_key(row): (row['total_quantity'], row['total_orders'])
+            for row in rows}
+
+
+def rebuild_order_rollup(batch_size=1000):
+    """
+    Recompute the whole rollup table from LunchItemOrder.
+
+    Call this after bulk loads that bypass model signals (e.g. bulk_create).
+    Also bumps the report data version so cached reports are re-rendered, and
+    drops the name index (see name_index.py) in case the load added lunch
+    items, teachers or students.
+    Such loads are not in the order change log, so delta reports don't
+    include them.
+
+    :param batch_size: Number of rollup rows inserted per query.
+    :return: Number of rollup rows written.
+    """
+    totals = _aggregate_orders()
+    with transaction.atomic():
+        LunchItemOrderRollup.objects.all().delete()
+        LunchItemOrderRollup.objects.bulk_create(
+            (LunchItemOrderRollup(quantity=quantity,
+                                  order_count=order_count,
+                                  **dict(zip(ROLLUP_KEY_FIELDS, key, strict=True)))
+             for key, (quantity, order_count) in totals.items()),
+            batch_size=batch_size)
+        bump_data_version()
+    invalidate_name_index()
+    return len(totals)
+
+
+def find_order_rollup_mismatches():
+    """
+    Compare the rollup table against a fresh aggregation of LunchItemOrder.
+
+    :return: List of (key, expected, actual) tuples where expected/actual are
+             (quantity, order_count) pairs, or None when the row is missing.
+    """
+    expected = _aggregate_orders()
+    actual = {
+        order_rollup_key(row): (row['quantity'], row['order_count'])
+        for row in LunchItemOrderRollup.objects.values(
+            *ROLLUP_KEY_FIELDS, 'quantity', 'order_count')
+    }
+    return [(key, expected.get(key), actual.get(key))
+            for key in sorted(expected.keys() | actual.keys(),
+                              key=lambda k: tuple(v or 0 for v in k))
+            if expected.get(key) != actual.get(key)]
@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .data_version import bump_data_version
+from .models import (
+    LunchItem,
+    LunchItemOrder,
+    ReportSnapshot,
+    School,
+    Student,
+    Teacher,
+    default_school_id,
+)
+from .name_index import invalidate_name_index
+from .rollup import ROLLUP_KEY_FIELDS, apply_order_delta, order_rollup_key
+
+
+@receiver(pre_save, sender=Teacher)
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=LunchItemOrder)
+@receiver(pre_save, sender=ReportSnapshot)
+def assign_default_school(instance, **kwargs):
+    """
+    Put a row saved without a school, or loaded from a fixture without one,
+    in the default school. Orders have their customer's, set by save().
+    """
+    if instance.school_id is None:
+        instance.school_id = default_school_id()
+
+
+@receiver(pre_save, sender=LunchItemOrder)
+def remember_previous_order(sender, instance, **kwargs):
+    """Stash the stored version of an order that is about to be edited."""
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        instance._rollup_previous = (
+            sender.objects
+            .filter(pk=instance.pk)
+            .values(*ROLLUP_KEY_FIELDS, 'quantity')
+            .first()
+        )
+
+
+@receiver(post_save, sender=LunchItemOrder)
+def add_order_to_rollup(instance, **kwargs):
+    """Move an order's quantity from its previous rollup row to its current one."""
+    previous = getattr(instance, '_rollup_previous', None)
+    key = order_rollup_key(instance)
+    if previous is None:
+        apply_order_delta(key, instance.quantity, 1)
+    elif order_rollup_key(previous) == key:
+        apply_order_delta(key, instance.quantity - previous['quantity'], 0)
+    else:
+        apply_order_delta(order_rollup_key(previous), -previous['quantity'], -1)
+        apply_order_delta(key, instance.quantity, 1)
+    instance._rollup_previous = None
+
+
+@receiver(post_delete, sender=LunchItemOrder)
+def remove_order_from_rollup(instance, **kwargs):
+    """Subtract a deleted order from its rollup row."""
+    apply_order_delta(order_rollup_key(instance), -instance.quantity, -1)
+
+
+@receiver(post_save, sender=LunchItemOrder)
+@receiver(post_delete, sender=LunchItemOrder)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=LunchItem)
+@receiver(post_delete, sender=LunchItem)
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def invalidate_cached_reports(**kwargs):
+    """Bump the report data version after any write that can change a report."""
+    bump_data_version()
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=LunchItem)
+@receiver(post_delete, sender=LunchItem)
+def invalidate_names(**kwargs):
+    """
+    Drop the in-memory name index after a menu, teacher or student edit.
+
+    Again on commit, as a report running meanwhile may have reloaded it from
+    the data the edit hadn't committed yet.
+    """
+    invalidate_name_index()
+    transaction.on_commit(invalidate_name_index)
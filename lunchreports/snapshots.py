@@ -0,0 +1,189 @@
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .data_version import get_data_version
+from .databases import get_report_db_alias
+from .models import LunchItem, ReportSnapshot
+from .pivot import CombinedRow
+from .report_data import CustomerQuantity, ItemReport, TeacherGroup
+
+# Default configuration, overridable with the LUNCHREPORTS_SNAPSHOTS setting:
+#   MAX_AGE: seconds after which snapshots are pruned (None keeps them).
+#   MAX_COUNT: newest snapshots kept per report kind and partition (school
+#       and service date; None for no limit).
+DEFAULT_SNAPSHOTS = {
+    "MAX_AGE": 7 * 24 * 60 * 60,
+    "MAX_COUNT": 100,
+}
+
+
+def get_snapshots_config():
+    return {**DEFAULT_SNAPSHOTS, **getattr(settings, "LUNCHREPORTS_SNAPSHOTS", {})}
+
+
+def _lunch_items_json(lunch_items):
+    return [{"id": item.pk, "name": item.name} for item in lunch_items]
+
+
+def _lunch_items_from_json(items):
+    return [LunchItem(pk=item["id"], name=item["name"]) for item in items]
+
+
+def _encode_order_report(context):
+    return {
+        "item_reports": [{
+            "lunch_item": _lunch_items_json([item_report.lunch_item])[0],
+            "total_quantity": item_report.total_quantity,
+            "groups": [{
+                "teacher_id": group.teacher_id,
+                "name": group.name,
+                "group_quantity": group.group_quantity,
+                # (student_id, teacher_id, name, quantity) per customer.
+                "customers": [[customer.student_id, customer.teacher_id,
+                               customer.name, customer.quantity]
+                              for customer in group.customers],
+            } for group in item_report.groups],
+        } for item_report in context["item_reports"]],
+    }
+
+
+def _decode_order_report(data):
+    item_reports = []
+    for item_report in data["item_reports"]:
+        groups = []
+        for group_data in item_report["groups"]:
+            group = TeacherGroup(group_data["teacher_id"], group_data["name"])
+            group.group_quantity = group_data["group_quantity"]
+            group.customers = [CustomerQuantity(*customer)
+                               for customer in group_data["customers"]]
+            groups.append(group)
+        item_reports.append(ItemReport(_lunch_items_from_json([item_report["lunch_item"]])[0],
+                                       item_report["total_quantity"], groups))
+    return {"item_reports": item_reports}
+
+
+def _encode_combined_report(context):
+    return {
+        "title": context["title"],
+        "lunch_items": _lunch_items_json(context["lunch_items"]),
+        "total_lunch_item_quantities": dict(context["total_lunch_item_quantities"]),
+        # (teacher, teacher_rowspan, customer, is_total, cells) per table row.
+        "combined_rows": [[row.teacher, row.teacher_rowspan, row.customer, row.is_total,
+                           row.cells]
+                          for row in context["combined_rows"]],
+    }
+
+
+def _decode_combined_report(data):
+    return {
+        "title": data["title"],
+        "lunch_items": _lunch_items_from_json(data["lunch_items"]),
+        "total_lunch_item_quantities": data["total_lunch_item_quantities"],
+        "combined_rows": [CombinedRow(cells, customer=customer, teacher=teacher,
+                                      teacher_rowspan=teacher_rowspan, is_total=is_total)
+                          for teacher, teacher_rowspan, customer, is_total, cells
+                          in data["combined_rows"]],
+    }
+
+
+# Functions converting each report kind's template context to and from JSON.
+SNAPSHOT_CODECS = {
+    "order_report": (_encode_order_report, _decode_order_report),
+    "combined_order_report": (_encode_combined_report, _decode_combined_report),
+}
+
+
+def encode_report_data(report_kind, context):
+    """
+    Serialize a report's template context as zlib-compressed JSON.
+
+    :param report_kind: Key of views.REPORTS.
+    :param context: Template context built by the report's "context" function.
+    :return: Compressed JSON document as bytes.
+    """
+    encode, _ = SNAPSHOT_CODECS[report_kind]
+    data = {"report": report_kind, **encode(context)}
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def report_data_json(data):
+    """
+    :param data: Bytes returned by encode_report_data.
+    :return: The uncompressed JSON document as bytes.
+    """
+    return zlib.decompress(data)
+
+
+def decode_report_data(report_kind, data):
+    """
+    Rebuild a report's template context from encode_report_data output,
+    without querying the database.
+
+    :param report_kind: Key of views.REPORTS.
+    :param data: Bytes returned by encode_report_data.
+    :return: Template context.
+    """
+    _, decode = SNAPSHOT_CODECS[report_kind]
+    return decode(json.loads(report_data_json(data)))
+
+
+def create_report_snapshot(report_kind, lunch_items, partition):
+    """
+    Freeze a report: store its data and rendered PDF in a new ReportSnapshot,
+    then prune snapshots past the retention policy.
+
+    :param report_kind: Key of views.REPORTS.
+    :param lunch_items: List of LunchItem objects to include.
+    :param partition: ReportPartition the report is of.
+    :return: The new ReportSnapshot.
+    """
+    from .views import REPORTS, render_report_context_pdf
+
+    # Both read before the data, so that neither claims newer data than
+    # the snapshot holds; delta reports since the snapshot start here.
+    created_at = timezone.now()
+    data_version = get_data_version(using=get_report_db_alias())
+    context = REPORTS[report_kind]["context"](lunch_items, partition)
+    snapshot = ReportSnapshot.objects.create(
+        created_at=created_at,
+        report_kind=report_kind,
+        **partition.lookup(),
+        lunch_item_ids=[item.pk for item in lunch_items],
+        data_version=data_version,
+        data=encode_report_data(report_kind, context),
+        pdf=render_report_context_pdf(report_kind, context),
+    )
+    prune_report_snapshots()
+    return snapshot
+
+
+def prune_report_snapshots():
+    """
+    Delete snapshots older than MAX_AGE, and all but the newest MAX_COUNT
+    snapshots of each report kind and partition, so that snapshots of a busy
+    school or day never prune those of another, which delta reports since a
+    snapshot may still start from.
+
+    :return: Number of snapshots deleted.
+    """
+    config = get_snapshots_config()
+    deleted = 0
+    if config["MAX_AGE"] is not None:
+        cutoff = timezone.now() - timedelta(seconds=config["MAX_AGE"])
+        deleted += ReportSnapshot.objects.filter(created_at__lt=cutoff).delete()[0]
+    if config["MAX_COUNT"] is not None:
+        groups = (ReportSnapshot.objects.order_by()
+                  .values_list("report_kind", "school_id", "service_date").distinct())
+        for report_kind, school_id, service_date in list(groups):
+            stale = list(ReportSnapshot.objects
+                         .filter(report_kind=report_kind, school_id=school_id,
+                                 service_date=service_date)
+                         .order_by("-created_at", "-pk")
+                         .values_list("pk", flat=True)[config["MAX_COUNT"]:])
+            if stale:
+                deleted += ReportSnapshot.objects.filter(pk__in=stale).delete()[0]
+    return deleted
@@ -0,0 +1,38 @@
+from urllib.parse import quote
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend for many concurrent readers and writers.
+
+    Extra OPTIONS:
+      "pragmas": PRAGMAs run on every new connection, e.g. {"journal_mode": "wal"}.
+      "read_only": open the database file read-only, for report readers.
+
+    Write transactions start with BEGIN IMMEDIATE, so they wait for the write
+    lock (up to the "timeout" option) when they begin instead of failing with
+    "database is locked" when a read inside the transaction tries to upgrade.
+    """
+
+    def get_new_connection(self, conn_params):
+        conn_params = dict(conn_params)
+        pragmas = conn_params.pop("pragmas", {})
+        if conn_params.pop("read_only", False):
+            database = str(conn_params["database"])
+            if not database.startswith("file:"):
+                conn_params["database"] = f"file:{quote(database)}?mode=ro"
+            # The journal mode is a property of the file, set by writers.
+            pragmas = {name: value for name, value in pragmas.items()
+                       if name != "journal_mode"}
+        conn = super().get_new_connection(conn_params)
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.settings_dict["OPTIONS"].get("read_only"):
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute("BEGIN IMMEDIATE")
@@ -0,0 +1,82 @@
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import (
+    LunchItem,
+    LunchItemOrder,
+    School,
+    Student,
+    Teacher,
+    default_school_id,
+)
+from .rollup import rebuild_order_rollup
+
+
+def generate_synthetic_school(*, teachers, students, lunch_items, orders, seed=0,
+                              name_prefix="Synthetic", unassigned_ratio=0.05,
+                              teacher_order_ratio=0.1, days=1, school=None, batch_size=5000):
+    """
+    Create a reproducible synthetic school with bulk inserts.
+
+    The same arguments always produce the same names, teacher assignments and
+    orders. Lunch item names include name_prefix, which must not clash with
+    existing items. Orders are spread evenly over the `days` service days
+    ending today. The order rollup is rebuilt afterwards.
+
+    :param teachers: Number of teachers.
+    :param students: Number of students.
+    :param lunch_items: Number of lunch items.
+    :param orders: Number of LunchItemOrder rows.
+    :param seed: Random seed.
+    :param name_prefix: Prefix of generated names.
+    :param unassigned_ratio: Share of students without a teacher.
+    :param teacher_order_ratio: Share of orders placed by teachers.
+    :param days: Number of service days the orders are spread over.
+    :param school: Name of the school, created if missing; None for the
+                   default school.
+    :param batch_size: Number of rows inserted per query.
+    :return: Dictionary with the school id and the created teachers,
+             students and lunch items.
+    """
+    rng = random.Random(seed)
+    school_id = (School.objects.get_or_create(name=school)[0].pk if school is not None
+                 else default_school_id())
+    today = timezone.localdate()
+    service_dates = [today - timedelta(days=day) for day in range(days)]
+    teacher_objs = Teacher.objects.bulk_create(
+        (Teacher(name=f"{name_prefix} Teacher {i:05d}", school_id=school_id)
+         for i in range(teachers)),
+        batch_size=batch_size)
+    student_objs = Student.objects.bulk_create(
+        (Student(name=f"{name_prefix} Student {i:06d}", school_id=school_id,
+                 teacher=(None if not teacher_objs or rng.random() < unassigned_ratio
+                          else rng.choice(teacher_objs)))
+         for i in range(students)),
+        batch_size=batch_size)
+    item_objs = LunchItem.objects.bulk_create(
+        (LunchItem(name=f"{name_prefix} Item {i:04d}") for i in range(lunch_items)),
+        batch_size=batch_size)
+
+    def random_order(i):
+        order = LunchItemOrder(lunch_item=rng.choice(item_objs),
+                               quantity=rng.randint(1, 3),
+                               school_id=school_id,
+                               service_date=service_dates[i % days])
+        if teacher_objs and (not student_objs or rng.random() < teacher_order_ratio):
+            order.teacher = rng.choice(teacher_objs)
+        else:
+            order.student = rng.choice(student_objs)
+        return order
+
+    if orders and item_objs and (teacher_objs or student_objs):
+        LunchItemOrder.objects.bulk_create(
+            (random_order(i) for i in range(orders)), batch_size=batch_size)
+    rebuild_order_rollup()
+    return {
+        "school_id": school_id,
+        "teachers": teacher_objs,
+        "students": student_objs,
+        "lunch_items": item_objs,
+    }
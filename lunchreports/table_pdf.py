@@ -0,0 +1,238 @@
+from bisect import bisect_left, bisect_right
+from io import BytesIO
+from itertools import accumulate
+from xml.sax.saxutils import escape
+
+from django.template.defaultfilters import date as date_filter
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+# The "reportlab" PDF backend (see generate_report.py): the report tables laid
+# out directly with ReportLab platypus, without rendering and parsing the
+# report templates' HTML and CSS. The layout follows report.css: bordered,
+# centered cells, grey header and total rows, tables at 90% of the page width.
+
+_HEADER_GREY = colors.HexColor("#f0f0f0")
+_TOTAL_QUANTITY_GREY = colors.HexColor("#d3d3d3")
+_TABLE_WIDTH = 0.9
+# Tables are split across pages between rows, but never inside a spanned
+# cell. A teacher cell spans at most this many rows, which fit on a page, and
+# a longer run of rows repeats the teacher in a new span.
+_MAX_SPAN_ROWS = 40
+# Rows measured at a time; ReportLab takes time quadratic in a table's rows
+# to measure it.
+_MEASURED_ROWS = 200
+
+_styles = getSampleStyleSheet()
+_TITLE = ParagraphStyle("ReportTitle", parent=_styles["Heading1"], alignment=TA_CENTER)
+_NOTE = ParagraphStyle("ReportNote", parent=_styles["Normal"], alignment=TA_CENTER)
+# Header cells wrap, as "<item> Quantity" often doesn't fit the column.
+_HEADER = ParagraphStyle("ReportHeader", parent=_styles["Normal"], alignment=TA_CENTER,
+                         fontName="Helvetica-Bold", fontSize=9, leading=11)
+
+_BASE_STYLE = [
+    ("FONT", (0, 0), (-1, -1), "Helvetica", 10),
+    ("GRID", (0, 0), (-1, -1), 0.75, colors.black),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("TOPPADDING", (0, 0), (-1, -1), 2),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+    ("LEFTPADDING", (0, 0), (-1, -1), 2),
+    ("RIGHTPADDING", (0, 0), (-1, -1), 2),
+    ("BACKGROUND", (0, 0), (-1, 0), _HEADER_GREY),
+]
+
+
+def _heading(title, delta_since):
+    flowables = [Paragraph(escape(title), _TITLE)]
+    if delta_since:
+        since = date_filter(timezone.localtime(delta_since), "Y-m-d H:i T")
+        flowables.append(Paragraph(f"Changes since {escape(since)}", _NOTE))
+    return flowables
+
+
+def _header_row(item_names):
+    return [Paragraph(escape(name), _HEADER)
+            for name in ("Teacher", "Student", *(f"{item} Quantity" for item in item_names))]
+
+
+class _PagedTable(Flowable):
+    """
+    A table that platypus splits across pages in linear time.
+
+    Table.split re-measures every remaining row on each page, which makes a
+    long table quadratic. This one measures its rows once, then cuts a Table
+    of as many rows as fit off the front on each split, with the header row
+    on top. Cuts never fall inside a spanned cell.
+    """
+
+    def __init__(self, rows, style, width, start=1, layout=None):
+        super().__init__()
+        # rows[0] is the header; style holds per-row commands, which don't
+        # span more than one row except SPANs, ordered by their first row.
+        self._rows = rows
+        self._style = style
+        self._col_widths = [width / len(rows[0])] * len(rows[0])
+        self._start = start
+        self._layout = layout
+        self._style_rows = layout[3] if layout else [command[1][1] for command in style]
+        self.hAlign = "CENTER"
+        self.spaceAfter = 12
+
+    def _measure(self):
+        if self._layout is None:
+            inside_spans = {row for command in self._style if command[0] == "SPAN"
+                            for row in range(command[1][1] + 1, command[2][1] + 1)}
+            heights = []
+            first = 1
+            while True:
+                end = min(first + _MEASURED_ROWS, len(self._rows))
+                while end < len(self._rows) and end in inside_spans:
+                    end -= 1
+                table = self._table(first, end)
+                table.wrap(sum(self._col_widths), float("inf"))
+                header, *rows = table._rowHeights
+                heights.extend(rows)
+                if end == len(self._rows):
+                    break
+                first = end
+            self._layout = (header, [0, *accumulate(heights)], inside_spans, self._style_rows)
+        return self._layout
+
+    def _table(self, first, end):
+        # Rows first to end (exclusive) under the header, with their styles.
+        style = self._style[bisect_left(self._style_rows, first):bisect_left(self._style_rows, end)]
+        commands = [(name, (c0, r0 - first + 1), (c1, r1 - first + 1), *args)
+                    for name, (c0, r0), (c1, r1), *args in style]
+        table = Table([self._rows[0], *self._rows[first:end]], colWidths=self._col_widths)
+        table.setStyle(TableStyle(_BASE_STYLE + commands))
+        return table
+
+    def wrap(self, availWidth, availHeight):  # noqa: ARG002 (Flowable API)
+        header, offsets, _, _ = self._measure()
+        self.width = sum(self._col_widths)
+        self.height = header + offsets[-1] - offsets[self._start - 1]
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):  # noqa: ARG002 (Flowable API)
+        header, offsets, inside_spans, _ = self._measure()
+        # offsets[n] is the height of the first n rows below the header.
+        end = bisect_right(offsets, availHeight - header + offsets[self._start - 1])
+        while end > self._start and end in inside_spans:
+            end -= 1
+        if end <= self._start:
+            return []
+        if end >= len(self._rows):
+            return [self._table(self._start, len(self._rows))]
+        return [self._table(self._start, end),
+                _PagedTable(self._rows, self._style, sum(self._col_widths), end, self._layout)]
+
+    def draw(self):
+        table = self._table(self._start, len(self._rows))
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
+
+
+def _table(rows, style, width):
+    return _PagedTable(rows, sorted(style, key=lambda command: command[1][1]), width)
+
+
+def _span_teacher(rows, style, first, last, name):
+    for start in range(first, last + 1, _MAX_SPAN_ROWS):
+        end = min(start + _MAX_SPAN_ROWS - 1, last)
+        rows[start][0] = name
+        style.append(("SPAN", (0, start), (0, end)))
+
+
+def _total_row_style(row):
+    # The teacher column belongs to the rows above, through its span.
+    return [("FONT", (1, row), (-1, row), "Helvetica-Bold", 10),
+            ("BACKGROUND", (1, row), (-1, row), _HEADER_GREY)]
+
+
+def _total_quantity_row_style(row):
+    return [("FONT", (0, row), (-1, row), "Helvetica-Bold", 10),
+            ("BACKGROUND", (0, row), (-1, row), _TOTAL_QUANTITY_GREY),
+            ("SPAN", (0, row), (1, row))]
+
+
+def lunch_report_flowables(context, width):
+    """
+    Lay out the lunch order report by item: a titled table per lunch item.
+
+    :param context: Template context of lunch_order_report.html.
+    :param width: Width of the tables, in points.
+    :return: List of flowables.
+    """
+    flowables = []
+    for item_report in context["item_reports"]:
+        rows = [_header_row([item_report.name])]
+        style = []
+        for group in item_report.groups:
+            if group.unassigned:
+                rows.extend([group.name, customer.name, customer.quantity]
+                            for customer in group.customers)
+                continue
+            first = len(rows)
+            rows.extend(["", customer.name, customer.quantity] for customer in group.customers)
+            rows.append(["", "Total", group.group_quantity])
+            _span_teacher(rows, style, first, len(rows) - 1, group.name)
+            style.extend(_total_row_style(len(rows) - 1))
+        style.extend(_total_quantity_row_style(len(rows)))
+        rows.append(["Total Quantity", "", item_report.total_quantity])
+        flowables.extend(_heading(f"{item_report.name} Report", context.get("delta_since")))
+        flowables.append(_table(rows, style, width))
+    return flowables
+
+
+def combined_report_flowables(context, width):
+    """
+    Lay out the combined lunch order report: one table with a column per
+    lunch item. Honours the hide_title and hide_totals flags of chunks.
+
+    :param context: Template context of combined_order_report.html.
+    :param width: Width of the table, in points.
+    :return: List of flowables.
+    """
+    lunch_items = context["lunch_items"]
+    rows = [_header_row([item.name for item in lunch_items])]
+    style = []
+    spans = []
+    for row in context["combined_rows"]:
+        position = len(rows)
+        rows.append([row.teacher or "", "Total" if row.is_total else row.customer, *row.cells])
+        if row.teacher_rowspan:
+            spans.append((position, position + row.teacher_rowspan - 1, row.teacher))
+        if row.is_total:
+            style.extend(_total_row_style(position))
+    for first, last, teacher in spans:
+        _span_teacher(rows, style, first, last, teacher)
+    if not context.get("hide_totals"):
+        totals = context["total_lunch_item_quantities"]
+        style.extend(_total_quantity_row_style(len(rows)))
+        rows.append(["Total Quantity", "", *(totals.get(item.name) for item in lunch_items)])
+    flowables = [] if context.get("hide_title") else _heading(context["title"], context.get("delta_since"))
+    flowables.append(_table(rows, style, width))
+    return flowables
+
+
+def render_tables_pdf(flowables, context, *, title=""):
+    """
+    Render a report to PDF bytes from its template context.
+
+    :param flowables: Function laying the report out, e.g.
+                      lunch_report_flowables.
+    :param context: The report's template context.
+    :param title: Document title.
+    :return: PDF document as bytes.
+    """
+    pdf = BytesIO()
+    doc = SimpleDocTemplate(pdf, pagesize=A4, title=title,
+                            leftMargin=cm, rightMargin=cm, topMargin=cm, bottomMargin=cm)
+    doc.build(flowables(context, doc.width * _TABLE_WIDTH))
+    return pdf.getvalue()
@@ -1,3 +1,1882 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import Future
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from pypdf import PdfReader
+
+from .archive import archive_orders
+from .data_version import get_data_version
+from .databases import get_report_db_alias
+from .generate_report import _render_waiters, render_html, render_slot, report_css
+from .ingest import ingest_orders, parse_order_records
+from .instrumentation import RollingHistogram, get_report_stats, reset_report_stats
+from .jobs import JOB_DONE, JOB_PENDING, _remove_job_files, get_render_jobs_config
+from .models import (
+    LunchItem,
+    LunchItemOrder,
+    LunchItemOrderArchive,
+    LunchItemOrderChange,
+    LunchItemOrderRollup,
+    ReportSnapshot,
+    School,
+    Student,
+    Teacher,
+)
+from .name_index import (
+    NameIndex,
+    connect_warm_name_index,
+    get_name_index,
+    invalidate_name_index,
+    warm_name_index,
+)
+from .order_changes import prune_order_changes
+from .paginators import EstimatedCountPaginator
+from .partitions import ReportPartition, get_report_partition
+from .pdf_cache import (
+    FileSystemPdfCache,
+    MemoryPdfCache,
+    get_pdf_cache,
+    report_cache_key,
+)
+from .pivot import build_combined_pivot
+from .rollup import find_order_rollup_mismatches, rebuild_order_rollup
+from .snapshots import decode_report_data, encode_report_data, prune_report_snapshots
+from .sqlite_backend.base import DatabaseWrapper as SqliteDatabaseWrapper
+from .synthetic import generate_synthetic_school
+from .views import (
+    REPORTS,
+    _combined_lunch_report_context,
+    _combined_report_chunks,
+    _combined_report_delta_context,
+    _fetch_order_change_rows,
+    _fetch_report_cells,
+    _get_combined_report_data,
+    _get_lunch_items_from_request,
+    _get_lunch_report_data,
+    _lunch_report_delta_context,
+    _prepare_lunch_report_data,
+    render_report_pdf,
+    render_report_pdf_file,
+)
+from .warmup import next_cutoff, warmup_reports
+
+INITIAL_DATA = str(settings.BASE_DIR / "initial_data.json")
+
+
+def today():
+    # Fixture and synthetic orders are the default school's orders of today.
+    return get_report_partition()
+
+
+class PrepareLunchReportDataTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def _prepare(self, query=""):
+        request = RequestFactory().get(f"/order_report/{query}")
+        return _prepare_lunch_report_data(request)
+
+    def _summarize(self, item_report):
+        return [(group.name, group.group_quantity,
+                 [(customer.name, customer.quantity) for customer in group.customers])
+                for group in item_report.groups]
+
+    def test_totals_and_groups_match_fixture(self):
+        lunch_items, item_reports = self._prepare("?lunch_items=Pizza,Soup")
+
+        self.assertEqual([item.name for item in lunch_items], ["Pizza", "Soup"])
+        self.assertEqual([(r.name, r.total_quantity) for r in item_reports],
+                         [("Pizza", 11), ("Soup", 2)])
+        self.assertEqual(self._summarize(item_reports[0]), [
+            ("Mr. Smith", 8, [("Alexander", 4), ("Mr. Smith", 4)]),
+            ("-", 3, [("Fiona", 2), ("Katherine", 1)]),
+        ])
+        self.assertTrue(item_reports[0].groups[-1].unassigned)
+
+    def test_groups_are_addressed_by_id(self):
+        pizza = LunchItem.objects.get(name="Pizza")
+        namesake = Teacher.objects.create(name="Mr. Smith")
+        LunchItemOrder.objects.create(lunch_item=pizza, teacher=namesake, quantity=5)
+        _, item_reports = self._prepare("?lunch_items=Pizza")
+
+        self.assertEqual([(group.name, group.group_quantity) for group in item_reports[0].groups],
+                         [("Mr. Smith", 8), ("Mr. Smith", 5), ("-", 3)])
+
+    def test_item_without_orders_has_no_groups(self):
+        LunchItem.objects.create(name="Brownie")
+        _, item_reports = self._prepare("?lunch_items=Brownie")
+
+        self.assertEqual([(r.name, r.total_quantity, r.groups) for r in item_reports],
+                         [("Brownie", 0, [])])
+
+
+class PrepareLunchReportQueryCountTests(TestCase):
+
+    def _create_menu(self, size):
+        teacher = Teacher.objects.create(name="Teacher")
+        student = Student.objects.create(name="Student", teacher=teacher)
+        items = LunchItem.objects.bulk_create(
+            LunchItem(name=f"Item {i}") for i in range(size))
+        LunchItemOrder.objects.bulk_create(
+            [LunchItemOrder(lunch_item=item, student=student, school_id=student.school_id) for item in items] +
+            [LunchItemOrder(lunch_item=item, teacher=teacher, school_id=teacher.school_id) for item in items])
+        rebuild_order_rollup()
+        return items
+
+    def _assert_query_count(self, size):
+        items = self._create_menu(size)
+        names = ",".join(item.name for item in items)
+        request = RequestFactory().get("/order_report/", {"lunch_items": names})
+        get_name_index()
+        # The selection comes from the warm name index; one query resolves
+        # the partition, one fetches all order rows.
+        with self.assertNumQueries(2):
+            _, item_reports = _prepare_lunch_report_data(request)
+        self.assertEqual(sum(r.total_quantity for r in item_reports), 2 * size)
+
+    def test_query_count_with_small_menu(self):
+        self._assert_query_count(5)
+
+    def test_query_count_does_not_grow_with_menu(self):
+        self._assert_query_count(300)
+
+
+class NameIndexTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def _select(self, names):
+        return [item.name for item in _get_lunch_items_from_request(
+            RequestFactory().get("/order_report/", {"lunch_items": names}))]
+
+    def test_selection_costs_no_queries_once_warm(self):
+        menu = list(LunchItem.objects.order_by("pk").values_list("name", flat=True))
+        get_name_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._select("Soup,Pizza"), ["Pizza", "Soup"])
+            self.assertEqual(self._select(""), menu)
+        # An unknown name reloads the index once.
+        with self.assertNumQueries(3):
+            self.assertEqual(self._select("Unknown"), menu)
+
+    def test_menu_edits_invalidate_it(self):
+        get_name_index()
+        LunchItem.objects.create(name="Brownie")
+        self.assertEqual(self._select("Brownie"), ["Brownie"])
+        LunchItem.objects.filter(name="Brownie").delete()
+        self.assertNotIn("Brownie", self._select(""))
+
+    def test_teacher_rename_shows_in_reports(self):
+        get_name_index()
+        teacher = Teacher.objects.get(name="Mr. Smith")
+        teacher.name = "Mr. Smithers"
+        teacher.save()
+        _, item_reports = _prepare_lunch_report_data(RequestFactory().get("/order_report/"))
+        self.assertIn("Mr. Smithers", {group.name for r in item_reports for group in r.groups})
+
+    def test_customer_missing_from_it_reloads_it(self):
+        get_name_index()
+        # bulk_create sends no signals, as when another process adds a student.
+        student, = Student.objects.bulk_create([Student(name="Zoe", school_id=today().school_id)])
+        LunchItemOrder.objects.create(lunch_item=LunchItem.objects.get(name="Pizza"), student=student)
+        _, item_reports = _prepare_lunch_report_data(RequestFactory().get("/order_report/"))
+        self.assertIn("Zoe", {c.name for r in item_reports for g in r.groups for c in g.customers})
+        rows, _ = _get_combined_report_data(list(LunchItem.objects.all()), today())
+        self.assertIn("Zoe", {row.customer for row in rows})
+
+    def test_lunch_item_missing_from_it_reloads_it(self):
+        get_name_index()
+        # As when another process adds it.
+        LunchItem.objects.bulk_create([LunchItem(name="Tacos")])
+        lunch_items = _get_lunch_items_from_request(RequestFactory().get("/", {"lunch_items": "Tacos"}))
+        self.assertEqual([item.name for item in lunch_items], ["Tacos"])
+
+        # Unknown after the reload, it still selects all of them.
+        index = get_name_index()
+        lunch_items = _get_lunch_items_from_request(RequestFactory().get("/", {"lunch_items": "Sushi"}))
+        self.assertEqual(len(lunch_items), LunchItem.objects.count())
+        self.assertIsNot(get_name_index(), index)
+
+    def test_expires_after_ttl(self):
+        index = get_name_index()
+        self.assertIs(get_name_index(), index)
+        with override_settings(LUNCHREPORTS_NAME_INDEX={"TTL": 0}):
+            self.assertIsNot(get_name_index(), index)
+
+    def test_first_request_warms_it(self):
+        invalidate_name_index()
+        with mock.patch.object(NameIndex, "load", wraps=NameIndex.load) as load:
+            connect_warm_name_index()
+            load.assert_not_called()
+            self.client.get("/")
+            load.assert_called_once()
+            self.client.get("/")
+            load.assert_called_once()
+
+    def test_warming_survives_a_missing_table(self):
+        invalidate_name_index()
+        with mock.patch.object(NameIndex, "load", side_effect=OperationalError("no such table")) as load:
+            warm_name_index()
+        load.assert_called_once()
+        with override_settings(LUNCHREPORTS_NAME_INDEX={"WARM_ON_FIRST_REQUEST": False}), \
+                mock.patch.object(NameIndex, "load") as load:
+            warm_name_index()
+        load.assert_not_called()
+
+
+class LunchItemOrderRollupTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        self.pizza = LunchItem.objects.get(name="Pizza")
+        self.soup = LunchItem.objects.get(name="Soup")
+        self.teacher = Teacher.objects.create(name="Ms. Rollup")
+        self.student = Student.objects.create(name="Rolly", teacher=self.teacher)
+
+    def _rollup(self, lunch_item, **customer):
+        return LunchItemOrderRollup.objects.filter(
+            lunch_item=lunch_item, **customer).values_list(
+                "quantity", "order_count").first()
+
+    def test_fixture_load_populates_rollup(self):
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+    def test_create_update_and_delete_orders(self):
+        first = LunchItemOrder.objects.create(
+            lunch_item=self.pizza, student=self.student, quantity=2)
+        LunchItemOrder.objects.create(
+            lunch_item=self.pizza, student=self.student, quantity=3)
+        self.assertEqual(self._rollup(self.pizza, student=self.student), (5, 2))
+
+        first.quantity = 1
+        first.save()
+        self.assertEqual(self._rollup(self.pizza, student=self.student), (4, 2))
+
+        first.lunch_item = self.soup
+        first.save()
+        self.assertEqual(self._rollup(self.pizza, student=self.student), (3, 1))
+        self.assertEqual(self._rollup(self.soup, student=self.student), (1, 1))
+
+        first.delete()
+        self.assertIsNone(self._rollup(self.soup, student=self.student))
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+    def test_moving_order_from_student_to_teacher(self):
+        order = LunchItemOrder.objects.create(
+            lunch_item=self.pizza, student=self.student, quantity=2)
+        order.student = None
+        order.teacher = self.teacher
+        order.save()
+
+        self.assertIsNone(self._rollup(self.pizza, student=self.student))
+        self.assertEqual(self._rollup(self.pizza, teacher=self.teacher), (2, 1))
+
+    def test_bulk_create_requires_rebuild(self):
+        LunchItemOrder.objects.bulk_create([
+            LunchItemOrder(lunch_item=self.pizza, teacher=self.teacher, quantity=7,
+                           school_id=self.teacher.school_id)])
+        self.assertEqual(len(find_order_rollup_mismatches()), 1)
+
+        rebuild_order_rollup()
+        self.assertEqual(find_order_rollup_mismatches(), [])
+        self.assertEqual(self._rollup(self.pizza, teacher=self.teacher), (7, 1))
+
+    def test_rebuild_command(self):
+        LunchItemOrderRollup.objects.filter(lunch_item=self.pizza).update(quantity=0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_order_rollup", "--check", stdout=StringIO(), stderr=StringIO())
+
+        out = StringIO()
+        call_command("rebuild_order_rollup", stdout=out)
+        self.assertIn("matches", out.getvalue())
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+
+class PdfCacheBackendTests(TestCase):
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        cache = MemoryPdfCache(max_bytes=10)
+        cache.set("a", b"1234")
+        cache.set("b", b"5678")
+        self.assertEqual(cache.get("a"), b"1234")
+        cache.set("c", b"9012")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"1234")
+        self.assertEqual(cache.get("c"), b"9012")
+
+    def test_filesystem_cache_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileSystemPdfCache(location, max_bytes=10)
+            cache.set("a", b"1234")
+            cache.set("b", b"5678")
+            os.utime(cache._path("a"), (1000, 1000))
+            os.utime(cache._path("b"), (2000, 2000))
+            cache.get("a")
+            self.assertGreater(os.path.getmtime(cache._path("a")), 2000)
+            cache.set("c", b"9012")
+
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(cache.get("a"), b"1234")
+            self.assertEqual(cache.get("c"), b"9012")
+
+    def test_key_ignores_selection_order(self):
+        items = [LunchItem(pk=2), LunchItem(pk=1)]
+        partition = ReportPartition(1, date(2024, 9, 2))
+        self.assertEqual(report_cache_key("order_report", items, 3, partition),
+                         report_cache_key("order_report", items[::-1], 3, partition))
+        self.assertNotEqual(report_cache_key("order_report", items, 3, partition),
+                            report_cache_key("order_report", items, 4, partition))
+        self.assertNotEqual(report_cache_key("order_report", items, 3, partition),
+                            report_cache_key("combined_order_report", items, 3, partition))
+        for other in (ReportPartition(2, date(2024, 9, 2)), ReportPartition(1, date(2024, 9, 3))):
+            self.assertNotEqual(report_cache_key("order_report", items, 3, partition),
+                                report_cache_key("order_report", items, 3, other))
+        with override_settings(LUNCHREPORTS_PDF_RENDERING={"BACKEND": "reportlab"}):
+            reportlab_key = report_cache_key("order_report", items, 3, partition)
+        self.assertNotEqual(report_cache_key("order_report", items, 3, partition), reportlab_key)
+
+
+@override_settings(LUNCHREPORTS_PDF_CACHE={"BACKEND": "memory"})
+class CachedReportViewTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        get_pdf_cache().clear()
+        patcher = mock.patch("lunchreports.views.render_report_pdf",
+                             return_value=b"%PDF-report")
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_download_is_served_from_cache(self):
+        first = self.client.get("/order_report/?lunch_items=Pizza")
+        second = self.client.get("/order_report/?lunch_items=Pizza")
+
+        self.assertEqual(first.content, b"%PDF-report")
+        self.assertEqual(second.content, b"%PDF-report")
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get("/combined_order_report/")["ETag"]
+        response = self.client.get("/combined_order_report/", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_order_write_invalidates_cache(self):
+        version = get_data_version()
+        etag = self.client.get("/order_report/")["ETag"]
+        LunchItemOrder.objects.create(
+            lunch_item=LunchItem.objects.get(name="Pizza"),
+            teacher=Teacher.objects.get(name="Mr. Smith"))
+        self.assertGreater(get_data_version(), version)
+
+        response = self.client.get("/order_report/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.render.call_count, 2)
+
+    @override_settings(LUNCHREPORTS_PDF_CACHE={"BACKEND": None})
+    def test_cache_can_be_disabled(self):
+        self.client.get("/order_report/")
+        self.client.get("/order_report/")
+        self.assertEqual(self.render.call_count, 2)
+
+
+class InlineExecutor:
+    """Runs submitted jobs synchronously, in place of the render process pool."""
+
+    def __init__(self, run=True):
+        self.run = run
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        if self.run:
+            future.set_result(fn(*args))
+        return future
+
+
+class ReportJobTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(
+            LUNCHREPORTS_RENDER_JOBS={"DIRECTORY": directory.name},
+            LUNCHREPORTS_PDF_CACHE={"BACKEND": None})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch("lunchreports.views.render_report_pdf",
+                             return_value=b"%PDF-job")
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _use_executor(self, executor):
+        patcher = mock.patch("lunchreports.jobs._get_executor", return_value=executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return executor
+
+    def test_async_request_returns_job_and_pdf_can_be_downloaded(self):
+        self._use_executor(InlineExecutor())
+        response = self.client.get("/order_report/?lunch_items=Pizza&async=1")
+
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job["status"], JOB_DONE)
+        self.render.assert_called_once()
+        self.assertEqual(self.render.call_args.args[0], "order_report")
+
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], JOB_DONE)
+        download = self.client.get(job["download_url"])
+        self.assertEqual(b"".join(download.streaming_content), b"%PDF-job")
+        self.assertIn("Lunch Order Report by Item.pdf", download["Content-Disposition"])
+
+    def test_identical_requests_share_one_job(self):
+        executor = self._use_executor(InlineExecutor(run=False))
+        first = self.client.get("/combined_order_report/?async=1").json()
+        second = self.client.get("/combined_order_report/?async=1").json()
+
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.assertEqual(second["status"], JOB_PENDING)
+        self.assertEqual(len(executor.submitted), 1)
+        self.assertEqual(self.client.get(first["download_url"]).status_code, 202)
+
+    def test_job_id_is_the_report_cache_key(self):
+        self._use_executor(InlineExecutor(run=False))
+        with mock.patch("lunchreports.jobs.get_data_version", wraps=get_data_version) as version:
+            job = self.client.get("/order_report/?lunch_items=Pizza&async=1").json()
+        version.assert_called_once_with(using=get_report_db_alias())
+        response = self.client.get("/order_report/?lunch_items=Pizza")
+        self.assertEqual(response["ETag"], f'"{job["job_id"]}"')
+
+    def test_failed_job_is_retried(self):
+        executor = self._use_executor(InlineExecutor())
+        self.render.side_effect = RuntimeError("boom")
+        failed = self.client.get("/order_report/?async=1").json()
+        self.assertEqual(failed["status"], "failed")
+        self.assertEqual(self.client.get(failed["download_url"]).status_code, 404)
+
+        self.render.side_effect = None
+        retried = self.client.get("/order_report/?async=1").json()
+        self.assertEqual(retried["status"], JOB_DONE)
+        self.assertEqual(len(executor.submitted), 2)
+
+    def _pending_job(self, **metadata):
+        self._use_executor(InlineExecutor(run=False))
+        job = self.client.get("/order_report/?async=1").json()
+        path = os.path.join(get_render_jobs_config()["DIRECTORY"], f"{job['job_id']}.json")
+        with open(path) as f:
+            stored = json.load(f)
+        with open(path, "w") as f:
+            json.dump({**stored, **metadata}, f)
+        return job
+
+    def test_lost_jobs_fail_and_are_queued_again(self):
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        for metadata in ({"created": time.time() - 11 * 60}, {"owner_pid": exited.pid}):
+            with self.subTest(metadata=metadata):
+                job = self._pending_job(**metadata)
+                status = self.client.get(job["status_url"]).json()
+                self.assertEqual(status["status"], "failed")
+                self.assertEqual(self.client.get(job["download_url"]).status_code, 404)
+
+                executor = self._use_executor(InlineExecutor())
+                retried = self.client.get("/order_report/?async=1").json()
+                self.assertEqual(retried["job_id"], job["job_id"])
+                self.assertEqual(retried["status"], JOB_DONE)
+                self.assertEqual(len(executor.submitted), 1)
+                _remove_job_files(job["job_id"])
+
+    def test_expired_pdf_is_not_found(self):
+        self._use_executor(InlineExecutor())
+        job = self.client.get("/order_report/?async=1").json()
+        with mock.patch("lunchreports.views.get_report_job_pdf_path", return_value=None):
+            self.assertEqual(self.client.get(job["download_url"]).status_code, 404)
+
+    def test_unknown_job_is_not_found(self):
+        self.assertEqual(self.client.get(f"/report_jobs/{'0' * 64}/").status_code, 404)
+        self.assertEqual(self.client.get("/report_jobs/not-a-job/").status_code, 404)
+
+    def test_sync_rendering_remains_the_default(self):
+        executor = self._use_executor(InlineExecutor())
+        response = self.client.get("/order_report/")
+
+        self.assertEqual(response.content, b"%PDF-job")
+        self.assertEqual(executor.submitted, [])
+
+
+class ReportExportTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def _export(self, url):
+        response = self.client.get(url)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export_of_order_report(self):
+        response, content = self._export("/order_report/?lunch_items=Pizza&format=csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        # In the rollup index's order: teachers, then students, by id.
+        self.assertEqual(list(csv.reader(content.splitlines())), [
+            ["lunch_item", "teacher", "customer", "quantity"],
+            ["Pizza", "Mr. Smith", "Mr. Smith", "4"],
+            ["Pizza", "Mr. Smith", "Alexander", "4"],
+            ["Pizza", "-", "Fiona", "2"],
+            ["Pizza", "-", "Katherine", "1"],
+        ])
+
+    def test_jsonl_export_of_combined_report_is_ordered_by_customer(self):
+        _, content = self._export("/combined_order_report/?format=jsonl")
+        records = [(r["customer"], r["lunch_item"]) for r in map(json.loads, content.splitlines())]
+
+        customers = [customer for customer, _ in records]
+        self.assertEqual(customers[0], "Mr. Smith")
+        # Each customer's lunch items are consecutive, in menu order.
+        menu = list(LunchItem.objects.order_by("pk").values_list("name", flat=True))
+        for customer in set(customers):
+            items = [item for name, item in records if name == customer]
+            first = customers.index(customer)
+            self.assertEqual(customers[first:first + len(items)], [customer] * len(items))
+            self.assertEqual(items, sorted(items, key=menu.index))
+
+    def test_json_export_matches_pdf_totals(self):
+        _, content = self._export("/order_report/?format=json")
+        records = json.loads(content)
+
+        totals = {}
+        for record in records:
+            totals[record["lunch_item"]] = totals.get(record["lunch_item"], 0) + record["quantity"]
+        request = RequestFactory().get("/order_report/")
+        _, item_reports = _prepare_lunch_report_data(request)
+        self.assertEqual(totals, {r.name: r.total_quantity for r in item_reports if r.total_quantity})
+
+    def test_rows_are_only_queried_while_streaming(self):
+        get_name_index()
+        # The partition lookup; lunch items come from the name index.
+        with self.assertNumQueries(1):
+            response = self.client.get("/order_report/?lunch_items=Pizza&format=jsonl")
+        with self.assertNumQueries(1):
+            b"".join(response.streaming_content)
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get("/order_report/?format=xml").status_code, 400)
+
+
+class ParallelSectionRenderingTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def _page_texts(self, pdf):
+        return [page.extract_text() for page in PdfReader(BytesIO(pdf)).pages]
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"MODE": "parallel", "WORKERS": 2})
+    def test_sections_are_merged_in_item_order(self):
+        lunch_items = [LunchItem.objects.get(name=name) for name in ("Soup", "Pizza", "Apple")]
+        pages = self._page_texts(render_report_pdf("order_report", lunch_items, today()))
+
+        # Each item's section starts on its own page.
+        self.assertEqual(len(pages), 3)
+        for page, name in zip(pages, ("Soup", "Pizza", "Apple"), strict=True):
+            self.assertIn(f"{name} Report", page)
+        self.assertIn("Fiona", pages[1])
+
+    def test_single_mode_renders_one_document(self):
+        lunch_items = [LunchItem.objects.get(name=name) for name in ("Soup", "Pizza", "Apple")]
+        text = "".join(self._page_texts(
+            render_report_pdf("order_report", lunch_items, today(), mode="single")))
+
+        self.assertLess(text.index("Soup Report"), text.index("Pizza Report"))
+        self.assertLess(text.index("Pizza Report"), text.index("Apple Report"))
+
+
+class PdfBackendTests(TestCase):
+    fixtures = [INITIAL_DATA]
+    examples = {
+        "order_report": settings.BASE_DIR / "EXAMPLE_RESULTS" / "Lunch Order Report by Item.pdf",
+        "combined_order_report": settings.BASE_DIR / "EXAMPLE_RESULTS" / "Combined Lunch Order Report.pdf",
+    }
+
+    def _words(self, pdf):
+        reader = PdfReader(pdf if isinstance(pdf, os.PathLike) else BytesIO(pdf))
+        text = " ".join(" ".join(page.extract_text() for page in reader.pages).split())
+        # Backends break pages in different places, repeating the table head.
+        return re.sub(r"Teacher Student( (?!Total)\S+ Quantity)+ ", "", text).split()
+
+    def test_backends_render_the_example_reports(self):
+        lunch_items = list(LunchItem.objects.order_by("pk"))
+        for backend in ("xhtml2pdf", "reportlab"):
+            for report_kind, example in self.examples.items():
+                with self.subTest(backend=backend, report=report_kind), \
+                        override_settings(LUNCHREPORTS_PDF_RENDERING={"BACKEND": backend}):
+                    words = " ".join(self._words(render_report_pdf(report_kind, lunch_items, today())))
+                    # The combined report lists the whole roster; the example
+                    # leaves out the customers without orders.
+                    words = re.sub(r"(Mrs\. Johnson|Liam)( -){7} ", "", words)
+                    self.assertEqual(words.split(), self._words(example))
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"BACKEND": "reportlab", "MODE": "chunked",
+                                                   "CHUNK_ROWS": 2})
+    def test_reportlab_chunks_have_the_content_of_single_pdfs(self):
+        lunch_items = list(LunchItem.objects.order_by("pk"))
+        with tempfile.TemporaryFile() as f:
+            render_report_pdf_file("order_report", lunch_items, today(), f)
+            f.seek(0)
+            self.assertEqual(self._words(f.read()), self._words(self.examples["order_report"]))
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"BACKEND": "latex"})
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            render_report_pdf("order_report", list(LunchItem.objects.all()), today())
+
+
+class TablePdfLayoutTests(TestCase):
+
+    def test_long_tables_split_between_teacher_blocks(self):
+        lunch_items = generate_synthetic_school(
+            teachers=3, students=150, lunch_items=2, orders=600, seed=5)["lunch_items"]
+        with override_settings(LUNCHREPORTS_PDF_RENDERING={"BACKEND": "reportlab"}):
+            pdf = render_report_pdf("combined_order_report", lunch_items, today())
+        pages = [page.extract_text() for page in PdfReader(BytesIO(pdf)).pages]
+
+        self.assertGreater(len(pages), 2)
+        for page in pages:
+            self.assertIn("Synthetic Item 0001", page)
+            self.assertIn("Synthetic Teacher", page)
+        self.assertIn("Total Quantity", pages[-1])
+
+
+class ChunkedReportRenderingTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def _text(self, pdf):
+        return "".join(page.extract_text() for page in PdfReader(BytesIO(pdf)).pages)
+
+    def _words(self, pdf, lunch_items):
+        # Every chunk of the combined report repeats the table head.
+        head = " ".join(["Teacher", "Student"]
+                        + [f"{item.name} Quantity" for item in lunch_items])
+        return " ".join(self._text(pdf).split()).replace(head, "").split()
+
+    def test_chunked_pdfs_have_the_content_of_single_pdfs(self):
+        lunch_items = list(LunchItem.objects.all())
+        for report_kind in ("order_report", "combined_order_report"):
+            with self.subTest(report_kind), \
+                    override_settings(LUNCHREPORTS_PDF_RENDERING={"CHUNK_ROWS": 2}):
+                self.assertEqual(
+                    self._words(render_report_pdf(report_kind, lunch_items, today(), mode="chunked"),
+                                lunch_items),
+                    self._words(render_report_pdf(report_kind, lunch_items, today(), mode="single"),
+                                lunch_items))
+
+    def test_combined_chunks_keep_teacher_blocks_whole(self):
+        lunch_items = list(LunchItem.objects.all())
+        context = _combined_lunch_report_context(lunch_items, today())
+        chunks = list(_combined_report_chunks(context, 1))
+
+        self.assertEqual([row for chunk in chunks for row in chunk["combined_rows"]],
+                         context["combined_rows"])
+        for chunk in chunks:
+            self.assertIsNotNone(chunk["combined_rows"][0].teacher)
+        self.assertEqual([chunk["hide_title"] for chunk in chunks],
+                         [False] + [True] * (len(chunks) - 1))
+        self.assertEqual([chunk["hide_totals"] for chunk in chunks],
+                         [True] * (len(chunks) - 1) + [False])
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"MODE": "chunked"},
+                       LUNCHREPORTS_PDF_CACHE={"BACKEND": "memory"})
+    def test_view_streams_chunked_report_from_file(self):
+        response = self.client.get("/order_report/")
+        self.assertTrue(response.streaming)
+        self.assertIn("ETag", response)
+        pdf = b"".join(response.streaming_content)
+        self.assertIn("Soup Report", self._text(pdf))
+
+        cached = self.client.get("/order_report/")
+        self.assertEqual(b"".join(cached.streaming_content), pdf)
+
+    def test_filesystem_cache_stores_files(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileSystemPdfCache(location, max_bytes=10)
+            self.assertIsNone(cache.get_file("a"))
+            with tempfile.TemporaryFile() as f:
+                f.write(b"1234")
+                cache.set_file("a", f)
+            with cache.get_file("a") as f:
+                self.assertEqual(f.read(), b"1234")
+            with tempfile.TemporaryFile() as f:
+                f.write(b"12345678901")
+                cache.set_file("b", f)
+            self.assertIsNone(cache.get_file("b"))
+
+
+class ChunkedReportMemoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lunch_items = generate_synthetic_school(
+            teachers=4, students=60, lunch_items=6, orders=400, seed=3)["lunch_items"]
+        # Four times the lunch items give the order report about four times
+        # the pages, four times the roster the combined report.
+        cls.many_items = generate_synthetic_school(
+            teachers=4, students=60, lunch_items=24, orders=1600, seed=4,
+            school="Many Items", name_prefix="Items")
+        cls.small_roster = generate_synthetic_school(
+            teachers=4, students=60, lunch_items=2, orders=200, seed=5,
+            school="Small Roster", name_prefix="Small")
+        cls.large_roster = generate_synthetic_school(
+            teachers=16, students=240, lunch_items=2, orders=800, seed=6,
+            school="Large Roster", name_prefix="Large")
+
+    def _peak_memory(self, render):
+        tracemalloc.start()
+        try:
+            render()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def _render_chunked(self, report_kind, lunch_items, school):
+        partition = get_report_partition(school["school_id"])
+        with tempfile.TemporaryFile() as f:
+            peak = self._peak_memory(
+                lambda: render_report_pdf_file(report_kind, lunch_items, partition, f))
+            f.seek(0)
+            return len(PdfReader(f).pages), peak
+
+    def test_chunked_peak_memory_does_not_grow_with_pages(self):
+        reports = {
+            "order_report": ((self.many_items["lunch_items"][:6], self.many_items),
+                             (self.many_items["lunch_items"], self.many_items)),
+            "combined_order_report": ((self.small_roster["lunch_items"], self.small_roster),
+                                      (self.large_roster["lunch_items"], self.large_roster)),
+        }
+        # The faster backend; chunks are written out and collected the same
+        # way with either. One lunch item or teacher block per chunk.
+        for report_kind, (small, large) in reports.items():
+            with self.subTest(report_kind), \
+                    override_settings(LUNCHREPORTS_PDF_RENDERING={
+                        "BACKEND": "reportlab", "MODE": "chunked", "CHUNK_ROWS": 1}):
+                # Warm up the font and style caches outside the measurement.
+                self._render_chunked(report_kind, *small)
+                pages, peak = self._render_chunked(report_kind, *small)
+                large_pages, large_peak = self._render_chunked(report_kind, *large)
+
+                self.assertGreaterEqual(large_pages, 3 * pages)
+                self.assertLess(large_peak, peak * 1.25)
+
+    def test_chunked_rendering_uses_less_peak_memory(self):
+        def render(mode):
+            # About one lunch item per chunk.
+            with (override_settings(LUNCHREPORTS_PDF_RENDERING={"MODE": mode, "CHUNK_ROWS": 50}),
+                  tempfile.TemporaryFile() as f):
+                if mode == "chunked":
+                    render_report_pdf_file("order_report", self.lunch_items, today(), f)
+                else:
+                    f.write(render_report_pdf("order_report", self.lunch_items, today()))
+
+        single_peak = self._peak_memory(lambda: render("single"))
+        chunked_peak = self._peak_memory(lambda: render("chunked"))
+        self.assertLess(chunked_peak, single_peak / 2)
+
+
+class CombinedPivotTests(TestCase):
+
+    def _render(self, rows):
+        return [(row.teacher, row.teacher_rowspan, "Total" if row.is_total else row.customer,
+                 row.cells) for row in rows]
+
+    def test_rows_are_grouped_by_teacher_with_unassigned_last(self):
+        lunch_items = [LunchItem(pk=10, name="Pizza"), LunchItem(pk=20, name="Soup")]
+        teachers = [(1, "Ms. A"), (2, "Mr. B")]
+        students = [(1, "Ann", 1), (2, "Bob", None), (3, "Cat", 1), (4, "Dan", 2)]
+        cells = [
+            (10, 1, None, 2),
+            (20, 3, None, 1),
+            (10, None, 1, 1),
+            (20, 2, None, 4),
+            (20, 4, None, 0),
+        ]
+        rows, totals = build_combined_pivot(lunch_items, cells, teachers, students)
+
+        self.assertEqual(self._render(rows), [
+            ("Ms. A", 4, "Ann", [2, "-"]),
+            (None, None, "Cat", ["-", 1]),
+            (None, None, "Ms. A", [1, "-"]),
+            (None, None, "Total", [3, 1]),
+            ("Mr. B", 3, "Dan", ["-", "-"]),
+            (None, None, "Mr. B", ["-", "-"]),
+            (None, None, "Total", ["-", "-"]),
+            ("-", None, "Bob", ["-", 4]),
+        ])
+        self.assertEqual(totals, [3, 5])
+
+
+class CombinedReportDataTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def test_fixture_rows_and_totals(self):
+        lunch_items = [LunchItem.objects.get(name="Pizza"), LunchItem.objects.get(name="Soup")]
+        rows, totals = _get_combined_report_data(lunch_items, today())
+
+        self.assertEqual(totals, {"Pizza": 11, "Soup": 2})
+        first, *_ = rows
+        self.assertEqual((first.teacher, first.teacher_rowspan, first.customer, first.cells),
+                         ("Mr. Smith", 7, "Alexander", [4, "-"]))
+        unassigned = [(row.customer, row.cells) for row in rows if row.teacher == "-"]
+        self.assertEqual(unassigned, [("Fiona", [2, "-"]), ("Katherine", [1, "-"])])
+
+    def test_query_count_does_not_grow_with_menu(self):
+        lunch_items = list(LunchItem.objects.all())
+        partition = today()
+        get_name_index()
+        # Rollup cells; the roster comes from the name index.
+        with self.assertNumQueries(1):
+            _get_combined_report_data(lunch_items, partition)
+
+
+def _legacy_lunch_report_data(lunch_items):
+    """The name-keyed nested dicts the by-item report was built from before ItemReport."""
+    rows = (
+        LunchItemOrderRollup.objects
+        .filter(lunch_item__in=lunch_items)
+        .annotate(
+            customer=Case(
+                When(student__isnull=False, then=F('student__name')),
+                When(teacher__isnull=False, then=F('teacher__name')),
+                output_field=CharField()),
+            teacher_name=Case(
+                When(student__isnull=False, student__teacher__name__isnull=True, then=Value('-')),
+                When(student__isnull=False, then=F('student__teacher__name')),
+                When(teacher__isnull=False, then=F('teacher__name')),
+                output_field=CharField()))
+        .values('lunch_item_id', 'customer', 'teacher_name')
+        .annotate(total_quantity=Sum('quantity'))
+        .order_by('lunch_item_id', 'teacher_name', 'customer')
+    )
+    names = {item.pk: item.name for item in lunch_items}
+    orders_detail = {item.name: {} for item in lunch_items}
+    for row in rows:
+        groups = orders_detail[names[row['lunch_item_id']]]
+        group = groups.setdefault(row['teacher_name'], {'group_quantity': 0, 'customers': {}})
+        group['group_quantity'] += row['total_quantity']
+        group['customers'][row['customer']] = row['total_quantity']
+    return orders_detail
+
+
+class ReportDataMemoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lunch_items = generate_synthetic_school(
+            teachers=50, students=2000, lunch_items=30, orders=50000, seed=8)["lunch_items"]
+
+    def _peak_memory(self, build):
+        tracemalloc.start()
+        try:
+            result = build()
+            return tracemalloc.get_traced_memory()[1], result
+        finally:
+            tracemalloc.stop()
+
+    def test_item_reports_use_less_peak_memory_than_nested_dicts(self):
+        legacy_peak, legacy = self._peak_memory(lambda: _legacy_lunch_report_data(self.lunch_items))
+        peak, item_reports = self._peak_memory(lambda: _get_lunch_report_data(self.lunch_items, today()))
+
+        self.assertEqual(
+            {r.name: {g.name: g.group_quantity for g in r.groups} for r in item_reports},
+            {name: {teacher: group['group_quantity'] for teacher, group in groups.items()}
+             for name, groups in legacy.items()})
+        self.assertLess(peak, legacy_peak / 2)
+
+
+class SyntheticDataCommandTests(TestCase):
+
+    def _snapshot(self):
+        return (
+            list(Student.objects.order_by("name").values_list("name", "teacher__name")),
+            list(LunchItemOrder.objects.order_by("pk").values_list(
+                "lunch_item__name", "student__name", "teacher__name", "quantity")),
+        )
+
+    def test_same_seed_generates_same_school(self):
+        args = ["--teachers", "3", "--students", "20", "--items", "4", "--orders", "50", "--seed", "7"]
+        call_command("generate_synthetic_data", *args, stdout=StringIO())
+        first = self._snapshot()
+        LunchItemOrder.objects.all().delete()
+        Student.objects.all().delete()
+        Teacher.objects.all().delete()
+        LunchItem.objects.all().delete()
+        call_command("generate_synthetic_data", *args, stdout=StringIO())
+
+        self.assertEqual(self._snapshot(), first)
+        self.assertEqual(len(first[1]), 50)
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+
+class BenchmarkReportsCommandTests(TestCase):
+
+    def test_writes_stage_results_and_rolls_back_synthetic_data(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command("benchmark_reports", "--synthetic", "2", "10", "3", "30",
+                         "--skip-pdf", "--repeat", "1", "--output", output, stdout=StringIO())
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(set(results["stages"]), {
+            "name_index_load", "lunch_item_lookup", "partition_lookup",
+            "order_report.data", "order_report.template",
+            "combined_order_report.data", "combined_order_report.template",
+        })
+        self.assertEqual(results["stages"]["lunch_item_lookup"]["queries"], 0)
+        self.assertEqual(results["stages"]["order_report.data"]["queries"], 1)
+        self.assertEqual(results["stages"]["combined_order_report.data"]["queries"], 1)
+        self.assertGreater(results["stages"]["order_report.template"]["html_bytes"], 0)
+        self.assertEqual(results["dataset"]["orders"], 30)
+        self.assertFalse(LunchItemOrder.objects.exists())
+
+    def test_synthetic_needs_reports_on_the_default_database(self):
+        with mock.patch("lunchreports.management.commands.benchmark_reports.get_report_db_alias",
+                        return_value="reports"), self.assertRaises(CommandError):
+            call_command("benchmark_reports", "--synthetic", "2", "10", "3", "30", stdout=StringIO())
+        self.assertFalse(LunchItemOrder.objects.exists())
+
+    def test_times_each_pdf_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command("benchmark_reports", "--synthetic", "2", "10", "3", "30",
+                         "--reports", "order_report", "--pdf-backends", "xhtml2pdf", "reportlab",
+                         "--repeat", "1", "--output", output, stdout=StringIO())
+            with open(output) as f:
+                stages = json.load(f)["stages"]
+
+        for backend in ("xhtml2pdf", "reportlab"):
+            self.assertGreater(stages[f"order_report.pdf.{backend}"]["pdf_bytes"], 0)
+            self.assertGreater(stages[f"order_report.pdf.{backend}"]["pages"], 0)
+
+
+class LoadTestCommandTests(TestCase):
+
+    def test_reports_throughput_latency_and_server_usage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command("load_test_reports", "--synthetic", "2", "10", "3", "30",
+                         "--duration", "1", "--concurrency", "2", "--pdf-backend", "reportlab",
+                         "--output", output, stdout=StringIO())
+            with open(output) as f:
+                results = json.load(f)
+            stdout = StringIO()
+            call_command("load_test_reports", "--synthetic", "2", "10", "3", "30",
+                         "--duration", "1", "--concurrency", "2", "--pdf-backend", "reportlab",
+                         "--reports", "order_report", "--compare", output, stdout=stdout)
+
+        self.assertGreater(results["requests"], 0)
+        self.assertEqual(results["errors"], 0)
+        self.assertEqual(set(results["reports"]), {"order_report", "combined_order_report"})
+        self.assertEqual(set(results["latency_seconds"]), {"p50", "p90", "p95", "p99", "max"})
+        if os.path.isdir("/proc"):
+            self.assertGreater(results["server_process"]["rss_bytes_max"], 0)
+        self.assertIn("order_report", stdout.getvalue().split("Change against")[1])
+        # The synthetic database is the server's own.
+        self.assertFalse(LunchItem.objects.filter(name__startswith="LoadTest").exists())
+
+
+class ReportTemplateTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def _render(self, report_kind):
+        report = REPORTS[report_kind]
+        return render_html(report_title=report["title"], report_template=report["template"],
+                           **report["context"](list(LunchItem.objects.all()), today()))
+
+    def test_reports_inline_the_report_stylesheet(self):
+        for report_kind in REPORTS:
+            with self.subTest(report_kind):
+                html = self._render(report_kind)
+                self.assertIn(report_css(), html)
+                self.assertNotIn("index.css", html)
+        self.assertEqual(html.count("<style>"), 1)
+
+    def test_report_stylesheet_is_read_once(self):
+        report_css.cache_clear()
+        with mock.patch("builtins.open", wraps=open) as mock_open:
+            self._render("order_report")
+            self._render("combined_order_report")
+        opened = [str(call.args[0]) for call in mock_open.call_args_list]
+        self.assertEqual(len([path for path in opened if path.endswith("report.css")]), 1)
+
+    def test_benchmark_report_render_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command("benchmark_report_render", "--repeat", "2", "--output", output,
+                         stdout=StringIO())
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(set(results), set(REPORTS))
+        self.assertEqual(set(results["order_report"]), {"cold", "warm"})
+
+
+class ReportInstrumentationTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        get_pdf_cache().clear()
+        reset_report_stats()
+        self.addCleanup(reset_report_stats)
+
+    def test_report_response_has_server_timing_and_log_line(self):
+        with self.assertLogs("lunchreports.instrumentation", "INFO") as logs:
+            response = self.client.get("/order_report/?lunch_items=Pizza")
+
+        timing = dict(entry.split(";", 1)[0:2] for entry in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"db", "data", "template", "pdf", "total"})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "order_report")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["db_queries"], 0)
+        self.assertGreater(record["template_bytes"], 0)
+        self.assertEqual(record["pdf_bytes"], len(response.content))
+
+    def test_other_views_are_not_instrumented(self):
+        response = self.client.get("/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(get_report_stats(), {})
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.get("/combined_order_report/")
+        self.assertEqual(self.client.get("/report_stats/").status_code, 302)
+
+        User.objects.create_user("staff", password="secret", is_staff=True)
+        self.client.login(username="staff", password="secret")
+        stats = self.client.get("/report_stats/").json()
+        self.assertEqual(stats["combined_order_report"]["duration_ms"]["count"], 1)
+        self.assertIn("p99", stats["combined_order_report"]["db_queries"])
+
+    def test_histogram_percentiles_cover_recent_samples(self):
+        histogram = RollingHistogram(size=100)
+        for value in range(1, 201):
+            histogram.add(value)
+
+        self.assertEqual(histogram.summary(), {
+            "count": 100, "p50": 150, "p95": 195, "p99": 199, "max": 200,
+        })
+
+
+class ReportSnapshotTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        User.objects.create_user("staff", password="secret", is_staff=True)
+        self.client.login(username="staff", password="secret")
+
+    def test_taking_snapshots_is_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.post("/report_snapshots/?report=order_report").status_code, 302)
+        User.objects.create_user("parent", password="secret")
+        self.client.login(username="parent", password="secret")
+        self.assertEqual(self.client.post("/report_snapshots/?report=order_report").status_code, 302)
+        self.assertFalse(ReportSnapshot.objects.exists())
+
+    def _create(self, report_kind="order_report", query=""):
+        response = self.client.post(f"/report_snapshots/?report={report_kind}{query}")
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_data_round_trips_to_the_same_html(self):
+        lunch_items = list(LunchItem.objects.all())
+        for report_kind, report in REPORTS.items():
+            with self.subTest(report_kind):
+                context = report["context"](lunch_items, today())
+                with self.assertNumQueries(0):
+                    decoded = decode_report_data(report_kind,
+                                                 encode_report_data(report_kind, context))
+                self.assertEqual(
+                    render_html(report_title=report["title"],
+                                report_template=report["template"], **decoded),
+                    render_html(report_title=report["title"],
+                                report_template=report["template"], **context))
+
+    def test_snapshot_is_served_unchanged_after_new_orders(self):
+        created = self._create(query="&lunch_items=Pizza")
+        pdf = b"".join(self.client.get(created["download_url"]))
+        pizza = LunchItem.objects.get(name="Pizza")
+        LunchItemOrder.objects.create(lunch_item=pizza, student=Student.objects.first(),
+                                      quantity=40)
+
+        # One query fetches the stored PDF; nothing is aggregated or rendered.
+        with self.assertNumQueries(1):
+            response = self.client.get(created["download_url"])
+        self.assertEqual(response.content, pdf)
+        self.assertEqual(response["ETag"], f'"snapshot-{created["snapshot_id"]}"')
+        self.assertIn("immutable", response["Cache-Control"])
+        data = self.client.get(created["data_url"]).json()
+        self.assertEqual(data["report"], "order_report")
+        self.assertEqual([r["lunch_item"]["name"] for r in data["item_reports"]], ["Pizza"])
+        self.assertEqual(created["lunch_item_ids"], [pizza.pk])
+
+        not_modified = self.client.get(created["download_url"],
+                                       headers={"if-none-match": response["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_snapshot_metadata_and_errors(self):
+        created = self._create("combined_order_report")
+        status = self.client.get(created["status_url"]).json()
+        self.assertEqual(status["report"], "combined_order_report")
+        self.assertEqual(status["data_version"], get_data_version())
+
+        self.assertEqual(self.client.post("/report_snapshots/?report=nope").status_code, 400)
+        self.assertEqual(self.client.get("/report_snapshots/?report=order_report").status_code, 405)
+        self.assertEqual(self.client.get("/report_snapshots/999/download/").status_code, 404)
+
+    def test_prune_keeps_newest_snapshots_per_report(self):
+        with override_settings(LUNCHREPORTS_SNAPSHOTS={"MAX_COUNT": 2, "MAX_AGE": None}):
+            ids = [self._create()["snapshot_id"] for _ in range(3)]
+            combined_id = self._create("combined_order_report")["snapshot_id"]
+        self.assertEqual(set(ReportSnapshot.objects.values_list("pk", flat=True)),
+                         {ids[1], ids[2], combined_id})
+
+        ReportSnapshot.objects.filter(pk=ids[1]).update(
+            created_at=timezone.now() - timedelta(days=30))
+        with override_settings(LUNCHREPORTS_SNAPSHOTS={"MAX_AGE": 7 * 24 * 60 * 60}):
+            self.assertEqual(prune_report_snapshots(), 1)
+        self.assertFalse(ReportSnapshot.objects.filter(pk=ids[1]).exists())
+
+    def test_prune_keeps_newest_snapshots_per_partition(self):
+        School.objects.create(name="Quiet School")
+        with override_settings(LUNCHREPORTS_SNAPSHOTS={"MAX_COUNT": 1, "MAX_AGE": None}):
+            quiet_id = self._create(query="&school=Quiet School")["snapshot_id"]
+            yesterday_id = self._create(
+                query=f"&date={timezone.localdate() - timedelta(days=1)}")["snapshot_id"]
+            busy_ids = [self._create()["snapshot_id"] for _ in range(3)]
+        self.assertEqual(set(ReportSnapshot.objects.values_list("pk", flat=True)),
+                         {quiet_id, yesterday_id, busy_ids[-1]})
+
+    def test_snapshot_reports_command(self):
+        out = StringIO()
+        call_command("snapshot_reports", "--reports", "order_report",
+                     "--lunch-items", "Soup", stdout=out)
+        snapshot = ReportSnapshot.objects.get()
+        self.assertEqual(snapshot.lunch_item_ids, [LunchItem.objects.get(name="Soup").pk])
+        self.assertIn(f"Snapshot {snapshot.pk} of order_report", out.getvalue())
+
+        call_command("snapshot_reports", "--reports", "combined_order_report",
+                     "--date", "2024-09-02", stdout=out)
+        snapshot = ReportSnapshot.objects.get(report_kind="combined_order_report")
+        self.assertEqual(snapshot.service_date, date(2024, 9, 2))
+        with self.assertRaises(CommandError):
+            call_command("snapshot_reports", "--date", "not-a-date", stdout=out)
+
+
+class OrderChangeDeltaTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        self.since = timezone.now()
+        self.pizza = LunchItem.objects.get(name="Pizza")
+        self.soup = LunchItem.objects.get(name="Soup")
+        self.student = Student.objects.get(name="Alexander")
+        self.teacher = Teacher.objects.get(name="Ms. Davis")
+
+    def _make_changes(self):
+        LunchItemOrder.objects.create(lunch_item=self.pizza, student=self.student, quantity=3)
+        order = LunchItemOrder.objects.create(lunch_item=self.soup, teacher=self.teacher,
+                                              quantity=2)
+        order.quantity = 5
+        order.save()
+        # Created and deleted again: cancels out.
+        LunchItemOrder.objects.create(lunch_item=self.soup, student=self.student,
+                                      quantity=4).delete()
+
+    def _groups(self, item_report):
+        return [(group.name, group.group_quantity,
+                 [(customer.name, customer.quantity) for customer in group.customers])
+                for group in item_report.groups]
+
+    def test_order_timestamps(self):
+        order = LunchItemOrder.objects.create(lunch_item=self.pizza, student=self.student)
+        created_at, updated_at = order.created_at, order.updated_at
+        self.assertGreaterEqual(created_at, self.since)
+        order.quantity = 2
+        order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.created_at, created_at)
+        self.assertGreater(order.updated_at, updated_at)
+
+    def test_lunch_report_delta_has_only_changed_quantities(self):
+        self._make_changes()
+        partition = today()
+        with self.assertNumQueries(1):
+            context = _lunch_report_delta_context([self.pizza, self.soup], partition, self.since)
+
+        pizza, soup = context["item_reports"]
+        self.assertEqual(self._groups(pizza), [("Mr. Smith", 3, [("Alexander", 3)])])
+        self.assertEqual(self._groups(soup), [("Ms. Davis", 5, [("Ms. Davis", 5)])])
+        self.assertEqual(context["delta_since"], self.since)
+        self.assertEqual(_lunch_report_delta_context([self.pizza], today(), timezone.now())
+                         ["item_reports"][0].groups, [])
+
+    def test_removed_orders_are_negative_changes(self):
+        order = LunchItemOrder.objects.filter(lunch_item=self.pizza).first()
+        order.delete()
+        (item_report,) = _lunch_report_delta_context([self.pizza], today(), self.since)["item_reports"]
+        self.assertEqual(item_report.total_quantity, -order.quantity)
+
+    def test_combined_delta_has_rows_for_changed_customers(self):
+        self._make_changes()
+        context = _combined_report_delta_context([self.pizza, self.soup], today(), self.since)
+        self.assertEqual([(row.teacher, row.customer, row.cells) for row in context["combined_rows"]],
+                         [("Mr. Smith", "Alexander", [3, "-"]),
+                          (None, "Mr. Smith", ["-", "-"]),
+                          (None, None, [3, "-"]),
+                          ("Ms. Davis", "Ms. Davis", ["-", 5]),
+                          (None, None, ["-", 5])])
+        self.assertEqual(context["total_lunch_item_quantities"], {"Pizza": 3, "Soup": 5})
+
+    def test_views_render_changes_since_timestamp_or_snapshot(self):
+        User.objects.create_user("staff", password="secret", is_staff=True)
+        self.client.login(username="staff", password="secret")
+        snapshot_id = self.client.post("/report_snapshots/?report=order_report").json()["snapshot_id"]
+        self._make_changes()
+        for since in (self.since.isoformat(), "last_snapshot", f"snapshot:{snapshot_id}"):
+            with self.subTest(since):
+                response = self.client.get("/order_report/", {"since": since, "lunch_items": "Pizza"})
+                self.assertEqual(response.status_code, 200)
+                text = "".join(page.extract_text()
+                               for page in PdfReader(BytesIO(response.content)).pages)
+                self.assertIn("Changes since", text)
+                self.assertIn("Alexander", text)
+                self.assertNotIn("Beatrice", text)
+
+        response = self.client.get("/combined_order_report/", {"since": self.since.isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_since_is_rejected(self):
+        too_old = (timezone.now() - timedelta(days=365)).isoformat()
+        for query in ({"since": "yesterday"}, {"since": "snapshot:999"},
+                      {"since": "last_snapshot"}, {"since": too_old},
+                      {"since": self.since.isoformat(), "format": "csv"}):
+            with self.subTest(query):
+                self.assertEqual(self.client.get("/order_report/", query).status_code, 400)
+
+    def test_bulk_ingested_orders_are_logged(self):
+        ingest_orders([{"lunch_item": "Pizza", "teacher": "Ms. Davis", "quantity": 2}])
+        (item_report,) = _lunch_report_delta_context([self.pizza], today(), self.since)["item_reports"]
+        self.assertEqual(self._groups(item_report), [("Ms. Davis", 2, [("Ms. Davis", 2)])])
+
+    def test_delta_query_uses_partition_time_index(self):
+        partition = today()
+        LunchItemOrderChange.objects.bulk_create(
+            LunchItemOrderChange(lunch_item=self.pizza, student=self.student, quantity=1,
+                                 changed_at=self.since - timedelta(minutes=i),
+                                 **partition.lookup())
+            for i in range(1, 2000))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        plan = _fetch_order_change_rows([self.pizza], partition, self.since).explain()
+        self.assertIn("USING COVERING INDEX order_change_partition_idx "
+                      "(school_id=? AND service_date=? AND lunch_item_id=? AND changed_at>?)"
+                      if connection.vendor == "sqlite" else "order_change_partition_idx", plan)
+
+    def test_old_changes_are_pruned(self):
+        self._make_changes()
+        old = LunchItemOrderChange.objects.update(changed_at=timezone.now() - timedelta(days=60))
+        LunchItemOrder.objects.create(lunch_item=self.pizza, student=self.student)
+        self.assertEqual(prune_order_changes(), old)
+        self.assertEqual(LunchItemOrderChange.objects.count(), 1)
+
+
+class OrderIngestionTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        get_pdf_cache().clear()
+
+    def test_valid_rows_are_inserted_and_invalid_rows_reported(self):
+        Student.objects.create(name="Alexander")
+        version = get_data_version()
+        orders_before = LunchItemOrder.objects.count()
+        records = parse_order_records(
+            "lunch_item,lunch_item_id,student,student_id,teacher,quantity\n"
+            "Pizza,,Beatrice,,,2\n"
+            ",3,,4,,\n"
+            "Soup,,,,Ms. Davis,1\n"
+            "Pizza,,Alexander,,,1\n"
+            "Pizza,,Beatrice,,Ms. Davis,1\n"
+            "Caviar,,,,Ms. Davis,1\n"
+            "Taco,,,99,,1\n"
+            "Taco,,Beatrice,,,0\n",
+            "csv")
+
+        # Per chunk: 5 reference lookups at most (names and ids seen before are
+        # cached), then one transaction for the inserts, rollup update and
+        # order change log.
+        with self.assertNumQueries(18):
+            result = ingest_orders(records, chunk_size=5)
+
+        self.assertEqual(result["rows"], 8)
+        self.assertEqual(result["created"], 3)
+        self.assertEqual([error["row"] for error in result["errors"]], [4, 5, 6, 7, 8])
+        self.assertIn("ambiguous", result["errors"][0]["errors"][0])
+        self.assertEqual(LunchItemOrder.objects.count(), orders_before + 3)
+        self.assertTrue(LunchItemOrder.objects.filter(
+            lunch_item_id=3, student_id=4, quantity=1).exists())
+        self.assertEqual(find_order_rollup_mismatches(), [])
+        self.assertGreater(get_data_version(), version)
+
+    def test_json_and_jsonl_input(self):
+        orders = [{"lunch_item": "Cookie", "teacher_id": 1, "quantity": 3}]
+        self.assertEqual(parse_order_records(json.dumps({"orders": orders}), "json"), orders)
+        self.assertEqual(parse_order_records(json.dumps(orders[0]) + "\n\n", "jsonl"), orders)
+        self.assertEqual(ingest_orders(orders)["created"], 1)
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+    def test_non_integer_values_are_rejected(self):
+        orders_before = LunchItemOrder.objects.count()
+        records = [
+            {"lunch_item": "Pizza", "teacher_id": 1, "quantity": 2.5},
+            {"lunch_item": "Pizza", "teacher_id": 1, "quantity": True},
+            {"lunch_item": "Pizza", "teacher_id": True},
+            {"lunch_item_id": 1.0, "teacher_id": 1},
+            {"lunch_item": "Pizza", "teacher_id": "1", "quantity": "2.5"},
+            {"lunch_item": "Pizza", "teacher_id": " 1 ", "quantity": "3"},
+        ]
+        result = ingest_orders(records)
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([error["row"] for error in result["errors"]], [1, 2, 3, 4, 5])
+        self.assertTrue(all("expected an integer" in error["errors"][0]
+                            for error in result["errors"]))
+        self.assertEqual(LunchItemOrder.objects.count(), orders_before + 1)
+        self.assertTrue(LunchItemOrder.objects.filter(teacher_id=1, quantity=3).exists())
+
+    def test_rows_the_database_rejects_are_reported(self):
+        bulk_create = LunchItemOrder.objects.bulk_create
+
+        def reject_unlucky(orders, *args, **kwargs):
+            if any(order.quantity == 13 for order in orders):
+                raise IntegrityError("unlucky quantity")
+            return bulk_create(orders, *args, **kwargs)
+
+        records = [{"lunch_item": "Pizza", "teacher_id": 1, "quantity": quantity}
+                   for quantity in (1, 13, 2)]
+        with mock.patch.object(LunchItemOrder.objects, "bulk_create", side_effect=reject_unlucky):
+            result = ingest_orders(records)
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(result["errors"], [{"row": 2, "errors": ["Not saved: unlucky quantity"]}])
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+    def test_endpoint_is_staff_only_and_rejects_bad_input(self):
+        body = "lunch_item,teacher\nApple,Mr. Smith\n"
+        response = self.client.post("/orders/ingest/", body, content_type="text/csv")
+        self.assertEqual(response.status_code, 302)
+
+        User.objects.create_user("staff", password="secret", is_staff=True)
+        self.client.login(username="staff", password="secret")
+        response = self.client.post("/orders/ingest/", body, content_type="text/csv")
+        self.assertEqual(response.json(), {"rows": 1, "created": 1, "errors": []})
+        response = self.client.post("/orders/ingest/?format=json", "[1, 2]",
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/orders/ingest/", body, content_type="text/plain")
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_reads_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.jsonl")
+            with open(path, "w") as f:
+                f.write('{"lunch_item": "Salad", "student": "Fiona"}\n'
+                        '{"lunch_item": "Salad"}\n')
+            stdout, stderr = StringIO(), StringIO()
+            call_command("ingest_orders", path, stdout=stdout, stderr=stderr)
+
+        self.assertIn("Created 1 of 2 orders", stdout.getvalue())
+        self.assertIn("Row 2:", stderr.getvalue())
+
+
+class ReportWarmupTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_settings = {"BACKEND": "filesystem", "LOCATION": os.path.join(directory.name, "pdfs"),
+                               "MAX_BYTES": 64 * 1024 * 1024}
+        settings_override = override_settings(
+            LUNCHREPORTS_PDF_CACHE=self.cache_settings,
+            LUNCHREPORTS_REPORT_WARMUP={"STATUS_FILE": os.path.join(directory.name, "warmup.json")})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_warmed_reports_are_served_from_the_cache(self):
+        response = self.client.get("/report_warmup/")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()["ready"])
+
+        status = warmup_reports()
+        # All items and combined, then one per lunch item, for the one school.
+        self.assertEqual((status["total"], status["done"], status["failed"]), (9, 9, 0))
+        self.assertEqual([entry["lunch_items"] for entry in status["reports"][:3]],
+                         [list(LunchItem.objects.order_by("pk").values_list("name", flat=True))] * 2
+                         + [["Pizza"]])
+
+        with mock.patch("lunchreports.views.render_report_pdf", side_effect=AssertionError):
+            for url in ("/order_report/", "/order_report/?lunch_items=Soup",
+                        "/combined_order_report/"):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response["Content-Type"], "application/pdf")
+        response = self.client.get("/report_warmup/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["ready"])
+
+        self.assertTrue(all(entry["cached"] for entry in warmup_reports()["reports"]))
+
+    def test_warmup_needs_the_shared_cache(self):
+        with override_settings(LUNCHREPORTS_PDF_CACHE={"BACKEND": "memory"}):
+            with self.assertRaises(ImproperlyConfigured):
+                warmup_reports()
+            with self.assertRaises(CommandError):
+                call_command("warm_reports", stdout=StringIO())
+        self.assertEqual(self.client.get("/report_warmup/").status_code, 503)
+
+        # Web workers with their own caches aren't warmed by it.
+        warmup_reports()
+        for cache in ({"BACKEND": "memory"},
+                      {**self.cache_settings, "LOCATION": self.cache_settings["LOCATION"] + "-other"}):
+            with self.subTest(cache=cache), override_settings(LUNCHREPORTS_PDF_CACHE=cache):
+                response = self.client.get("/report_warmup/")
+                self.assertEqual(response.status_code, 503)
+                self.assertFalse(response.json()["shared_cache"])
+
+    def test_order_changes_make_the_warmup_stale(self):
+        warmup_reports()
+        LunchItemOrder.objects.create(lunch_item=LunchItem.objects.get(name="Soup"),
+                                      student=Student.objects.get(name="Liam"), quantity=1)
+
+        response = self.client.get("/report_warmup/")
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.json()["stale"])
+
+    def test_failed_reports_are_recorded(self):
+        with mock.patch("lunchreports.views.render_report_pdf", side_effect=OSError("disk full")), \
+                self.assertLogs("lunchreports.warmup", "ERROR"):
+            status = warmup_reports()
+
+        self.assertEqual(status["failed"], status["total"])
+        self.assertEqual(status["reports"][0]["error"], "OSError: disk full")
+        self.assertEqual(self.client.get("/report_warmup/").status_code, 503)
+
+    @override_settings(LUNCHREPORTS_REPORT_WARMUP={"CUTOFF": "10:30"})
+    def test_next_cutoff(self):
+        tz = timezone.get_current_timezone()
+        before = timezone.make_aware(timezone.datetime(2024, 9, 2, 9, 0), tz)
+        self.assertEqual(next_cutoff(before), timezone.make_aware(timezone.datetime(2024, 9, 2, 10, 30), tz))
+        self.assertEqual(next_cutoff(before.replace(hour=10, minute=30)),
+                         timezone.make_aware(timezone.datetime(2024, 9, 3, 10, 30), tz))
+
+    def test_command_warms_once(self):
+        stdout = StringIO()
+        call_command("warm_reports", stdout=stdout)
+
+        self.assertIn("Warmed 9 of 9 reports", stdout.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("warm_reports", "--date", "tomorrow", stdout=StringIO())
+
+
+class SchoolDayPartitionTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        self.pizza = LunchItem.objects.get(name="Pizza")
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        self.other_school = School.objects.create(name="Other School")
+        self.other_teacher = Teacher.objects.create(name="Mr. Other", school=self.other_school)
+
+    def _export(self, url):
+        response = self.client.get(url)
+        return response, b"".join(response.streaming_content).decode()
+
+    def _pizza_groups(self, query=""):
+        _, (item_report,) = _prepare_lunch_report_data(
+            RequestFactory().get(f"/order_report/?lunch_items=Pizza{query}"))
+        return [(group.name, group.group_quantity) for group in item_report.groups]
+
+    def test_reports_read_one_school_and_day(self):
+        alexander = Student.objects.get(name="Alexander")
+        LunchItemOrder.objects.create(lunch_item=self.pizza, student=alexander, quantity=7,
+                                      service_date=self.yesterday)
+        order = LunchItemOrder.objects.create(lunch_item=self.pizza, teacher=self.other_teacher,
+                                              quantity=5)
+        self.assertEqual(order.school, self.other_school)
+
+        today_groups = [("Mr. Smith", 8), ("-", 3)]
+        self.assertEqual(self._pizza_groups(), today_groups)
+        self.assertEqual(self._pizza_groups(f"&date={timezone.localdate().isoformat()}"), today_groups)
+        self.assertEqual(self._pizza_groups(f"&date={self.yesterday.isoformat()}"),
+                         [("Mr. Smith", 7)])
+        self.assertEqual(self._pizza_groups("&school=Other School"), [("Mr. Other", 5)])
+        self.assertEqual(self._pizza_groups(f"&school={self.other_school.pk}"), [("Mr. Other", 5)])
+
+        context = _combined_lunch_report_context([self.pizza], get_report_partition("Other School"))
+        self.assertEqual([(row.teacher, row.customer, row.cells) for row in context["combined_rows"]],
+                         [("Mr. Other", "Mr. Other", [5]), (None, None, [5])])
+
+    def test_invalid_date_or_unknown_school_is_rejected(self):
+        for query in ("?date=2024-13-01", "?date=yesterday", "?school=Nowhere"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/order_report/{query}").status_code, 400)
+                self.assertEqual(self.client.get(f"/combined_order_report/{query}&format=csv")
+                                 .status_code, 400)
+
+    def test_ingested_orders_go_to_the_customers_school_and_day(self):
+        result = ingest_orders([
+            {"lunch_item": "Pizza", "teacher": "Mr. Other", "service_date": self.yesterday.isoformat()},
+            {"lunch_item": "Pizza", "teacher": "Mr. Other", "service_date": "tomorrow"},
+        ])
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(result["errors"][0]["row"], 2)
+        self.assertEqual(self._pizza_groups(f"&school=Other School&date={self.yesterday.isoformat()}"),
+                         [("Mr. Other", 1)])
+        self.assertEqual(find_order_rollup_mismatches(), [])
+
+    def test_old_days_are_archived_and_still_reported(self):
+        alexander = Student.objects.get(name="Alexander")
+        for quantity in (2, 3):
+            LunchItemOrder.objects.create(lunch_item=self.pizza, student=alexander, quantity=quantity,
+                                          service_date=self.yesterday)
+        LunchItemOrder.objects.create(lunch_item=self.pizza, teacher=self.other_teacher,
+                                      service_date=self.yesterday)
+        query = f"&date={self.yesterday.isoformat()}"
+        before = self._pizza_groups(query)
+        version = get_data_version()
+        today_orders = LunchItemOrder.objects.filter(service_date=timezone.localdate()).count()
+
+        self.assertEqual(archive_orders(before=timezone.localdate()), {"days": 2, "orders": 3})
+
+        self.assertFalse(LunchItemOrder.objects.filter(service_date=self.yesterday).exists())
+        self.assertFalse(LunchItemOrderRollup.objects.filter(service_date=self.yesterday).exists())
+        self.assertFalse(LunchItemOrderChange.objects.filter(service_date=self.yesterday).exists())
+        self.assertEqual(LunchItemOrder.objects.count(), today_orders)
+        self.assertEqual(find_order_rollup_mismatches(), [])
+        self.assertGreater(get_data_version(), version)
+        self.assertTrue(get_report_partition(None, self.yesterday).archived)
+        self.assertEqual(self._pizza_groups(query), before)
+        self.assertEqual(self._pizza_groups("&school=Other School" + query), [("Mr. Other", 1)])
+
+        # Orders entered for an archived day are reported at once, and added
+        # to it when archived again.
+        LunchItemOrder.objects.create(lunch_item=self.pizza, student=alexander,
+                                      service_date=self.yesterday)
+        LunchItemOrder.objects.create(lunch_item=self.pizza, teacher=Teacher.objects.get(name="Mr. Smith"),
+                                      service_date=self.yesterday)
+        self.assertEqual(self._pizza_groups(query), [("Mr. Smith", 7)])
+        context = _combined_lunch_report_context([self.pizza], get_report_partition(None, self.yesterday))
+        cells = {row.customer: row.cells for row in context["combined_rows"]}
+        self.assertEqual((cells["Alexander"], cells["Mr. Smith"]), ([6], [1]))
+        _, content = self._export(f"/order_report/?lunch_items=Pizza&format=csv{query}")
+        self.assertEqual(list(csv.reader(content.splitlines()))[1:],
+                         [["Pizza", "Mr. Smith", "Mr. Smith", "1"], ["Pizza", "Mr. Smith", "Alexander", "6"]])
+        self.assertEqual(archive_orders(before=timezone.localdate()), {"days": 1, "orders": 2})
+        self.assertEqual(LunchItemOrderArchive.objects.get(student=alexander).order_count, 3)
+        self.assertEqual(self._pizza_groups(query), [("Mr. Smith", 7)])
+
+    def test_customers_who_moved_school_are_still_reported(self):
+        alexander = Student.objects.get(name="Alexander")
+        alexander.school = self.other_school
+        alexander.save()
+
+        context = _combined_lunch_report_context([self.pizza], today())
+        self.assertIn(("Alexander", 4), [(row.customer, row.cells[0]) for row in context["combined_rows"]])
+
+    def test_school_is_assigned_on_save(self):
+        with self.assertNumQueries(0):
+            teacher = Teacher(name="Ms. New")
+        teacher.save()
+        self.assertEqual(teacher.school_id, today().school_id)
+
+    def test_archive_command_keeps_recent_days(self):
+        alexander = Student.objects.get(name="Alexander")
+        LunchItemOrder.objects.create(lunch_item=self.pizza, student=alexander,
+                                      service_date=timezone.localdate() - timedelta(days=120))
+        stdout = StringIO()
+        call_command("archive_orders", "--dry-run", stdout=stdout)
+        self.assertIn("1 school days", stdout.getvalue())
+        call_command("archive_orders", stdout=StringIO())
+        self.assertEqual(LunchItemOrderArchive.objects.count(), 1)
+        self.assertTrue(LunchItemOrder.objects.filter(service_date=timezone.localdate()).exists())
+
+
+class LargeTableAdminTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_superuser("admin", password="secret")
+        self.client.login(username="admin", password="secret")
+
+    def _add_orders(self, orders, seed):
+        generate_synthetic_school(teachers=3, students=20, lunch_items=3, orders=orders,
+                                  seed=seed, name_prefix=f"Admin {seed}")
+
+    def test_order_changelist_query_count_is_constant(self):
+        # Session, user, the school and lunch item filter choices, the row
+        # estimate and (as it's small) a count of the table, and the page's
+        # rows with their school, lunch item and customer.
+        self._add_orders(30, seed=1)
+        with self.assertNumQueries(7):
+            response = self.client.get("/admin/lunchreports/lunchitemorder/")
+        self.assertEqual(len(response.context["cl"].result_list), 30)
+        self._add_orders(300, seed=2)
+        with self.assertNumQueries(7):
+            response = self.client.get("/admin/lunchreports/lunchitemorder/?p=2")
+        self.assertEqual(len(response.context["cl"].result_list), 100)
+        # A filtered list is counted, up to COUNT_LIMIT rows, without an estimate.
+        lunch_item = LunchItem.objects.first()
+        with self.assertNumQueries(6):
+            self.client.get(f"/admin/lunchreports/lunchitemorder/?lunch_item__id__exact={lunch_item.pk}")
+
+    def test_student_changelist_query_count_is_constant(self):
+        self._add_orders(0, seed=1)
+        with self.assertNumQueries(6):
+            self.client.get("/admin/lunchreports/student/")
+        self._add_orders(0, seed=2)
+        with self.assertNumQueries(6):
+            self.client.get("/admin/lunchreports/student/")
+
+    def test_paginator_estimates_unfiltered_and_caps_filtered_counts(self):
+        self._add_orders(30, seed=1)
+        LunchItemOrder.objects.filter(pk__in=LunchItemOrder.objects.order_by("-pk")[:5]).delete()
+        orders = LunchItemOrder.objects.order_by("-pk")
+        with mock.patch.object(EstimatedCountPaginator, "COUNT_LIMIT", 10):
+            # The span of primary keys.
+            self.assertEqual(EstimatedCountPaginator(orders, 100).count, 25)
+            self.assertEqual(EstimatedCountPaginator(orders.filter(quantity__gt=0), 100).count, 10)
+        self.assertEqual(EstimatedCountPaginator(orders, 100).count, 25)
+
+    def test_order_form_doesnt_list_customers(self):
+        self._add_orders(0, seed=1)
+        response = self.client.get("/admin/lunchreports/lunchitemorder/add/")
+        self.assertNotContains(response, "Admin 1 Student 000000")
+        self.assertContains(response, 'data-field-name="student"')
+        self.assertContains(response, 'data-field-name="teacher"')
+
+
+class ReportIndexTests(TestCase):
+    """The report queries are answered from the covering indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Ten days of orders, of which reports read today's.
+        school = generate_synthetic_school(teachers=20, students=1000, lunch_items=20,
+                                           orders=20000, days=10, seed=3)
+        cls.lunch_items = school["lunch_items"][:2]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name, sqlite_range=""):
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            self.assertIn(f"USING COVERING INDEX {index_name} {sqlite_range}".strip(), plan)
+        else:
+            self.assertIn(index_name, plan)
+
+    def test_report_data_query_uses_partition_range_of_rollup_index(self):
+        partition_range = "(school_id=? AND service_date=? AND lunch_item_id=?)"
+        self.assertUsesIndex(_fetch_report_cells(self.lunch_items, today()),
+                             "rollup_partition_qty_idx", partition_range)
+
+    def test_archivable_days_use_service_date_index(self):
+        plan = LunchItemOrder.objects.filter(service_date__lt=timezone.localdate()) \
+            .values_list("school_id", "service_date").distinct().explain()
+        if connection.vendor == "sqlite":
+            self.assertIn("USING COVERING INDEX order_service_date_idx (service_date<?)", plan)
+        else:
+            self.assertIn("order_service_date_idx", plan)
+
+    def test_rollup_aggregation_uses_order_index(self):
+        aggregation = (LunchItemOrder.objects
+                       .filter(lunch_item__in=self.lunch_items, **today().lookup())
+                       .values("school_id", "service_date", "lunch_item_id", "student_id",
+                               "teacher_id")
+                       .annotate(total=Sum("quantity"), orders=Count("id"))
+                       .order_by())
+        self.assertUsesIndex(aggregation, "order_partition_qty_idx")
+
+
+class ConcurrentSqliteProfileTests(TestCase):
+
+    def _connect(self, path, **options):
+        return SqliteDatabaseWrapper(
+            {**connection.settings_dict, "NAME": path,
+             "OPTIONS": {"pragmas": {"journal_mode": "wal", "synchronous": "normal"},
+                         **options}},
+            alias="sqlite-profile-test")
+
+    def test_pragmas_and_read_only_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "db.sqlite3")
+            writer = self._connect(path)
+            with writer.cursor() as cursor:
+                cursor.execute("CREATE TABLE t (x INTEGER)")
+                cursor.execute("PRAGMA journal_mode")
+                self.assertEqual(cursor.fetchone()[0], "wal")
+                cursor.execute("PRAGMA synchronous")
+                self.assertEqual(cursor.fetchone()[0], 1)
+
+            reader = self._connect(path, read_only=True)
+            with reader.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM t")
+                with self.assertRaises(sqlite3.OperationalError):
+                    cursor.connection.execute("INSERT INTO t VALUES (1)")
+            writer.close()
+            reader.close()
+
+    def test_reports_keep_up_with_concurrent_order_writers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ,
+                   "SQLITE_PATH": os.path.join(directory, "db.sqlite3"),
+                   "SQLITE_CONCURRENT": "1"}
+            manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+            subprocess.run([*manage, "migrate", "-v0"], env=env, check=True,
+                           capture_output=True)
+            output = subprocess.run(
+                [*manage, "benchmark_concurrent_reports", "--readers", "6", "--writers", "4",
+                 "--duration", "2", "--synthetic", "5", "100", "4", "1000"],
+                env=env, check=True, capture_output=True, text=True).stdout
+
+        results = json.loads(output)
+        self.assertEqual(results["report_alias"], "reports")
+        self.assertEqual(results["errors"], {})
+        self.assertGreater(results["reads"], 0)
+        self.assertGreater(results["writes"], 0)
+        # No reader waited on a writer's lock for anywhere near the busy timeout.
+        self.assertLess(results["read_max_seconds"], 5)
+
+
+class AsyncReportViewTests(TestCase):
+    fixtures = [INITIAL_DATA]
+
+    def setUp(self):
+        get_pdf_cache().clear()
+
+    def _text(self, pdf):
+        return "".join(page.extract_text() for page in PdfReader(BytesIO(pdf)).pages)
+
+    async def test_async_views_match_sync_views(self):
+        for path in ("order_report/?lunch_items=Pizza,Soup", "combined_order_report/"):
+            get_pdf_cache().clear()
+            expected = await sync_to_async(self.client.get)(f"/{path}")
+            get_pdf_cache().clear()
+            response = await self.async_client.get(f"/async/{path}")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self._text(response.content), self._text(expected.content))
+            self.assertEqual(response["ETag"], expected["ETag"])
+            # Queries run through async querysets are still counted.
+            self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+    async def _wait_for_queued_renders(self, count):
+        while len(_render_waiters) < count:
+            await asyncio.sleep(0.01)
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"MAX_RENDERS": 1, "QUEUE_TIMEOUT": 60})
+    async def test_busy_render_pool_queues_requests(self):
+        async with render_slot():
+            request = asyncio.ensure_future(self.async_client.get("/async/order_report/"))
+            await self._wait_for_queued_renders(1)
+            self.assertFalse(request.done())
+        response = await request
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(_render_waiters), 0)
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"MAX_RENDERS": 1, "MAX_QUEUED": 1,
+                                                   "RETRY_AFTER": 7})
+    async def test_full_render_queue_returns_503(self):
+        async with render_slot():
+            queued = asyncio.ensure_future(self.async_client.get("/async/order_report/"))
+            await self._wait_for_queued_renders(1)
+            response = await self.async_client.get("/async/order_report/?lunch_items=Apple")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual((await queued).status_code, 200)
+
+        response = await self.async_client.get("/async/order_report/?lunch_items=Apple")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(LUNCHREPORTS_PDF_RENDERING={"MAX_RENDERS": 1, "QUEUE_TIMEOUT": 0.1})
+    async def test_render_queue_timeout_returns_503(self):
+        async with render_slot():
+            response = await self.async_client.get("/async/order_report/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(_render_waiters), 0)
+
+    async def test_exports_fall_back_to_sync_view(self):
+        response = await self.async_client.get("/async/combined_order_report/?format=jsonl")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+
+class PartitionMigrationTests(TransactionTestCase):
+    before = [("lunchreports", "0007_school_partitions")]
+    after = [("lunchreports", "0008_partition_existing_data")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _create_order(self):
+        apps = self._migrate(self.before)
+        teacher = apps.get_model("lunchreports", "Teacher").objects.create(name="Ms. Old")
+        lunch_item = apps.get_model("lunchreports", "LunchItem").objects.create(name="Stew")
+        return apps.get_model("lunchreports", "LunchItemOrder").objects.create(
+            lunch_item=lunch_item, teacher=teacher, quantity=2).pk
+
+    @override_settings(LUNCHREPORTS_BACKFILL_SERVICE_DATE="2024-09-02")
+    def test_existing_orders_get_the_configured_service_date(self):
+        order_id = self._create_order()
+        apps = self._migrate(self.after)
+
+        order = apps.get_model("lunchreports", "LunchItemOrder").objects.get(pk=order_id)
+        self.assertEqual(order.service_date, date(2024, 9, 2))
+        rollup = apps.get_model("lunchreports", "LunchItemOrderRollup").objects.get()
+        self.assertEqual((rollup.service_date, rollup.quantity), (date(2024, 9, 2), 2))
+
+    @override_settings(LUNCHREPORTS_BACKFILL_SERVICE_DATE=None)
+    def test_existing_orders_need_a_service_date(self):
+        self._create_order()
+        with self.assertRaisesMessage(ImproperlyConfigured, "LUNCHREPORTS_BACKFILL_SERVICE_DATE"):
+            self._migrate(self.after)
+        # Lets tearDown migrate forward again.
+        self._migrate(self.before).get_model("lunchreports", "LunchItemOrder").objects.all().delete()
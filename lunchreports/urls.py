@@ -7,5 +7,28 @@ urlpatterns = [
     path("order_report/", views.lunch_report, name="order_report"),
     path("combined_order_report/",
          views.combined_lunch_report,
-         name="combined_order_report")
+         name="combined_order_report"),
+    path("async/order_report/", views.lunch_report_async, name="order_report_async"),
+    path("async/combined_order_report/",
+         views.combined_lunch_report_async,
+         name="combined_order_report_async"),
+    path("report_jobs/<slug:job_id>/",
+         views.report_job_status,
+         name="report_job_status"),
+    path("report_jobs/<slug:job_id>/download/",
+         views.report_job_download,
+         name="report_job_download"),
+    path("report_snapshots/", views.report_snapshot_create, name="report_snapshot_create"),
+    path("report_snapshots/<int:snapshot_id>/",
+         views.report_snapshot,
+         name="report_snapshot"),
+    path("report_snapshots/<int:snapshot_id>/download/",
+         views.report_snapshot_download,
+         name="report_snapshot_download"),
+    path("report_snapshots/<int:snapshot_id>/data/",
+         views.report_snapshot_data,
+         name="report_snapshot_data"),
+    path("orders/ingest/", views.order_ingest, name="order_ingest"),
+    path("report_stats/", views.report_stats, name="report_stats"),
+    path("report_warmup/", views.report_warmup, name="report_warmup"),
 ]
@@ -1,25 +1,58 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.views import View
-from .models import Student, Teacher, LunchItem, LunchItemOrder
+from .models import ReportSnapshot
 from django.core.exceptions import ValidationError
-from .generate_report import populate_pdf_response
+from .generate_report import (RenderPoolBusy, get_pdf_backend, get_pdf_rendering_config,
+                              html_to_pdf_async, pdf_file_response, pdf_response, render_html,
+                              render_pdf, render_pdf_chunks, render_pdf_chunks_async,
+                              render_pdf_sections, render_pdf_sections_async, render_slot,
+                              render_tables, write_pdf_chunks)
+from .table_pdf import combined_report_flowables, lunch_report_flowables
+from .data_version import get_data_version
+from .databases import get_report_db_alias
+from .pdf_cache import get_pdf_cache, report_cache_key
+from .jobs import (JOB_FAILED, JOB_PENDING, enqueue_report_job, get_render_jobs_config,
+                   get_report_job, get_report_job_pdf_path)
+from .pivot import UNASSIGNED_TEACHER, CombinedPivot, build_combined_pivot
+from .report_data import build_item_reports
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_response
+from .instrumentation import get_report_stats, record_stage
+from .ingest import INGEST_FORMATS, IngestFormatError, ingest_orders, parse_order_records
+from .snapshots import create_report_snapshot, report_data_json
+from .order_changes import parse_since
+from .partitions import aget_report_partition, get_report_partition
+from .name_index import aget_name_index, aselect_lunch_items, get_name_index, select_lunch_items
+from .warmup import get_warmup_status
+from django.contrib.admin.views.decorators import staff_member_required
+from asgiref.sync import sync_to_async
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseBadRequest,
+                         JsonResponse)
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response
 from collections import defaultdict
 from decimal import Decimal
+from io import BytesIO
+import heapq
+import tempfile
 import logging  #noqa
-from django.db.models import F, Value, Case, When, CharField, Sum, Prefetch
-from .models import LunchItemOrder, LunchItem, Teacher, Student
+import time
+from django.db.models import F, Sum
+from .models import LunchItemOrderArchive, LunchItemOrderChange, LunchItemOrderRollup
 
 def index(request):
   return render(request, 'index.html')
 
 def _get_lunch_items_from_request(request):
-  lunch_item_names = ",".join(request.GET.getlist('lunch_items'))
-  lunch_item_names = lunch_item_names.split(",")
-  lunch_item_model_list = list(
-      LunchItem.objects.filter(name__in=lunch_item_names))
-  if len(lunch_item_model_list) <= 0:
-    return list(LunchItem.objects.all())
-  return lunch_item_model_list
+  # Selected from the in-memory name index, without queries once it's loaded
+  # and knows every name; all lunch items when none of the names is known.
+  lunch_item_names = ",".join(request.GET.getlist('lunch_items')).split(",")
+  return select_lunch_items(lunch_item_names)
+
+def _get_report_partition_from_request(request):
+  # ?school= (id or name) and ?date= (YYYY-MM-DD) select the partition;
+  # raises ValueError for an invalid date or unknown school.
+  return get_report_partition(request.GET.get('school') or None, request.GET.get('date') or None)
 
 def generate_report_title(lunch_items):
     """
@@ -31,112 +64,1001 @@ def generate_report_title(lunch_items):
     names = ', '.join(item.name for item in lunch_items)
     return f'{names} Report'
 
-def _calculate_lunch_item_total_quantity(lunch_item):
+# Order of the customers in the rollup and archive partition indexes:
+# teachers (no student) first, then students, each by id.
+_CUSTOMER_ORDER = (F('student_id').asc(nulls_first=True), F('teacher_id').asc(nulls_first=True))
+
+def _partition_cells(model, lunch_items, partition):
+    return (
+        model.objects
+        .using(get_report_db_alias())
+        .filter(lunch_item__in=lunch_items, **partition.lookup())
+        .values_list('lunch_item_id', 'student_id', 'teacher_id', 'quantity')
+    )
+
+def _fetch_report_cells(lunch_items, partition):
+    """
+    Fetch the quantity of every lunch item and customer pair in one query,
+    the data of both reports.
+    
+    Reads the precomputed LunchItemOrderRollup table, which holds one row per
+    partition, lunch item and customer, rather than every individual order
+    line. Customers are named from the name index (see _name_customers), so
+    no other table is joined.
+    
+    An archived day is read from the archive, which has the rollup's layout,
+    together with the rollup rows of orders entered for it since it was
+    archived. A lunch item and customer can then have a row in both, which
+    the ordering of the union makes adjacent (see _sum_cells).
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :return: QuerySet of (lunch_item_id, student_id, teacher_id, quantity),
+             as expected by _name_customers and build_combined_pivot.
+    """
+    cells = _partition_cells(LunchItemOrderRollup, lunch_items, partition)
+    if partition.archived:
+        cells = (cells.union(_partition_cells(LunchItemOrderArchive, lunch_items, partition), all=True)
+                 .order_by('lunch_item_id', *_CUSTOMER_ORDER))
+    return cells
+
+def _sum_cells(cells):
     """
-    Calculate the total quantity ordered for a specific lunch item.
+    Merge adjacent cells of the same lunch item and customer, as an archived
+    day's can be (see _fetch_report_cells), adding up their quantities.
     
-    :param lunch_item: A LunchItem object.
-    :return: Total quantity ordered.
+    :param cells: Iterable of (lunch_item_id, student_id, teacher_id, quantity).
+    :return: Generator of the same tuples, one per lunch item and customer.
     """
-    return LunchItemOrder.objects.filter(lunch_item=lunch_item).aggregate(total=Sum('quantity'))['total'] or 0
+    previous = None
+    for cell in cells:
+        if previous is not None and previous[:3] == cell[:3]:
+            previous = (*cell[:3], previous[3] + cell[3])
+            continue
+        if previous is not None:
+            yield previous
+        previous = cell
+    if previous is not None:
+        yield previous
 
-def _calculate_total_quantities(lunch_items):
+def _name_customers(rows, names):
     """
-    Calculate total quantities for a list of lunch items.
+    Add the customer and teacher names of rows from the name index.
     
+    A customer missing from the index, e.g. one added by another process
+    since it was loaded, reloads it.
+    
+    :param rows: Iterable of (lunch_item_id, student_id, teacher_id, quantity).
+    :param names: NameIndex.
+    :return: Generator of tuples as expected by build_item_reports.
+    """
+    for lunch_item_id, student_id, teacher_id, quantity in rows:
+        try:
+            yield _named_row(names, lunch_item_id, student_id, teacher_id, quantity)
+        except KeyError:
+            names = get_name_index(refresh=True)
+            yield _named_row(names, lunch_item_id, student_id, teacher_id, quantity)
+
+def _named_row(names, lunch_item_id, student_id, teacher_id, quantity):
+    if student_id is None:
+        return (lunch_item_id, None, None, None, None,
+                teacher_id, names.teacher_name(teacher_id), quantity)
+    student_name, student_teacher_id = names.student(student_id)
+    student_teacher_name = None if student_teacher_id is None else names.teacher_name(student_teacher_id)
+    return (lunch_item_id, student_id, student_name, student_teacher_id, student_teacher_name,
+            None, None, quantity)
+
+def _export_customer_key(cell):
+    # As _CUSTOMER_ORDER.
+    _, student_id, teacher_id, _ = cell
+    return (student_id is not None, student_id or 0, teacher_id or 0)
+
+def _fetch_export_rows(report_kind, lunch_items, partition):
+    """
+    Stream per-customer order quantities for exporting a report as data.
+    
+    Rows are read in the order of the rollup's partition index, so the
+    database neither groups nor sorts the partition before the first row is
+    sent, and are named from the name index while streaming. The by-item
+    report is ordered by lunch item, then customer; the combined report by
+    customer, then lunch item, merging one index range per lunch item.
+    Customers come in the index's order (see _export_customer_key).
+    
+    :param report_kind: Key of REPORTS.
     :param lunch_items: List of LunchItem objects.
-    :return: Dictionary mapping item names to their total ordered quantities.
+    :param partition: ReportPartition to read.
+    :return: Generator of (lunch_item, teacher, customer, quantity) tuples.
     """
-    return {item.name: _calculate_lunch_item_total_quantity(item) for item in lunch_items}
+    if report_kind == "order_report":
+        rows = (_fetch_report_cells(lunch_items, partition)
+                .order_by('lunch_item_id', *_CUSTOMER_ORDER)
+                .iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    else:
+        rows = heapq.merge(
+            *(_fetch_report_cells([item], partition)
+              .order_by(*_CUSTOMER_ORDER)
+              .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+              for item in lunch_items),
+            key=_export_customer_key)
+    item_names = {item.pk: item.name for item in lunch_items}
+    for (lunch_item_id, student_id, student_name, _, student_teacher_name,
+         _, teacher_name, quantity) in _name_customers(_sum_cells(rows), get_name_index()):
+        if student_id is None:
+            yield item_names[lunch_item_id], teacher_name, teacher_name, quantity
+        else:
+            yield (item_names[lunch_item_id], student_teacher_name or UNASSIGNED_TEACHER,
+                   student_name, quantity)
 
-def _fetch_lunch_item_order_details(lunch_item):
+def _get_combined_pivot(lunch_items, partition):
     """
-    Fetch detailed order information for a given lunch item, grouped by teacher.
+    Pivot the cells of a partition into the combined report table.
     
-    :param lunch_item: A LunchItem object.
-    :return: QuerySet of order details annotated with customer and teacher names.
+    :param lunch_items: List of LunchItem objects, in column order.
+    :param partition: ReportPartition to read.
+    :return: CombinedPivot.
     """
-    return (
-        LunchItemOrder.objects
-        .filter(lunch_item=lunch_item)
-        .prefetch_related('student', 'student__teacher', 'teacher')
-        .annotate(
-            customer=Case(
-                When(student__isnull=False, then=F('student__name')),
-                When(teacher__isnull=False, then=F('teacher__name')),
-                output_field=CharField()
-            ),
-            teacher_name=Case(
-                When(student__isnull=False, student__teacher__name__isnull=True, then=Value('-')),
-                When(student__isnull=False, then=F('student__teacher__name')),
-                When(teacher__isnull=False, then=F('teacher__name')),
-                output_field=CharField()
-            )
-        )
-        .values('customer', 'teacher_name')
-        .annotate(total_quantity=Sum('quantity'))
-        .order_by('teacher_name', 'customer')
-    )
+    cells = list(_fetch_report_cells(lunch_items, partition))
+    names = get_name_index()
+    if not names.knows_customers(cells):
+        names = get_name_index(refresh=True)
+    teachers, students = names.roster_of_cells(partition.school_id, cells)
+    return CombinedPivot(lunch_items, cells, teachers, students)
 
-def _group_orders_by_teacher(lunch_item_orders):
+def _get_combined_report_data(lunch_items, partition):
     """
-    Group lunch item orders by teacher.
+    Build the rows and per-item totals of the combined report table.
     
-    :param lunch_item_orders: QuerySet of order details.
-    :return: Dictionary grouping orders by teacher name.
+    :param lunch_items: List of LunchItem objects, in column order.
+    :param partition: ReportPartition to read.
+    :return: Tuple of (list of CombinedRow, item name -> total quantity).
     """
-    grouped_orders = {}
-    for order in lunch_item_orders:
-        teacher_name = order['teacher_name']
-        if teacher_name not in grouped_orders:
-            grouped_orders[teacher_name] = {'group_quantity': 0, 'customers': {}}
-        
-        grouped_orders[teacher_name]['group_quantity'] += order['total_quantity']
-        grouped_orders[teacher_name]['customers'][order['customer']] = order['total_quantity']
+    pivot = _get_combined_pivot(lunch_items, partition)
+    return list(pivot.rows()), _total_quantities(lunch_items, pivot.item_totals)
 
-    # Ensure '-' group is included at the end if it exists
-    if '-' in grouped_orders:
-        ordered_grouped = {k: v for k, v in grouped_orders.items() if k != '-'}
-        ordered_grouped['-'] = grouped_orders['-']
-    else:
-        ordered_grouped = grouped_orders
+async def _aget_combined_report_data(lunch_items, partition):
+    """
+    Async version of _get_combined_report_data, using async querysets.
+    
+    :param lunch_items: List of LunchItem objects, in column order.
+    :param partition: ReportPartition to read.
+    :return: Tuple of (list of CombinedRow, item name -> total quantity).
+    """
+    cells = [cell async for cell in _fetch_report_cells(lunch_items, partition)]
+    names = await aget_name_index()
+    if not names.knows_customers(cells):
+        names = await aget_name_index(refresh=True)
+    teachers, students = names.roster_of_cells(partition.school_id, cells)
+    return _build_combined_report_data(lunch_items, cells, teachers, students)
+
+def _build_combined_report_data(lunch_items, cells, teachers, students):
+    """
+    Pivot fetched cells and roster into the combined report table.
+    
+    :return: Tuple of (list of CombinedRow, item name -> total quantity).
+    """
+    rows, item_totals = build_combined_pivot(lunch_items, cells, teachers, students)
+    return rows, _total_quantities(lunch_items, item_totals)
 
-    return ordered_grouped
+def _total_quantities(lunch_items, item_totals):
+    return {item.name: total for item, total in zip(lunch_items, item_totals, strict=True)}
 
-def _get_orders_grouped_by_teacher(lunch_items):
+def _get_lunch_report_data(lunch_items, partition):
     """
-    Get orders grouped by teacher for each lunch item.
+    Compute the teacher-grouped orders of each lunch item.
     
     :param lunch_items: List of LunchItem objects.
-    :return: Dictionary mapping item names to grouped order details.
+    :param partition: ReportPartition to read.
+    :return: List of ItemReport, one per lunch item.
     """
-    return {item.name: _group_orders_by_teacher(_fetch_lunch_item_order_details(item)) 
-            for item in lunch_items}
+    # Stream rows from the cursor rather than caching them all on the QuerySet.
+    rows = _fetch_report_cells(lunch_items, partition).iterator(chunk_size=2000)
+    return build_item_reports(lunch_items, _name_customers(_sum_cells(rows), get_name_index()))
 
-def _get_students_grouped_by_teacher():
+async def _aget_lunch_report_data(lunch_items, partition):
     """
-    Retrieve a mapping of teachers to their associated students.
+    Async version of _get_lunch_report_data, using an async queryset.
     
-    :return: Dictionary mapping teacher names to lists of their students.
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :return: List of ItemReport, one per lunch item.
     """
-    teachers_with_students = Teacher.objects.prefetch_related(Prefetch('students')).all()
-    teacher_student_mapping = {teacher.name: [student.name for student in teacher.students.all()] + [teacher.name] for teacher in teachers_with_students}
+    rows = [row async for row in _fetch_report_cells(lunch_items, partition)]
+    names = await aget_name_index()
+    if not names.knows_customers(rows):
+        names = await aget_name_index(refresh=True)
+    return build_item_reports(lunch_items, _name_customers(_sum_cells(rows), names))
 
-    students_without_teacher = Student.objects.filter(teacher__isnull=True)
-    teacher_student_mapping['-'] = [student.name for student in students_without_teacher]
-    return teacher_student_mapping
+def _fetch_order_change_rows(lunch_items, partition, since):
+    """
+    Sum the logged quantity changes of each lunch item and customer since a
+    point in time, leaving out pairs whose changes cancel out.
+    
+    Reads only the order change log rows after `since`, through the index on
+    their timestamp, so the cost follows the number of changes rather than
+    the number of orders.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :param since: Aware datetime; changes after it are included.
+    :return: QuerySet of (lunch_item_id, student_id, teacher_id, quantity
+             change).
+    """
+    fields = ('lunch_item_id', 'student_id', 'teacher_id')
+    return (
+        LunchItemOrderChange.objects
+        .using(get_report_db_alias())
+        .filter(changed_at__gt=since, lunch_item__in=lunch_items, **partition.lookup())
+        .values(*fields)
+        .annotate(quantity_change=Sum('quantity'))
+        .exclude(quantity_change=0)
+        .order_by()
+        .values_list(*fields, 'quantity_change')
+    )
+
+def _get_combined_report_delta_data(lunch_items, partition, since):
+    """
+    Build the combined report table of the quantity changes since a point in
+    time. Only the teachers and students with changes get rows.
+    
+    :param lunch_items: List of LunchItem objects, in column order.
+    :param partition: ReportPartition to read.
+    :param since: Aware datetime; changes after it are included.
+    :return: Tuple of (list of CombinedRow, item name -> total change).
+    """
+    cells = []
+    teachers = {}
+    students = {}
+    rows = _fetch_order_change_rows(lunch_items, partition, since)
+    for (lunch_item_id, student_id, student_name, student_teacher_id,
+         student_teacher_name, teacher_id, teacher_name, quantity) in _name_customers(rows, get_name_index()):
+        cells.append((lunch_item_id, student_id, teacher_id, quantity))
+        if student_id is not None:
+            students[student_id] = (student_id, student_name, student_teacher_id)
+            if student_teacher_id is not None:
+                teachers[student_teacher_id] = student_teacher_name
+        else:
+            teachers[teacher_id] = teacher_name
+    return _build_combined_report_data(
+        lunch_items, cells, sorted(teachers.items()), [students[pk] for pk in sorted(students)])
 
 def _prepare_lunch_report_data(request):
     """
     Prepare data required for generating lunch reports.
     
     :param request: HTTP request object.
-    :return: Tuple containing lunch items, their total quantities, and order details.
+    :return: Tuple containing lunch items and their ItemReports.
+    :raises ValueError: If the request selects an invalid date or unknown school.
+    """
+    lunch_items = _get_lunch_items_from_request(request)
+    partition = _get_report_partition_from_request(request)
+    return lunch_items, _get_lunch_report_data(lunch_items, partition)
+
+def _lunch_report_context(lunch_items, partition):
+    """
+    Build the template context for the lunch order report by item.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :return: Dictionary of template context.
+    """
+    return {"item_reports": _get_lunch_report_data(lunch_items, partition)}
+
+def _combined_lunch_report_context(lunch_items, partition):
+    """
+    Build the template context for the combined lunch order report.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :return: Dictionary of template context.
+    """
+    return _combined_context(lunch_items, *_get_combined_report_data(lunch_items, partition))
+
+def _lunch_report_chunk_context(lunch_items, partition):
+    """
+    Build the template context for the lunch order report by item, to be
+    rendered in chunks: its item reports are read one lunch item at a time,
+    as _lunch_report_chunks consumes them.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :return: Dictionary of template context.
+    """
+    return {"item_reports": (item_report
+                             for item in lunch_items
+                             for item_report in _get_lunch_report_data([item], partition))}
+
+def _combined_report_chunk_context(lunch_items, partition):
+    """
+    Build the template context for the combined lunch order report, to be
+    rendered in chunks: only the quantities are pivoted up front, the rows
+    are built as _combined_report_chunks consumes them.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :return: Dictionary of template context.
+    """
+    pivot = _get_combined_pivot(lunch_items, partition)
+    return _combined_context(lunch_items, pivot.rows(),
+                             _total_quantities(lunch_items, pivot.item_totals))
+
+async def _alunch_report_context(lunch_items, partition):
+    return {"item_reports": await _aget_lunch_report_data(lunch_items, partition)}
+
+async def _acombined_lunch_report_context(lunch_items, partition):
+    return _combined_context(lunch_items, *await _aget_combined_report_data(lunch_items, partition))
+
+def _lunch_report_delta_context(lunch_items, partition, since):
+    """
+    Build the template context for the changes to the lunch order report by
+    item since a point in time.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :param since: Aware datetime; changes after it are included.
+    :return: Dictionary of template context.
+    """
+    rows = _fetch_order_change_rows(lunch_items, partition, since).iterator(chunk_size=2000)
+    return {"item_reports": build_item_reports(lunch_items, _name_customers(rows, get_name_index())),
+            "delta_since": since}
+
+def _combined_report_delta_context(lunch_items, partition, since):
+    """
+    Build the template context for the changes to the combined lunch order
+    report since a point in time.
+    
+    :param lunch_items: List of LunchItem objects.
+    :param partition: ReportPartition to read.
+    :param since: Aware datetime; changes after it are included.
+    :return: Dictionary of template context.
+    """
+    return {**_combined_context(lunch_items,
+                                *_get_combined_report_delta_data(lunch_items, partition, since)),
+            "delta_since": since}
+
+def _combined_context(lunch_items, combined_rows, total_lunch_item_quantities):
+    return {
+        "lunch_items": lunch_items,
+        "total_lunch_item_quantities": total_lunch_item_quantities,
+        "title": generate_report_title(lunch_items),
+        "combined_rows": combined_rows,
+    }
+
+def _lunch_report_chunks(context, chunk_rows):
+    """
+    Split the lunch order report context into runs of lunch items of about
+    chunk_rows table rows. A lunch item's table is never split.
+    
+    :param context: Context built by _lunch_report_context or
+                    _lunch_report_chunk_context.
+    :param chunk_rows: Rows after which a chunk is closed at the next item.
+    :return: Iterator of template contexts.
+    """
+    chunk = []
+    rows = 0
+    for item_report in context["item_reports"]:
+        chunk.append(item_report)
+        # A row per customer and one per teacher group, and the total.
+        rows += 1 + sum(1 + len(group.customers) for group in item_report.groups)
+        if rows >= chunk_rows:
+            yield {**context, "item_reports": chunk}
+            chunk = []
+            rows = 0
+    if chunk:
+        yield {**context, "item_reports": chunk}
+
+def _combined_report_chunks(context, chunk_rows):
+    """
+    Split the combined report table into chunks of about chunk_rows rows.
+    
+    A teacher's block of rows is never split, since its first cell spans the
+    whole block. Only the first chunk shows the title and only the last one
+    the totals.
+    
+    :param context: Context built by _combined_lunch_report_context or
+                    _combined_report_chunk_context.
+    :param chunk_rows: Rows after which a chunk is closed at the next block.
+    :return: Iterator of template contexts.
+    """
+    chunk = []
+    position = 0
+    for row in context["combined_rows"]:
+        # A row showing a teacher starts a new teacher block.
+        if row.teacher is not None and len(chunk) >= chunk_rows:
+            yield {**context,
+                   "combined_rows": chunk,
+                   "hide_title": position > 0,
+                   "hide_totals": True}
+            chunk = []
+            position += 1
+        chunk.append(row)
+    yield {**context,
+           "combined_rows": chunk,
+           "hide_title": position > 0,
+           "hide_totals": False}
+
+# Report kinds, keyed by their URL name: PDF title, template and a function
+# building the template context from the selected lunch items and partition
+# (school and service date, see partitions.py); "acontext" is its async
+# version, for the async views. "delta_context" builds the context of the
+# quantity changes since a point in time instead. "chunks" splits a context
+# into the contexts rendered one at a time in "chunked" mode; "chunk_context"
+# builds a context for it whose rows are read or built lazily, as "chunks"
+# consumes them, so only one chunk's rows are held at once. "sections"
+# names the context list of independent per-item sections, for reports that
+# can be rendered in parallel one section at a time. "flowables" lays a
+# context out for the "reportlab" PDF backend, in place of the template.
+REPORTS = {
+    "order_report": {
+        "title": "Lunch Order Report by Item",
+        "template": "lunch_order_report.html",
+        "cells": _fetch_report_cells,
+        "context": _lunch_report_context,
+        "acontext": _alunch_report_context,
+        "delta_context": _lunch_report_delta_context,
+        "chunks": _lunch_report_chunks,
+        "chunk_context": _lunch_report_chunk_context,
+        "sections": "item_reports",
+        "flowables": lunch_report_flowables,
+    },
+    "combined_order_report": {
+        "title": "Combined Lunch Order Report",
+        "template": "combined_order_report.html",
+        "cells": _fetch_report_cells,
+        "context": _combined_lunch_report_context,
+        "acontext": _acombined_lunch_report_context,
+        "delta_context": _combined_report_delta_context,
+        "chunks": _combined_report_chunks,
+        "chunk_context": _combined_report_chunk_context,
+        "flowables": combined_report_flowables,
+    },
+}
+
+def render_report_pdf(report_kind, lunch_items, partition, mode=None):
+    """
+    Render a report to PDF bytes.
+    
+    :param report_kind: Key of REPORTS.
+    :param lunch_items: List of LunchItem objects to include.
+    :param partition: ReportPartition to read.
+    :param mode: "single", "parallel" or "chunked"; defaults to
+                 LUNCHREPORTS_PDF_RENDERING.
+    :return: PDF document as bytes.
+    """
+    start = time.perf_counter()
+    context = REPORTS[report_kind]["context"](lunch_items, partition)
+    record_stage("data", time.perf_counter() - start)
+    return render_report_context_pdf(report_kind, context, mode)
+
+def render_report_context_pdf(report_kind, context, mode=None):
+    """
+    Render a report to PDF bytes from an already built template context.
+    
+    :param report_kind: Key of REPORTS.
+    :param context: Template context built by the report's "context" function.
+    :param mode: "single", "parallel" or "chunked"; defaults to
+                 LUNCHREPORTS_PDF_RENDERING.
+    :return: PDF document as bytes.
+    """
+    report = REPORTS[report_kind]
+    mode = mode or get_pdf_rendering_config()["MODE"]
+    if mode == "chunked":
+        pdf = BytesIO()
+        _render_report_chunks(report, context, pdf)
+        return pdf.getvalue()
+    if get_pdf_backend() == "reportlab":
+        return render_tables(report_title=report["title"], flowables=report["flowables"],
+                             context=context)
+    sections = context.get(report.get("sections"), ())
+    if len(sections) > 1 and mode == "parallel":
+        return render_pdf_sections([
+            render_html(report_title=report["title"],
+                        report_template=report["template"],
+                        **{**context, report["sections"]: [section]})
+            for section in sections
+        ])
+    return render_pdf(
+        report_title=report["title"],
+        report_template=report["template"],
+        **context,
+    )
+
+def render_report_pdf_file(report_kind, lunch_items, partition, dest):
+    """
+    Render a report chunk by chunk into a file, holding only one chunk's
+    rows, HTML, layout and PDF pages in memory at a time.
+    
+    :param report_kind: Key of REPORTS.
+    :param lunch_items: List of LunchItem objects to include.
+    :param partition: ReportPartition to read.
+    :param dest: Binary file the PDF document is written to.
+    """
+    report = REPORTS[report_kind]
+    start = time.perf_counter()
+    context = report["chunk_context"](lunch_items, partition)
+    record_stage("data", time.perf_counter() - start)
+    _render_report_chunks(report, context, dest)
+
+def _render_report_chunks(report, context, dest):
+    chunk_rows = get_pdf_rendering_config()["CHUNK_ROWS"]
+    if get_pdf_backend() == "reportlab":
+        write_pdf_chunks(
+            (render_tables(report_title=report["title"], flowables=report["flowables"],
+                           context=chunk)
+             for chunk in report["chunks"](context, chunk_rows)),
+            dest)
+        return
+    render_pdf_chunks(
+        (render_html(report_title=report["title"],
+                     report_template=report["template"],
+                     **chunk)
+         for chunk in report["chunks"](context, chunk_rows)),
+        dest)
+
+async def arender_report_pdf(report_kind, lunch_items, partition, mode=None):
+    """
+    Async version of render_report_pdf: reads the report data with async
+    querysets, renders the template in a worker thread and converts it to
+    PDF in the render process pool, so the event loop is never blocked.
+    
+    :param report_kind: Key of REPORTS.
+    :param lunch_items: List of LunchItem objects to include.
+    :param partition: ReportPartition to read.
+    :param mode: "single" or "parallel"; defaults to LUNCHREPORTS_PDF_RENDERING.
+    :return: PDF document as bytes.
+    """
+    report = REPORTS[report_kind]
+    start = time.perf_counter()
+    context = await report["acontext"](lunch_items, partition)
+    record_stage("data", time.perf_counter() - start)
+    if get_pdf_backend() == "reportlab":
+        # No HTML to render and no pool to hand it to: lay it out in a thread.
+        return await sync_to_async(render_report_context_pdf, thread_sensitive=False)(
+            report_kind, context, mode)
+    mode = mode or get_pdf_rendering_config()["MODE"]
+    arender_html = sync_to_async(render_html, thread_sensitive=False)
+    if mode == "chunked":
+        async def html_chunks():
+            chunk_rows = get_pdf_rendering_config()["CHUNK_ROWS"]
+            for chunk in report["chunks"](context, chunk_rows):
+                yield await arender_html(report_title=report["title"],
+                                         report_template=report["template"],
+                                         **chunk)
+        pdf = BytesIO()
+        await render_pdf_chunks_async(html_chunks(), pdf)
+        return pdf.getvalue()
+    sections = context.get(report.get("sections"), ())
+    if len(sections) > 1 and mode == "parallel":
+        return await render_pdf_sections_async([
+            await arender_html(report_title=report["title"],
+                               report_template=report["template"],
+                               **{**context, report["sections"]: [section]})
+            for section in sections
+        ])
+    return await html_to_pdf_async(await arender_html(
+        report_title=report["title"],
+        report_template=report["template"],
+        **context,
+    ))
+
+def _report_response(request, report_kind, partition):
+    """
+    Return a report PDF, serving it from the PDF cache when the selection and
+    report data are unchanged since it was last rendered.
+    
+    Clients presenting a matching If-None-Match header get a 304 without the
+    report being rendered or read from the cache.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :param partition: ReportPartition to read.
+    :return: HTTP response with the PDF report, or a 304 response.
     """
     lunch_items = _get_lunch_items_from_request(request)
-    total_lunch_item_quantities = _calculate_total_quantities(lunch_items)
-    orders_detail = _get_orders_grouped_by_teacher(lunch_items)
-    return lunch_items, total_lunch_item_quantities, orders_detail
+    cache_key = report_cache_key(report_kind, lunch_items,
+                                 get_data_version(using=get_report_db_alias()), partition)
+    etag = f'"{cache_key}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    pdf_cache = get_pdf_cache()
+    if get_pdf_rendering_config()["MODE"] == "chunked":
+        return _chunked_report_response(report_kind, lunch_items, partition, cache_key, etag,
+                                        pdf_cache)
+    pdf = pdf_cache.get(cache_key) if pdf_cache else None
+    if pdf is None:
+        pdf = render_report_pdf(report_kind, lunch_items, partition)
+        if pdf_cache:
+            pdf_cache.set(cache_key, pdf)
+    return pdf_response(pdf, report_title=REPORTS[report_kind]["title"], etag=etag)
+
+def _delta_report_response(request, report_kind, partition):
+    """
+    Return a PDF of the quantity changes to a report since ?since=, which is
+    an ISO 8601 timestamp, snapshot:<id> or last_snapshot.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :param partition: ReportPartition to read.
+    :return: HTTP response with the PDF, or 400 for an invalid since value.
+    """
+    try:
+        since = parse_since(request.GET["since"], report_kind, partition)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    lunch_items = _get_lunch_items_from_request(request)
+    report = REPORTS[report_kind]
+    start = time.perf_counter()
+    context = report["delta_context"](lunch_items, partition, since)
+    record_stage("data", time.perf_counter() - start)
+    return pdf_response(render_report_context_pdf(report_kind, context),
+                        report_title=f"{report['title']} changes")
+
+def _chunked_report_response(report_kind, lunch_items, partition, cache_key, etag, pdf_cache):
+    """
+    Serve a report rendered chunk by chunk into a temporary file, streaming
+    the file instead of building the response in memory.
+    
+    :param report_kind: Key of REPORTS.
+    :param lunch_items: List of LunchItem objects to include.
+    :param partition: ReportPartition to read.
+    :param cache_key: PDF cache key of the report.
+    :param etag: ETag of the report.
+    :param pdf_cache: PDF cache, or None.
+    :return: FileResponse with the PDF report.
+    """
+    pdf_file = pdf_cache.get_file(cache_key) if pdf_cache else None
+    if pdf_file is None:
+        # Deleted by the OS as soon as the response closes it.
+        pdf_file = tempfile.TemporaryFile()  # noqa: SIM115
+        try:
+            render_report_pdf_file(report_kind, lunch_items, partition, pdf_file)
+            if pdf_cache:
+                pdf_cache.set_file(cache_key, pdf_file)
+        except BaseException:
+            pdf_file.close()
+            raise
+        pdf_file.seek(0)
+    return pdf_file_response(pdf_file, report_title=REPORTS[report_kind]["title"], etag=etag)
+
+async def _aget_lunch_items_from_request(request):
+    """
+    Async version of _get_lunch_items_from_request.
+    
+    :param request: HTTP request object.
+    :return: List of LunchItem objects; all of them when none is selected.
+    """
+    lunch_item_names = ",".join(request.GET.getlist('lunch_items')).split(",")
+    return await aselect_lunch_items(lunch_item_names)
+
+async def _areport_response(request, report_kind):
+    """
+    Async version of _report_response. When MAX_RENDERS reports are already
+    being rendered, waits for one to finish, returning a 503 with Retry-After
+    when too many requests already wait or the wait is too long.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :return: HTTP response with the PDF report, a 304 or a 503 response, or
+             400 for an invalid date or unknown school.
+    """
+    try:
+        partition = await aget_report_partition(request.GET.get("school") or None,
+                                                request.GET.get("date") or None)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    lunch_items = await _aget_lunch_items_from_request(request)
+    version = await sync_to_async(get_data_version)(using=get_report_db_alias())
+    cache_key = report_cache_key(report_kind, lunch_items, version, partition)
+    etag = f'"{cache_key}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    pdf_cache = get_pdf_cache()
+    pdf = pdf_cache.get(cache_key) if pdf_cache else None
+    if pdf is None:
+        try:
+            async with render_slot():
+                # Rendered meanwhile by a request queued ahead of this one?
+                pdf = pdf_cache.get(cache_key) if pdf_cache else None
+                if pdf is None:
+                    pdf = await arender_report_pdf(report_kind, lunch_items, partition)
+                    if pdf_cache:
+                        pdf_cache.set(cache_key, pdf)
+        except RenderPoolBusy:
+            response = HttpResponse("Too many reports are being rendered; retry shortly.",
+                                    status=503, content_type="text/plain")
+            response["Retry-After"] = str(get_pdf_rendering_config()["RETRY_AFTER"])
+            return response
+    return pdf_response(pdf, report_title=REPORTS[report_kind]["title"], etag=etag)
+
+def _wants_async_report(request):
+    """
+    Whether the report should be rendered in the background job queue.
+    
+    :param request: HTTP request object.
+    :return: True for ?async=1, False for ?async=0, otherwise the configured default.
+    """
+    requested = request.GET.get("async")
+    if requested is not None:
+        return requested.lower() in ("1", "true", "yes")
+    return get_render_jobs_config()["ASYNC_BY_DEFAULT"]
+
+def _report_job_json(request, job):
+    """
+    Serialize a report job for the job endpoints.
+    
+    :param request: HTTP request object.
+    :param job: Job dictionary as returned by get_report_job.
+    :return: JSON-serializable dictionary.
+    """
+    data = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": request.build_absolute_uri(reverse("report_job_status", args=[job["job_id"]])),
+        "download_url": request.build_absolute_uri(reverse("report_job_download", args=[job["job_id"]])),
+    }
+    if "error" in job:
+        data["error"] = job["error"]
+    return data
+
+def _enqueue_report_response(request, report_kind, partition):
+    """
+    Queue a report for background rendering and return its job right away.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :param partition: ReportPartition to read.
+    :return: 202 JSON response describing the job.
+    """
+    lunch_items = _get_lunch_items_from_request(request)
+    job = get_report_job(enqueue_report_job(report_kind, lunch_items, partition))
+    return JsonResponse(_report_job_json(request, job), status=202)
+
+def report_job_status(request, job_id):
+    """
+    Return the status of a background report job.
+    
+    :param request: HTTP request object.
+    :param job_id: Id of the job.
+    :return: JSON response describing the job, or 404 if unknown or expired.
+    """
+    job = get_report_job(job_id)
+    if job is None:
+        raise Http404("Unknown or expired report job.")
+    return JsonResponse(_report_job_json(request, job))
+
+def report_job_download(request, job_id):
+    """
+    Download the PDF of a finished background report job.
+    
+    :param request: HTTP request object.
+    :param job_id: Id of the job.
+    :return: The PDF, a 202 JSON status response while the job is still
+             pending, or 404 if the job is unknown, expired or failed.
+    """
+    job = get_report_job(job_id)
+    if job is None or job["status"] == JOB_FAILED:
+        raise Http404("Unknown, expired or failed report job.")
+    if job["status"] == JOB_PENDING:
+        return JsonResponse(_report_job_json(request, job), status=202)
+    title = REPORTS[job["report_kind"]]["title"]
+    path = get_report_job_pdf_path(job_id)
+    try:
+        # Closed by the FileResponse.
+        pdf_file = open(path, "rb") if path is not None else None  # noqa: SIM115
+    except FileNotFoundError:
+        pdf_file = None
+    if pdf_file is None:
+        # Expired since its status was read.
+        raise Http404("Unknown, expired or failed report job.")
+    return FileResponse(pdf_file,
+                        as_attachment=True,
+                        filename=f"{title}.pdf",
+                        content_type="application/pdf")
+
+def _report_snapshot_json(request, snapshot):
+    """
+    Serialize a report snapshot for the snapshot endpoints.
+    
+    :param request: HTTP request object.
+    :param snapshot: ReportSnapshot, with or without its data and PDF loaded.
+    :return: JSON-serializable dictionary.
+    """
+    return {
+        "snapshot_id": snapshot.pk,
+        "report": snapshot.report_kind,
+        "school_id": snapshot.school_id,
+        "service_date": snapshot.service_date.isoformat(),
+        "lunch_item_ids": snapshot.lunch_item_ids,
+        "data_version": snapshot.data_version,
+        "created_at": snapshot.created_at.isoformat(),
+        "status_url": request.build_absolute_uri(reverse("report_snapshot", args=[snapshot.pk])),
+        "download_url": request.build_absolute_uri(reverse("report_snapshot_download", args=[snapshot.pk])),
+        "data_url": request.build_absolute_uri(reverse("report_snapshot_data", args=[snapshot.pk])),
+    }
+
+@staff_member_required
+@require_POST
+def report_snapshot_create(request):
+    """
+    Snapshot a report: freeze its current data and PDF under a new id.
+    
+    :param request: HTTP request object; ?report= names the report, and
+                    ?lunch_items=, ?school= and ?date= select the lunch items
+                    and partition as for the reports.
+    :return: 201 JSON response describing the snapshot, or 400 for an
+             unknown report, invalid date or unknown school.
+    """
+    report_kind = request.GET.get("report")
+    if report_kind not in REPORTS:
+        return HttpResponseBadRequest(f"Unknown report; use one of {', '.join(REPORTS)}.")
+    try:
+        partition = _get_report_partition_from_request(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    snapshot = create_report_snapshot(report_kind, _get_lunch_items_from_request(request),
+                                      partition)
+    return JsonResponse(_report_snapshot_json(request, snapshot), status=201)
+
+def report_snapshot(request, snapshot_id):
+    """
+    Describe a report snapshot.
+    
+    :param request: HTTP request object.
+    :param snapshot_id: Id of the snapshot.
+    :return: JSON response, or 404 if unknown or pruned.
+    """
+    snapshot = get_object_or_404(ReportSnapshot.objects.defer("data", "pdf"), pk=snapshot_id)
+    return JsonResponse(_report_snapshot_json(request, snapshot))
+
+def report_snapshot_download(request, snapshot_id):
+    """
+    Download the PDF of a report snapshot as it was rendered when the
+    snapshot was taken. Snapshots never change, so clients may cache them.
+    
+    :param request: HTTP request object.
+    :param snapshot_id: Id of the snapshot.
+    :return: The PDF, a 304 response, or 404 if unknown or pruned.
+    """
+    snapshot = get_object_or_404(ReportSnapshot.objects.defer("data"), pk=snapshot_id)
+    etag = f'"snapshot-{snapshot.pk}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    title = REPORTS[snapshot.report_kind]["title"]
+    response = pdf_response(bytes(snapshot.pdf),
+                            report_title=f"{title} {snapshot.created_at:%Y-%m-%d %H%M}",
+                            etag=etag)
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+def report_snapshot_data(request, snapshot_id):  # noqa: ARG001
+    """
+    Return the data a report snapshot was rendered from, as JSON.
+    
+    :param request: HTTP request object.
+    :param snapshot_id: Id of the snapshot.
+    :return: JSON response, or 404 if unknown or pruned.
+    """
+    snapshot = get_object_or_404(ReportSnapshot.objects.defer("pdf"), pk=snapshot_id)
+    return HttpResponse(report_data_json(snapshot.data), content_type="application/json")
+
+@staff_member_required
+def report_stats(request):  # noqa: ARG001
+    """
+    Return p50/p95/p99 latencies, query counts and output sizes of the recent
+    report requests served by this process. Staff only.
+
+    :param request: HTTP request object.
+    :return: JsonResponse of {report: {metric: summary}}.
+    """
+    return JsonResponse(get_report_stats())
+
+def report_warmup(request):  # noqa: ARG001
+    """
+    Return the progress of the last report warmup (see warmup.py), for
+    readiness checks around the order cutoff.
+
+    :param request: HTTP request object.
+    :return: JsonResponse with the warmup's reports and counts; 200 when
+             today's reports are warm for the current data, otherwise 503.
+    """
+    status = get_warmup_status()
+    return JsonResponse(status, status=200 if status["ready"] else 503)
+
+# Content types accepted by order_ingest when ?format= isn't given.
+INGEST_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/json": "json",
+}
+
+@staff_member_required
+@require_POST
+def order_ingest(request):
+    """
+    Create a batch of orders from a CSV, JSON lines or JSON request body.
+    Staff only.
+
+    Rows that fail validation are reported and skipped without aborting the
+    rest of the batch; see ingest.ingest_orders.
+    
+    :param request: HTTP request object; the format is taken from ?format=
+                    or the Content-Type header.
+    :return: JsonResponse with the rows read, orders created and row errors.
+    """
+    input_format = request.GET.get("format") or INGEST_CONTENT_TYPES.get(request.content_type)
+    if input_format not in INGEST_FORMATS:
+        return HttpResponseBadRequest(
+            f"Unsupported format; use one of {', '.join(INGEST_FORMATS)}.")
+    try:
+        records = parse_order_records(request.body.decode("utf-8"), input_format)
+    except (IngestFormatError, UnicodeDecodeError) as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(ingest_orders(records))
+
+def _export_report_response(request, report_kind, partition, export_format):
+    """
+    Stream the report's rows as data instead of rendering a PDF.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :param partition: ReportPartition to read.
+    :param export_format: One of EXPORT_FORMATS.
+    :return: StreamingHttpResponse with one row per lunch item and customer.
+    """
+    lunch_items = _get_lunch_items_from_request(request)
+    return export_response(
+        _fetch_export_rows(report_kind, lunch_items, partition),
+        export_format=export_format,
+        report_title=REPORTS[report_kind]["title"],
+    )
+
+def _report_or_job_response(request, report_kind):
+    """
+    Return the report PDF, queue it when background rendering is requested,
+    stream its data when a format (csv, jsonl, json) is requested, or return
+    the changes since a point in time when ?since= is given. ?school= and
+    ?date= select the partition, by default the default school's orders of
+    today.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :return: HTTP response.
+    """
+    export_format = request.GET.get("format", "pdf")
+    try:
+        partition = _get_report_partition_from_request(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if request.GET.get("since"):
+        if export_format != "pdf" or _wants_async_report(request):
+            return HttpResponseBadRequest("Reports of changes are only rendered as PDF, in the request.")
+        return _delta_report_response(request, report_kind, partition)
+    if export_format != "pdf":
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest(f"Unsupported report format: {export_format}")
+        return _export_report_response(request, report_kind, partition, export_format)
+    if _wants_async_report(request):
+        return _enqueue_report_response(request, report_kind, partition)
+    return _report_response(request, report_kind, partition)
+
+async def _areport_or_job_response(request, report_kind):
+    """
+    Async version of _report_or_job_response. Only PDF rendering has an async
+    path; exports, background jobs and reports of changes go through the sync
+    views.
+    
+    :param request: HTTP request object.
+    :param report_kind: Key of REPORTS.
+    :return: HTTP response.
+    """
+    if (request.GET.get("format", "pdf") != "pdf" or request.GET.get("since")
+            or _wants_async_report(request)):
+        return await sync_to_async(_report_or_job_response)(request, report_kind)
+    return await _areport_response(request, report_kind)
 
 def lunch_report(request):
     """
@@ -146,14 +1068,7 @@ def lunch_report(request):
     :return: HTTP response with the generated PDF report.
     """
     try:
-        lunch_items, total_lunch_item_quantities, orders_detail = _prepare_lunch_report_data(request)
-        return populate_pdf_response(
-            report_title="Lunch Order Report by Item",
-            report_template="lunchreports/templates/lunch_order_report.html",
-            lunch_items=lunch_items,
-            total_lunch_item_quantities=total_lunch_item_quantities,
-            orders_detail=orders_detail,
-        )
+        return _report_or_job_response(request, "order_report")
     except Exception as e:
         logging.error(f"Error generating lunch report: {e}")
         return render(request, 'error_page.html', {"error": "An error occurred while generating the report."})
@@ -166,19 +1081,33 @@ def combined_lunch_report(request):
     :return: HTTP response with the generated PDF report.
     """
     try:
-        lunch_items, total_lunch_item_quantities, orders_detail = _prepare_lunch_report_data(request)
-        title = generate_report_title(lunch_items)
-        teacher_student_mapping = _get_students_grouped_by_teacher()
-
-        return populate_pdf_response(
-            report_title="Combined Lunch Order Report",
-            report_template="lunchreports/templates/combined_order_report.html",
-            title=title,
-            orders_detail=orders_detail,
-            total_lunch_item_quantities=total_lunch_item_quantities,
-            lunch_items=lunch_items,
-            teacher_student_mapping=teacher_student_mapping
-        )
+        return _report_or_job_response(request, "combined_order_report")
+    except Exception as e:
+        logging.error(f"Error generating combined lunch report: {e}")
+        return render(request, 'error_page.html', {"error": "An error occurred while generating the report."})
+
+async def lunch_report_async(request):
+    """
+    Async version of lunch_report, for serving under ASGI.
+    
+    :param request: HTTP request object.
+    :return: HTTP response with the generated PDF report.
+    """
+    try:
+        return await _areport_or_job_response(request, "order_report")
+    except Exception as e:
+        logging.error(f"Error generating lunch report: {e}")
+        return render(request, 'error_page.html', {"error": "An error occurred while generating the report."})
+
+async def combined_lunch_report_async(request):
+    """
+    Async version of combined_lunch_report, for serving under ASGI.
+    
+    :param request: HTTP request object.
+    :return: HTTP response with the generated PDF report.
+    """
+    try:
+        return await _areport_or_job_response(request, "combined_order_report")
     except Exception as e:
         logging.error(f"Error generating combined lunch report: {e}")
-        return render(request, 'error_page.html', {"error": "An error occurred while generating the report."})
\ No newline at end of file
+        return render(request, 'error_page.html', {"error": "An error occurred while generating the report."})
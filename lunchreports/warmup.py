@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import time as time_of_day
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .data_version import get_data_version
+from .databases import get_report_db_alias
+from .generate_report import get_pdf_rendering_config
+from .models import School
+from .name_index import get_name_index
+from .partitions import get_report_partition
+from .pdf_cache import FileSystemPdfCache, get_pdf_cache, report_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Default configuration, overridable with the LUNCHREPORTS_REPORT_WARMUP
+# setting:
+#   CUTOFF: local time of day ("HH:MM") orders close, when warm_reports --wait
+#       pre-renders the day's reports.
+#   SCHOOLS: ids or names of the schools whose reports are warmed; None warms
+#       every school.
+#   STATUS_FILE: where warmup progress is recorded for the report_warmup
+#       endpoint. Shared by all processes of a deployment.
+DEFAULT_REPORT_WARMUP = {
+    "CUTOFF": "10:00",
+    "SCHOOLS": None,
+    "STATUS_FILE": os.path.join(tempfile.gettempdir(), "lunchreports-warmup.json"),
+}
+
+WARMUP_PENDING = "pending"
+WARMUP_DONE = "done"
+WARMUP_FAILED = "failed"
+
+
+def get_report_warmup_config():
+    return {**DEFAULT_REPORT_WARMUP, **getattr(settings, "LUNCHREPORTS_REPORT_WARMUP", {})}
+
+
+def next_cutoff(now=None):
+    """
+    :param now: Aware datetime to start from; defaults to the current time.
+    :return: Aware local datetime of the next order cutoff after now.
+    """
+    now = timezone.localtime(now)
+    cutoff = time_of_day.fromisoformat(get_report_warmup_config()["CUTOFF"])
+    at = now.replace(hour=cutoff.hour, minute=cutoff.minute, second=cutoff.second, microsecond=0)
+    return at if at > now else at + timedelta(days=1)
+
+
+def get_warmup_cache():
+    """
+    :return: The PDF cache reports are warmed into.
+    :raise ImproperlyConfigured: Unless it is the "filesystem" cache, the
+                                 only one shared with the web workers.
+    """
+    pdf_cache = get_pdf_cache()
+    if not isinstance(pdf_cache, FileSystemPdfCache):
+        raise ImproperlyConfigured(
+            "Report warmup needs LUNCHREPORTS_PDF_CACHE BACKEND \"filesystem\"; "
+            "reports warmed into another cache don't reach the web workers.")
+    return pdf_cache
+
+
+def _is_shared(pdf_cache, status):
+    return (isinstance(pdf_cache, FileSystemPdfCache)
+            and os.path.abspath(pdf_cache.location) == status.get("cache_location"))
+
+
+def standard_reports(schools=None, service_date=None):
+    """
+    The reports everyone downloads at the cutoff, most requested first: per
+    school, the order report and the combined report of all lunch items, then
+    the order report of each single lunch item.
+
+    :param schools: Ids or names of schools; defaults to the SCHOOLS setting,
+                    or every school.
+    :param service_date: date; defaults to today.
+    :return: List of (report_kind, lunch_items, partition).
+    """
+    schools = schools or get_report_warmup_config()["SCHOOLS"]
+    if not schools:
+        schools = School.objects.using(get_report_db_alias()).order_by("pk").values_list("pk", flat=True)
+    lunch_items = get_name_index(refresh=True).lunch_items
+    reports = []
+    for school in schools:
+        partition = get_report_partition(school, service_date)
+        reports.append(("order_report", lunch_items, partition))
+        reports.append(("combined_order_report", lunch_items, partition))
+        reports.extend(("order_report", [item], partition) for item in lunch_items)
+    return reports
+
+
+def _is_cached(pdf_cache, cache_key):
+    pdf_file = pdf_cache.get_file(cache_key)
+    if pdf_file is None:
+        return False
+    pdf_file.close()
+    return True
+
+
+def _render_into_cache(pdf_cache, cache_key, report_kind, lunch_items, partition):
+    # As the report views render and cache it.
+    from .views import render_report_pdf, render_report_pdf_file
+
+    if get_pdf_rendering_config()["MODE"] == "chunked":
+        with tempfile.TemporaryFile() as pdf_file:
+            render_report_pdf_file(report_kind, lunch_items, partition, pdf_file)
+            pdf_cache.set_file(cache_key, pdf_file)
+    else:
+        pdf_cache.set(cache_key, render_report_pdf(report_kind, lunch_items, partition))
+
+
+def _write_status(status):
+    path = get_report_warmup_config()["STATUS_FILE"]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+
+def warmup_reports(schools=None, service_date=None):
+    """
+    Pre-render the standard reports into the PDF cache, under the keys the
+    report views look them up by, so the first requests after the cutoff are
+    served from the cache. Reports already cached for the current data are
+    skipped. Progress is recorded in STATUS_FILE after each report.
+
+    :param schools: Ids or names of schools; defaults to the SCHOOLS setting,
+                    or every school.
+    :param service_date: date; defaults to today.
+    :return: The final status, as returned by get_warmup_status().
+    """
+    pdf_cache = get_warmup_cache()
+    reports = standard_reports(schools, service_date)
+    using = get_report_db_alias()
+    status = {
+        "service_date": (service_date or timezone.localdate()).isoformat(),
+        "data_version": get_data_version(using=using),
+        "cache_location": os.path.abspath(pdf_cache.location),
+        "started_at": timezone.now().isoformat(),
+        "finished_at": None,
+        "reports": [{
+            "report_kind": report_kind,
+            "school_id": partition.school_id,
+            "lunch_items": [item.name for item in lunch_items],
+            "status": WARMUP_PENDING,
+        } for report_kind, lunch_items, partition in reports],
+    }
+    _write_status(status)
+    for entry, (report_kind, lunch_items, partition) in zip(status["reports"], reports, strict=True):
+        start = time.perf_counter()
+        try:
+            cache_key = report_cache_key(report_kind, lunch_items, get_data_version(using=using), partition)
+            entry["cached"] = _is_cached(pdf_cache, cache_key)
+            if not entry["cached"]:
+                _render_into_cache(pdf_cache, cache_key, report_kind, lunch_items, partition)
+            entry["status"] = WARMUP_DONE
+        except Exception as e:
+            logger.exception("Warming up %s of %s failed.", report_kind, partition)
+            entry["status"] = WARMUP_FAILED
+            entry["error"] = f"{type(e).__name__}: {e}"
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        _write_status(status)
+    status["finished_at"] = timezone.now().isoformat()
+    _write_status(status)
+    return get_warmup_status()
+
+
+def get_warmup_status():
+    """
+    Read the progress of the last warmup.
+
+    :return: Dictionary with the last warmup's service date, data version,
+             start and finish times and reports, counts of its reports by
+             status, and whether it is "ready": finished for today without
+             failures, on data that hasn't changed since, into the PDF cache
+             this process serves reports from.
+    """
+    try:
+        with open(get_report_warmup_config()["STATUS_FILE"]) as f:
+            status = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"ready": False, "started_at": None}
+    counts = {WARMUP_PENDING: 0, WARMUP_DONE: 0, WARMUP_FAILED: 0}
+    for entry in status["reports"]:
+        counts[entry["status"]] += 1
+    status.update(counts)
+    status["total"] = len(status["reports"])
+    status["stale"] = status["data_version"] != get_data_version(using=get_report_db_alias())
+    status["shared_cache"] = _is_shared(get_pdf_cache(), status)
+    status["ready"] = (status["finished_at"] is not None and not counts[WARMUP_FAILED]
+                       and not status["stale"] and status["shared_cache"]
+                       and status["service_date"] == timezone.localdate().isoformat())
+    return status